@@ -0,0 +1,223 @@
+"""Module used to generate a synthetic catalogue of service providers.
+
+The catalogue is generated deterministically from a seed, so the same seed
+and size always produce the same providers. The distributions aim to look
+like a real marketplace rather than uniform noise:
+
+- skill popularity follows a Zipf-like curve, so a handful of skills are
+  shared by a large share of providers and most are rare.
+- day rates are log-normally distributed around roughly £250/day.
+- availability is a few ranges of varying length over the next year.
+- review counts follow a power law, most providers have a few reviews and
+  a small number have thousands. Ratings skew towards the top of the scale.
+"""
+
+import random
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Iterator
+from uuid import UUID
+
+SKILL_AREAS = [
+    "plumbing",
+    "electrical",
+    "carpentry",
+    "painting",
+    "roofing",
+    "gardening",
+    "cleaning",
+    "tiling",
+    "plastering",
+    "bricklaying",
+    "SEO",
+    "IT Services",
+    "web design",
+    "copywriting",
+    "bookkeeping",
+    "photography",
+    "video editing",
+    "translation",
+    "tutoring",
+    "removals",
+]
+SKILL_LEVELS = ["", "commercial ", "domestic ", "emergency ", "advanced "]
+SKILLS = [f"{level}{area}".strip() for area in SKILL_AREAS for level in SKILL_LEVELS]
+
+FIRST_NAMES = [
+    "John",
+    "Dean",
+    "Aisha",
+    "Priya",
+    "Tom",
+    "Sarah",
+    "Mohammed",
+    "Chloe",
+    "Liam",
+    "Grace",
+    "Oliver",
+    "Amelia",
+    "Kwame",
+    "Mei",
+    "Rory",
+    "Zara",
+]
+LAST_NAMES = [
+    "Smith",
+    "Greene",
+    "Khan",
+    "Patel",
+    "Jones",
+    "Williams",
+    "Brown",
+    "Taylor",
+    "Davies",
+    "Evans",
+    "Wilson",
+    "Thomas",
+    "Roberts",
+    "Walker",
+    "Wright",
+    "Chen",
+]
+COMPANY_SUFFIXES = ["", " Ltd", " & Sons", " Services", " Solutions", " Co"]
+
+CATALOGUE_START = date(2023, 1, 1)
+# the catalogue is generated in independent chunks of this many providers
+CHUNK_SIZE = 10_000
+
+
+@dataclass
+class SyntheticProvider:
+    """A generated service provider and its children.
+
+    Args:
+        id (UUID): The ID of the service provider.
+        user_id (UUID): The ID of the user who owns the service provider.
+        name (str): The name of the service provider.
+        cost_in_pence (int): The day rate of the service provider.
+        skills (list[str]): The skills of the service provider.
+        availability (list[tuple[date, date]]): The availability ranges.
+        ratings (list[float]): The ratings of the reviews left for the provider.
+    """
+
+    id: UUID
+    user_id: UUID
+    name: str
+    cost_in_pence: int
+    skills: list[str] = field(default_factory=list)
+    availability: list[tuple[date, date]] = field(default_factory=list)
+    ratings: list[float] = field(default_factory=list)
+
+
+def parse_size(size: str) -> int:
+    """Parse a catalogue size such as `10k` or `1m`.
+
+    Args:
+        size (str): The size to parse.
+
+    Returns:
+        int: The number of providers.
+    """
+
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    size = size.strip().lower()
+    if size[-1] in multipliers:
+        return int(float(size[:-1]) * multipliers[size[-1]])
+    return int(size)
+
+
+def _uuid(rng: random.Random) -> UUID:
+    return UUID(int=rng.getrandbits(128), version=4)
+
+
+def _skill_weights() -> list[float]:
+    # zipf-like, the nth most popular skill is 1/n as common as the first
+    return [1 / rank for rank in range(1, len(SKILLS) + 1)]
+
+
+def _availability(rng: random.Random) -> list[tuple[date, date]]:
+    ranges = []
+    cursor = CATALOGUE_START + timedelta(days=rng.randint(0, 30))
+    for _ in range(rng.choice([0, 1, 1, 2, 2, 3, 4, 6])):
+        cursor += timedelta(days=rng.randint(1, 45))
+        length = min(int(rng.expovariate(1 / 10)) + 1, 90)
+        ranges.append((cursor, cursor + timedelta(days=length)))
+        cursor += timedelta(days=length)
+    return ranges
+
+
+def _ratings(rng: random.Random) -> list[float]:
+    review_count = min(int(rng.paretovariate(1.16) * 3) - 3, 5_000)
+    # each provider has an underlying quality, their reviews cluster around it
+    quality = rng.betavariate(5, 1.5) * 5
+    return [
+        round(min(max(rng.gauss(quality, 0.8), 0), 5), 1) for _ in range(review_count)
+    ]
+
+
+def generate_chunk(seed: int, index: int, size: int) -> Iterator[SyntheticProvider]:
+    """Generate one chunk of a synthetic catalogue.
+
+    Each chunk has its own random number generator, so chunks can be
+    generated independently, e.g. by parallel workers, and the catalogue is
+    the same however it's split up.
+
+    Args:
+        seed (int): The seed of the catalogue.
+        index (int): The index of the chunk within the catalogue.
+        size (int): The number of service providers in the chunk.
+
+    Yields:
+        SyntheticProvider: The generated service providers.
+    """
+
+    rng = random.Random(f"{seed}:{index}")
+    skill_weights = _skill_weights()
+    # a pool of owners, some own more than one provider
+    owners = [_uuid(rng) for _ in range(max(size // 3, 1))]
+
+    for _ in range(size):
+        name = (
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            f"{rng.choice(COMPANY_SUFFIXES)}"
+        )
+        skill_count = rng.choice([1, 1, 2, 2, 2, 3, 3, 4, 6])
+        skills = set(rng.choices(SKILLS, weights=skill_weights, k=skill_count))
+
+        yield SyntheticProvider(
+            id=_uuid(rng),
+            user_id=rng.choice(owners),
+            name=name,
+            cost_in_pence=int(rng.lognormvariate(10.1, 0.5)),
+            skills=sorted(skills),
+            availability=_availability(rng),
+            ratings=_ratings(rng),
+        )
+
+
+def chunk_sizes(size: int) -> list[int]:
+    """Split a catalogue into chunks.
+
+    Args:
+        size (int): The number of service providers in the catalogue.
+
+    Returns:
+        list[int]: The size of each chunk, in order.
+    """
+
+    return [min(CHUNK_SIZE, size - start) for start in range(0, size, CHUNK_SIZE)]
+
+
+def generate_catalogue(size: int, seed: int = 0) -> Iterator[SyntheticProvider]:
+    """Generate a synthetic catalogue of service providers.
+
+    Args:
+        size (int): The number of service providers to generate.
+        seed (int, optional): The seed for the generator. Defaults to 0.
+
+    Yields:
+        SyntheticProvider: The generated service providers.
+    """
+
+    for index, chunk_size in enumerate(chunk_sizes(size)):
+        yield from generate_chunk(seed, index, chunk_size)
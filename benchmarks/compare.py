@@ -0,0 +1,76 @@
+"""Compare two benchmark result files.
+
+Prints the change in latency percentiles and throughput for every scenario
+present in both files, and exits with a non-zero status if any scenario's
+p95 latency regressed by more than the allowed threshold.
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+"""
+
+import argparse
+import sys
+from typing import Optional
+
+import orjson
+
+
+def _change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list[str]:
+    """Compare two sets of benchmark results.
+
+    Args:
+        baseline (dict): The results to compare against.
+        candidate (dict): The new results.
+        threshold (float): The p95 latency increase, in percent, that counts
+            as a regression.
+
+    Returns:
+        list[str]: The names of the scenarios that regressed.
+    """
+
+    regressions = []
+    print(f"{'scenario':<60} {'p50':>8} {'p95':>8} {'p99':>8} {'rps':>8}")
+    for name, before in baseline["results"].items():
+        after = candidate["results"].get(name)
+        # load test operations with no successful requests have no latencies
+        if after is None or "p95_ms" not in before or "p95_ms" not in after:
+            continue
+
+        changes = [
+            _change(before[key], after[key])
+            for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_per_second")
+        ]
+        print(f"{name:<60} " + " ".join(f"{c:>+7.1f}%" for c in changes))
+        if changes[1] > threshold:
+            regressions.append(name)
+
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, "rb") as baseline, open(args.candidate, "rb") as candidate:
+        regressions = compare(
+            orjson.loads(baseline.read()),
+            orjson.loads(candidate.read()),
+            args.threshold,
+        )
+
+    if regressions:
+        print(f"\n{len(regressions)} scenario(s) regressed:", file=sys.stderr)
+        for name in regressions:
+            print(f"  {name}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""Drive a running instance of the API with open-loop load.
+
+Requests arrive as a Poisson process at a fixed rate, whether or not
+earlier requests have finished, so a slow server builds up a queue the way
+it would in production rather than slowing the load generator down with it.
+Latency is measured from when a request was due to be sent, not from when
+it was actually sent, so time spent queued in the client is counted too.
+
+Each request is drawn from a weighted mix of operations, with payloads built
+from a sample of the providers already in the database. Several rates can
+be given to step the load up, and the highest rate that met the latency
+objective is reported as the capacity.
+
+Usage:
+    python -m benchmarks.loadgen --target http://localhost:8000 \\
+        --rate 50,100,200 --duration 60 --output load_results.json
+
+WARNING: the `review` and `put` operations write to the database.
+"""
+
+import argparse
+import asyncio
+import logging
+import platform
+import random
+import sys
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+import httpx
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from benchmarks.catalogue import SKILLS
+from benchmarks.payloads import Payloads
+from benchmarks.stats import histogram, summarise
+from service_provider_api.database.database import SessionLocal
+
+OPERATIONS = ("get", "search", "recommend", "review", "put", "suggest")
+DEFAULT_MIX = "get=50,search=25,recommend=10,review=10,put=5"
+SEARCH_FILTERS = ("name", "skills", "cost", "reviews", "availability")
+
+
+@dataclass
+class Request:
+    """A request to send to the API.
+
+    Args:
+        method (str): The HTTP method.
+        path (str): The path of the request.
+        json (Optional[dict]): The JSON body of the request.
+        headers (Optional[dict]): The headers of the request.
+        params (Optional[dict]): The query parameters of the request.
+    """
+
+    method: str
+    path: str
+    json: Optional[dict] = None
+    headers: Optional[dict] = None
+    params: Optional[dict] = None
+
+
+@dataclass
+class StageResult:
+    """The outcome of running load at one rate.
+
+    Args:
+        rate (float): The offered rate in requests per second.
+        elapsed (float): How long the stage took, including draining.
+        latencies (dict): The latencies of the successful requests of each
+            operation, in seconds.
+        statuses (dict): A counter of status codes, or exception names for
+            requests that failed without a response, for each operation.
+        dropped (Counter): Requests that were never sent because too many
+            were already in flight, by operation.
+    """
+
+    rate: float
+    elapsed: float = 0.0
+    latencies: dict = field(default_factory=lambda: defaultdict(list))
+    statuses: dict = field(default_factory=lambda: defaultdict(Counter))
+    dropped: Counter = field(default_factory=Counter)
+
+    def report(self) -> dict:
+        """Summarise the stage.
+
+        Returns:
+            dict: The throughput, latency percentiles, histogram & error rate
+                of each operation, and of all of them together.
+        """
+
+        def summary(latencies: list, statuses: Counter, dropped: int) -> dict:
+            attempted = sum(statuses.values()) + dropped
+            errors = attempted - len(latencies)
+            return {
+                **summarise(latencies, self.elapsed),
+                "errors": errors,
+                "error_rate": round(errors / attempted, 4) if attempted else 0.0,
+                "dropped": dropped,
+                "statuses": {str(status): n for status, n in statuses.items()},
+                "histogram": histogram(latencies),
+            }
+
+        operations = {
+            operation: summary(
+                self.latencies[operation],
+                self.statuses[operation],
+                self.dropped[operation],
+            )
+            for operation in sorted(set(self.statuses) | set(self.dropped))
+        }
+        operations["all"] = summary(
+            [latency for values in self.latencies.values() for latency in values],
+            sum(self.statuses.values(), Counter()),
+            sum(self.dropped.values()),
+        )
+        return operations
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    """Parse an operation mix such as `get=80,search=20`.
+
+    Args:
+        mix (str): Comma separated `operation=weight` pairs.
+
+    Raises:
+        ValueError: If an operation isn't one of `OPERATIONS`.
+
+    Returns:
+        dict[str, float]: The weight of each operation.
+    """
+
+    weights = {}
+    for part in mix.split(","):
+        operation, weight = part.split("=")
+        if operation.strip() not in OPERATIONS:
+            raise ValueError(f"Unknown operation {operation!r}")
+        weights[operation.strip()] = float(weight)
+    return weights
+
+
+def build_request(operation: str, payloads: Payloads) -> Request:
+    """Build a request for an operation.
+
+    Args:
+        operation (str): One of `OPERATIONS`.
+        payloads (Payloads): Builds the payloads from the seeded providers.
+
+    Returns:
+        Request: The request.
+    """
+
+    if operation == "get":
+        return Request("GET", f"/v1_0/service-provider/{payloads.provider().id}")
+    if operation == "search":
+        names = tuple(f for f in SEARCH_FILTERS if payloads.rng.random() < 0.4)
+        return Request("POST", "/v1_0/service-providers/", payloads.filters(names))
+    if operation == "recommend":
+        return Request(
+            "POST", "/v1_0/service-providers/recommend", payloads.recommendation()
+        )
+    if operation == "review":
+        return Request(
+            "POST",
+            f"/v1_0/service-provider/{payloads.provider().id}/review",
+            {"rating": payloads.rng.randint(0, 5)},
+            {"user-id": str(payloads.random_id())},
+        )
+
+    if operation == "suggest":
+        # one request per keystroke of a skill being typed
+        skill = payloads.rng.choice(SKILLS)
+        prefix = skill[: payloads.rng.randint(1, len(skill))]
+        return Request("GET", "/v1_0/skills/suggest", params={"prefix": prefix})
+
+    # put, as the owner and keeping the name so that name searches still match
+    provider = payloads.provider()
+    body = payloads.new_provider()
+    body.name = provider.name
+    return Request(
+        "PUT",
+        f"/v1_0/service-provider/{provider.id}",
+        jsonable_encoder(body),
+        {"user-id": str(provider.user_id)},
+    )
+
+
+async def send_request(
+    client: httpx.AsyncClient,
+    operation: str,
+    request: Request,
+    due: float,
+    result: StageResult,
+) -> None:
+    """Send a request and record its outcome.
+
+    Args:
+        client (httpx.AsyncClient): The client to send the request with.
+        operation (str): The operation the outcome is recorded under.
+        request (Request): The request to send.
+        due (float): The event loop time the request was due to be sent.
+        result (StageResult): The result to record the outcome in.
+
+    Returns:
+        None
+    """
+
+    loop = asyncio.get_running_loop()
+    try:
+        response = await client.request(
+            request.method,
+            request.path,
+            params=request.params,
+            json=request.json,
+            headers=request.headers,
+        )
+    except httpx.HTTPError as e:
+        result.statuses[operation][type(e).__name__] += 1
+        return
+
+    result.statuses[operation][response.status_code] += 1
+    if response.status_code < 400:
+        result.latencies[operation].append(loop.time() - due)
+
+
+async def run_stage(
+    client: httpx.AsyncClient,
+    payloads: Payloads,
+    mix: dict[str, float],
+    rate: float,
+    duration: float,
+    max_in_flight: int,
+) -> StageResult:
+    """Send open-loop load at a fixed rate.
+
+    Args:
+        client (httpx.AsyncClient): The client to send requests with.
+        payloads (Payloads): Builds the payloads from the seeded providers.
+        mix (dict[str, float]): The weight of each operation.
+        rate (float): The mean number of requests to send per second.
+        duration (float): How long to send requests for, in seconds.
+        max_in_flight (int): Requests due while this many are in flight are
+            dropped, so that an overloaded server can't exhaust the client.
+
+    Returns:
+        StageResult: The outcome of the stage.
+    """
+
+    loop = asyncio.get_running_loop()
+    result = StageResult(rate=rate)
+    operations, weights = list(mix), list(mix.values())
+    in_flight = set()
+
+    start = loop.time()
+    due = start
+    while due - start < duration:
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        operation = payloads.rng.choices(operations, weights)[0]
+        if len(in_flight) >= max_in_flight:
+            result.dropped[operation] += 1
+        else:
+            task = asyncio.create_task(
+                send_request(
+                    client, operation, build_request(operation, payloads), due, result
+                )
+            )
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        due += payloads.rng.expovariate(rate)
+
+    await asyncio.gather(*in_flight)
+    result.elapsed = loop.time() - start
+    return result
+
+
+def sample_providers(count: int) -> list:
+    """Sample the providers in the database to build payloads from.
+
+    Args:
+        count (int): The number of providers to sample.
+
+    Returns:
+        list: `(id, user_id, name)` rows.
+    """
+
+    db = SessionLocal()
+    try:
+        return db.execute(
+            "SELECT id, user_id, name FROM service_providers "
+            "ORDER BY random() LIMIT :count",
+            {"count": count},
+        ).fetchall()
+    finally:
+        db.close()
+
+
+async def run_load(args: argparse.Namespace, payloads: Payloads) -> dict:
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(
+        max_connections=args.connections, max_keepalive_connections=args.connections
+    )
+    stages = {}
+    async with httpx.AsyncClient(
+        base_url=args.target, limits=limits, timeout=args.timeout
+    ) as client:
+        for rate in (float(r) for r in args.rate.split(",")):
+            result = await run_stage(
+                client, payloads, mix, rate, args.duration, args.max_in_flight
+            )
+            stages[f"{rate:g}/s"] = result.report()
+            overall = stages[f"{rate:g}/s"]["all"]
+            print(
+                f"{rate:>8g}/s achieved={overall['throughput_per_second']:>8.1f}/s "
+                f"p50={overall.get('p50_ms', 0):>9.2f}ms "
+                f"p99={overall.get('p99_ms', 0):>9.2f}ms "
+                f"errors={overall['error_rate']:.2%}",
+                file=sys.stderr,
+            )
+    return stages
+
+
+def capacity(stages: dict, slo_p99_ms: float, max_error_rate: float) -> Optional[str]:
+    """Find the highest rate that met the latency & error objectives.
+
+    Args:
+        stages (dict): The report of each stage, keyed by rate.
+        slo_p99_ms (float): The highest acceptable p99 latency.
+        max_error_rate (float): The highest acceptable error rate.
+
+    Returns:
+        Optional[str]: The rate, or None if no stage met the objectives.
+    """
+
+    best = None
+    for rate, operations in stages.items():
+        overall = operations["all"]
+        if (
+            overall["count"]
+            and overall["p99_ms"] <= slo_p99_ms
+            and overall["error_rate"] <= max_error_rate
+        ):
+            best = rate
+    return best
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", default="http://localhost:8000")
+    parser.add_argument(
+        "--rate", default="50", help="requests per second, e.g. 50,100,200"
+    )
+    parser.add_argument("--duration", type=float, default=30.0, help="per rate")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--max-in-flight", type=int, default=1_000)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--sample-size", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--slo-p99-ms", type=float, default=250.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--output", default="load_results.json")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    providers = sample_providers(args.sample_size)
+    if not providers:
+        sys.exit("The database is empty, seed it with `scripts.seed_database`")
+
+    payloads = Payloads(providers=providers, rng=random.Random(args.seed))
+    stages = asyncio.run(run_load(args, payloads))
+    best = capacity(stages, args.slo_p99_ms, args.max_error_rate)
+    print(f"capacity: {best or 'no rate met the objectives'}", file=sys.stderr)
+
+    report = {
+        "metadata": {
+            "target": args.target,
+            "mix": parse_mix(args.mix),
+            "duration": args.duration,
+            "seed": args.seed,
+            "slo_p99_ms": args.slo_p99_ms,
+            "capacity": best,
+            "python": platform.python_version(),
+            "recorded_at": datetime.now(timezone.utc),
+        },
+        # flattened so that runs can be compared with `benchmarks.compare`
+        "results": {
+            f"load[{rate}] {operation}": summary
+            for rate, operations in stages.items()
+            for operation, summary in operations.items()
+        },
+    }
+    with open(args.output, "wb") as output:
+        output.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+
+
+if __name__ == "__main__":
+    main()
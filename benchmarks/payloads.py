@@ -0,0 +1,88 @@
+"""Module used to build request payloads for the benchmarks.
+
+Payloads are built from a sample of the providers already in the database,
+so lookups hit real rows and name searches match real names.
+"""
+
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+from uuid import UUID
+
+from benchmarks.catalogue import CATALOGUE_START, SKILLS
+from service_provider_api.api import schemas
+
+
+@dataclass
+class Payloads:
+    """Builds request payloads from a sample of the seeded providers.
+
+    Args:
+        providers (list): A sample of `(id, user_id, name)` rows of the
+            providers in the database.
+        rng (random.Random): The random number generator for the payloads.
+    """
+
+    providers: list
+    rng: random.Random
+
+    def provider(self):
+        """Pick a random provider from the sample."""
+        return self.rng.choice(self.providers)
+
+    def random_id(self) -> UUID:
+        """Generate a deterministic random ID."""
+        return UUID(int=self.rng.getrandbits(128), version=4)
+
+    def new_provider(self) -> schemas.NewServiceProviderInSchema:
+        """Generate the body of a new service provider."""
+        start = CATALOGUE_START + timedelta(days=self.rng.randint(0, 300))
+        return schemas.NewServiceProviderInSchema(
+            name="Benchmark Provider",
+            skills=self.rng.sample(SKILLS, 3),
+            cost_in_pence=self.rng.randint(5_000, 60_000),
+            availability=[
+                schemas.ServiceProviderAvailabilitySchema(
+                    from_date=start, to_date=start + timedelta(days=14)
+                )
+            ],
+        )
+
+    def filters(self, names: tuple) -> dict:
+        """Build a search body that uses the named filters."""
+
+        filters = {}
+        if "name" in names:
+            filters["name"] = self.provider().name
+        if "name_query" in names:
+            # a few letters from the middle of a real name
+            name = self.provider().name
+            start = self.rng.randrange(max(len(name) - 4, 1))
+            filters["name_query"] = name[start : start + 4]
+        if "skills" in names:
+            # weight towards the popular skills, like real searches
+            filters["skills"] = self.rng.sample(SKILLS[:20], self.rng.randint(1, 3))
+        if "cost" in names:
+            filters["cost_gt"] = self.rng.randint(5_000, 20_000)
+            filters["cost_lt"] = filters["cost_gt"] + self.rng.randint(5_000, 40_000)
+        if "reviews" in names:
+            filters["reviews_gt"] = self.rng.choice([2.5, 3.5, 4.0, 4.5])
+        if "availability" in names:
+            start = CATALOGUE_START + timedelta(days=self.rng.randint(0, 300))
+            filters["availability"] = [
+                {
+                    "from_date": start.isoformat(),
+                    "to_date": (start + timedelta(days=60)).isoformat(),
+                }
+            ]
+        return filters
+
+    def recommendation(self) -> dict:
+        """Build a recommendation body."""
+
+        return {
+            "job_budget_in_pence": self.rng.randint(50_000, 500_000),
+            "expected_job_duration_in_days": self.rng.randint(1, 10),
+            "skills": self.rng.sample(SKILLS[:20], 2),
+            "availability": self.filters(("availability",))["availability"],
+        }
@@ -0,0 +1,183 @@
+"""Replay captured traffic against one or more running instances of the API.
+
+Requests captured by the traffic capture middleware are re-sent with their
+original spacing, optionally sped up, so the load has the same mix of
+routes & filters as production. Latency is measured from when each request
+was due, as in `benchmarks.loadgen`. Only reads are replayed, as captures
+don't include the bodies or user IDs needed to replay writes.
+
+When more than one target is given the same traffic is replayed against
+each in turn, and the latency of every route is compared against the first.
+
+Usage:
+    python -m benchmarks.replay captures/traffic.jsonl* \\
+        --target http://baseline:8000 --target http://candidate:8000 --speed 2
+"""
+
+import argparse
+import asyncio
+import logging
+import platform
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+import httpx
+import orjson
+
+from benchmarks.compare import compare
+from benchmarks.loadgen import Request, StageResult, send_request
+from service_provider_api.core.capture import BODY_ROUTES
+
+
+def load_captures(paths: list[str]) -> list[dict]:
+    """Load captured requests, oldest first.
+
+    Args:
+        paths (list[str]): The capture files, including rotated ones.
+
+    Returns:
+        list[dict]: The captured requests.
+    """
+
+    records = []
+    for path in paths:
+        with open(path, "rb") as captures:
+            records.extend(orjson.loads(line) for line in captures if line.strip())
+    return sorted(records, key=lambda record: record["timestamp"])
+
+
+def to_request(record: dict) -> Optional[Request]:
+    """Rebuild the request for a captured record.
+
+    Args:
+        record (dict): The captured request.
+
+    Returns:
+        Optional[Request]: The request, or None if it can't be replayed.
+    """
+
+    if record["method"] == "GET":
+        return Request("GET", record["path"], params=record["query"])
+    if record["method"] == "POST" and record["route"] in BODY_ROUTES:
+        if "body" not in record:
+            return None
+        return Request(
+            "POST", record["path"], json=record["body"], params=record["query"]
+        )
+    return None
+
+
+async def replay(
+    client: httpx.AsyncClient, records: list[dict], speed: float
+) -> tuple[StageResult, int]:
+    """Replay captured requests with their original spacing.
+
+    Args:
+        client (httpx.AsyncClient): The client to send requests with.
+        records (list[dict]): The captured requests, oldest first.
+        speed (float): How many times faster than real time to replay.
+
+    Returns:
+        tuple[StageResult, int]: The outcome of every replayed request,
+            keyed by `METHOD route`, and the number of requests skipped.
+    """
+
+    loop = asyncio.get_running_loop()
+    result = StageResult(rate=0.0)
+    in_flight, skipped = set(), 0
+
+    start = loop.time()
+    for record in records:
+        request = to_request(record)
+        if request is None:
+            skipped += 1
+            continue
+
+        due = start + (record["timestamp"] - records[0]["timestamp"]) / speed
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        task = asyncio.create_task(
+            send_request(
+                client, f"{record['method']} {record['route']}", request, due, result
+            )
+        )
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    await asyncio.gather(*in_flight)
+    result.elapsed = loop.time() - start
+    result.rate = (len(records) - skipped) / result.elapsed if result.elapsed else 0.0
+    return result, skipped
+
+
+async def replay_targets(args: argparse.Namespace, records: list[dict]) -> dict:
+    limits = httpx.Limits(
+        max_connections=args.connections, max_keepalive_connections=args.connections
+    )
+    reports = {}
+    for target in args.target:
+        async with httpx.AsyncClient(
+            base_url=target, limits=limits, timeout=args.timeout
+        ) as client:
+            result, skipped = await replay(client, records, args.speed)
+        overall = result.report()["all"]
+        print(
+            f"{target}: {overall['count']} replayed, {skipped} skipped, "
+            f"p50={overall.get('p50_ms', 0):.2f}ms "
+            f"p99={overall.get('p99_ms', 0):.2f}ms "
+            f"errors={overall['error_rate']:.2%}",
+            file=sys.stderr,
+        )
+        reports[target] = {
+            "metadata": {
+                "target": target,
+                "speed": args.speed,
+                "captured": len(records),
+                "skipped": skipped,
+                "python": platform.python_version(),
+                "recorded_at": datetime.now(timezone.utc),
+            },
+            "results": result.report(),
+        }
+    return reports
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("captures", nargs="+", help="capture files to replay")
+    parser.add_argument(
+        "--target",
+        action="append",
+        required=True,
+        help="can be given more than once, the first is the baseline",
+    )
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--threshold", type=float, default=10.0)
+    parser.add_argument("--output", default="replay_results.json")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    records = load_captures(args.captures)
+    if not records:
+        sys.exit("No captured requests to replay")
+
+    reports = asyncio.run(replay_targets(args, records))
+    with open(args.output, "wb") as output:
+        output.write(orjson.dumps(reports, option=orjson.OPT_INDENT_2))
+
+    baseline, *candidates = reports.values()
+    regressed = False
+    for candidate in candidates:
+        print(f"\n{candidate['metadata']['target']} vs {args.target[0]}")
+        regressed |= bool(compare(baseline, candidate, args.threshold))
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
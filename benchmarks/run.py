@@ -0,0 +1,366 @@
+"""Benchmark the API endpoints and repository methods.
+
+Seeds the database with a synthetic catalogue, then runs every scenario
+sequentially and records its throughput and latency percentiles. The
+results are written as JSON so that runs can be compared with
+`python -m benchmarks.compare`.
+
+Usage:
+    python -m benchmarks.run --size 10k --output results.json
+
+WARNING: seeding truncates the service provider tables of the database
+configured in the environment.
+"""
+
+import argparse
+import itertools
+import logging
+import platform
+import random
+import subprocess
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Callable, Optional
+from uuid import UUID
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from benchmarks.catalogue import parse_size
+from benchmarks.payloads import Payloads
+from benchmarks.seed import seed_database
+from benchmarks.stats import summarise
+from service_provider_api.api import schemas
+from service_provider_api.api.app import app
+from service_provider_api.core.repositories.service_provider import (
+    ServiceProviderRepository,
+)
+from service_provider_api.core.repositories.service_provider_review import (
+    ServiceProviderReviewRepository,
+)
+from service_provider_api.database.database import SessionLocal
+
+LIST_FILTERS = ("name", "skills", "cost", "reviews", "availability")
+
+
+@dataclass
+class Context(Payloads):
+    """The state shared by the benchmark scenarios.
+
+    Args:
+        client (TestClient): A test client for the API.
+    """
+
+    client: TestClient
+
+
+@dataclass
+class Scenario:
+    """A benchmark scenario.
+
+    Args:
+        run (Callable): Runs the scenario once, this is what's timed.
+        setup (Callable, optional): Runs before each timed run, untimed. Its
+            return value is passed to `run` as positional arguments.
+    """
+
+    run: Callable[..., object]
+    setup: Optional[Callable[[], tuple]] = None
+
+
+def _with_session(action: Callable[[Session], object]) -> None:
+    db = SessionLocal()
+    try:
+        action(db)
+    finally:
+        db.close()
+
+
+def _create(ctx: Context) -> tuple[UUID, UUID]:
+    user_id = ctx.random_id()
+    db = SessionLocal()
+    try:
+        provider = ServiceProviderRepository.new(ctx.new_provider(), user_id, db)
+        return provider.id, user_id
+    finally:
+        db.close()
+
+
+def build_scenarios(ctx: Context) -> dict[str, Scenario]:
+    """Build every benchmark scenario.
+
+    Args:
+        ctx (Context): The state shared by the scenarios.
+
+    Returns:
+        dict: A mapping of scenario name to the scenario.
+    """
+
+    client = ctx.client
+    scenarios = {}
+
+    # repository methods
+    for count in range(len(LIST_FILTERS) + 1):
+        for names in itertools.combinations(LIST_FILTERS, count):
+            label = "+".join(names) or "no filters"
+
+            def list_providers(filters: schemas.ServiceProviderListFilterParams):
+                _with_session(
+                    lambda db: [
+                        p.as_dict()
+                        for p in ServiceProviderRepository.list(db, filters, 1, 10)
+                    ]
+                )
+
+            scenarios[f"repository.list[{label}]"] = Scenario(
+                run=list_providers,
+                setup=lambda names=names: (
+                    schemas.ServiceProviderListFilterParams(**ctx.filters(names)),
+                ),
+            )
+
+    scenarios["repository.get"] = Scenario(
+        run=lambda service_provider_id: _with_session(
+            lambda db: ServiceProviderRepository.get(service_provider_id, db).as_dict()
+        ),
+        setup=lambda: (ctx.provider().id,),
+    )
+    scenarios["repository.get_many[100]"] = Scenario(
+        run=lambda ids: _with_session(
+            lambda db: ServiceProviderRepository.get_many(ids, db)
+        ),
+        setup=lambda: ([p.id for p in ctx.rng.sample(ctx.providers, 100)],),
+    )
+    scenarios["repository.new"] = Scenario(
+        run=lambda provider, user_id: _with_session(
+            lambda db: ServiceProviderRepository.new(provider, user_id, db)
+        ),
+        setup=lambda: (ctx.new_provider(), ctx.random_id()),
+    )
+    scenarios["repository.put"] = Scenario(
+        run=lambda provider, service_provider_id, user_id: _with_session(
+            lambda db: ServiceProviderRepository.put(
+                provider, service_provider_id, user_id, db
+            )
+        ),
+        setup=lambda: (ctx.new_provider(), *_create(ctx)),
+    )
+    scenarios["repository.delete"] = Scenario(
+        run=lambda service_provider_id, user_id: _with_session(
+            lambda db: ServiceProviderRepository.delete(
+                service_provider_id, user_id, db
+            )
+        ),
+        setup=lambda: _create(ctx),
+    )
+    scenarios["review_repository.new"] = Scenario(
+        run=lambda service_provider_id, review, user_id: _with_session(
+            lambda db: ServiceProviderReviewRepository.new(
+                service_provider_id, review, user_id, db
+            )
+        ),
+        setup=lambda: (
+            ctx.provider().id,
+            schemas.NewServiceProviderReview(rating=ctx.rng.randint(0, 5)),
+            ctx.random_id(),
+        ),
+    )
+
+    # endpoints
+    def user_headers(user_id: UUID) -> dict:
+        return {"user-id": str(user_id)}
+
+    scenarios["GET /service-provider/{id}"] = Scenario(
+        run=lambda path: client.get(path),
+        setup=lambda: (f"/v1_0/service-provider/{ctx.provider().id}",),
+    )
+    scenarios["POST /service-provider"] = Scenario(
+        run=lambda body, headers: client.post(
+            "/v1_0/service-provider", json=body, headers=headers
+        ),
+        setup=lambda: (
+            jsonable_encoder(ctx.new_provider()),
+            user_headers(ctx.random_id()),
+        ),
+    )
+
+    def existing_provider_request() -> tuple:
+        service_provider_id, user_id = _create(ctx)
+        return (
+            f"/v1_0/service-provider/{service_provider_id}",
+            user_headers(user_id),
+        )
+
+    scenarios["PUT /service-provider/{id}"] = Scenario(
+        run=lambda path, headers, body: client.put(path, json=body, headers=headers),
+        setup=lambda: (
+            *existing_provider_request(),
+            jsonable_encoder(ctx.new_provider()),
+        ),
+    )
+    scenarios["DELETE /service-provider/{id}"] = Scenario(
+        run=lambda path, headers: client.delete(path, headers=headers),
+        setup=existing_provider_request,
+    )
+    scenarios["POST /service-provider/{id}/review"] = Scenario(
+        run=lambda path, body, headers: client.post(path, json=body, headers=headers),
+        setup=lambda: (
+            f"/v1_0/service-provider/{ctx.provider().id}/review",
+            {"rating": ctx.rng.randint(0, 5)},
+            user_headers(ctx.random_id()),
+        ),
+    )
+    scenarios["POST /service-providers[no filters]"] = Scenario(
+        run=lambda: client.post("/v1_0/service-providers/", json={})
+    )
+    scenarios["POST /service-providers[skills+cost]"] = Scenario(
+        run=lambda body: client.post("/v1_0/service-providers/", json=body),
+        setup=lambda: (ctx.filters(("skills", "cost")),),
+    )
+    scenarios["POST /service-providers[skills+cost, facets]"] = Scenario(
+        run=lambda body: client.post(
+            "/v1_0/service-providers/", params={"facets": True}, json=body
+        ),
+        setup=lambda: (ctx.filters(("skills", "cost")),),
+    )
+    scenarios["POST /service-providers[skills+cost, exact total]"] = Scenario(
+        run=lambda body: client.post(
+            "/v1_0/service-providers/", params={"count_mode": "exact"}, json=body
+        ),
+        setup=lambda: (ctx.filters(("skills", "cost")),),
+    )
+    scenarios["POST /service-providers[skills+cost, estimated total]"] = Scenario(
+        run=lambda body: client.post(
+            "/v1_0/service-providers/", params={"count_mode": "estimated"}, json=body
+        ),
+        setup=lambda: (ctx.filters(("skills", "cost")),),
+    )
+    scenarios["POST /service-providers[name_query]"] = Scenario(
+        run=lambda body: client.post("/v1_0/service-providers/", json=body),
+        setup=lambda: (ctx.filters(("name_query",)),),
+    )
+    scenarios["POST /service-providers/recommend"] = Scenario(
+        run=lambda body: client.post("/v1_0/service-providers/recommend", json=body),
+        setup=lambda: (ctx.recommendation(),),
+    )
+    scenarios["POST /service-providers/batch-get[100]"] = Scenario(
+        run=lambda body: client.post("/v1_0/service-providers/batch-get", json=body),
+        setup=lambda: (
+            {"ids": [str(p.id) for p in ctx.rng.sample(ctx.providers, 100)]},
+        ),
+    )
+
+    return scenarios
+
+
+def run_scenario(
+    scenario: Scenario, iterations: int, warmup: int, max_seconds: float
+) -> dict:
+    """Run a scenario and summarise its latencies.
+
+    Args:
+        scenario (Scenario): The scenario to run.
+        iterations (int): The number of timed runs.
+        warmup (int): The number of untimed runs before the timed ones.
+        max_seconds (float): Stop early if the timed runs take longer than this.
+
+    Returns:
+        dict: The throughput and latency percentiles of the scenario.
+    """
+
+    def setup() -> tuple:
+        return scenario.setup() if scenario.setup else ()
+
+    for _ in range(warmup):
+        scenario.run(*setup())
+
+    latencies = []
+    for _ in range(iterations):
+        args = setup()
+        start = perf_counter()
+        scenario.run(*args)
+        latencies.append(perf_counter() - start)
+        if sum(latencies) > max_seconds:
+            break
+    # the runs are sequential, so throughput is the inverse of the busy time
+    return summarise(latencies, sum(latencies))
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="10k", help="e.g. 10k, 100k or 1m")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=30.0)
+    parser.add_argument("--filter", default="", help="only run matching scenarios")
+    parser.add_argument(
+        "--skip-seed", action="store_true", help="use the data already loaded"
+    )
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args(argv)
+
+    # the per-request log lines would dominate the output
+    logging.getLogger().setLevel(logging.WARNING)
+    size = parse_size(args.size)
+
+    if not args.skip_seed:
+        print(f"seeding {size} providers...", file=sys.stderr)
+        seed_database(size, args.seed, truncate=True)
+
+    db = SessionLocal()
+    try:
+        providers = db.execute(
+            "SELECT id, user_id, name FROM service_providers "
+            "ORDER BY random() LIMIT 1000"
+        ).fetchall()
+    finally:
+        db.close()
+
+    ctx = Context(
+        client=TestClient(app), providers=providers, rng=random.Random(args.seed)
+    )
+    results = {}
+    for name, scenario in build_scenarios(ctx).items():
+        if args.filter not in name:
+            continue
+        results[name] = run_scenario(
+            scenario, args.iterations, args.warmup, args.max_seconds
+        )
+        print(
+            f"{name:<60} p50={results[name]['p50_ms']:>9.2f}ms "
+            f"p99={results[name]['p99_ms']:>9.2f}ms "
+            f"{results[name]['throughput_per_second']:>9.1f}/s",
+            file=sys.stderr,
+        )
+
+    report = {
+        "metadata": {
+            "size": size,
+            "seed": args.seed,
+            "iterations": args.iterations,
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "recorded_at": datetime.now(timezone.utc),
+        },
+        "results": results,
+    }
+    with open(args.output, "wb") as output:
+        output.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""Module used to load a synthetic catalogue into the database.
+
+The catalogue is streamed into Postgres with `COPY ... FROM STDIN`, one
+chunk at a time, by several worker processes that each hold their own
+connection. Secondary indexes and foreign keys are dropped before the load
+and recreated afterwards, as building an index once is far cheaper than
+maintaining it row by row. Primary keys are kept.
+"""
+
+import io
+import multiprocessing
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Iterable, Optional
+from uuid import UUID
+
+import psycopg2
+
+from benchmarks.catalogue import chunk_sizes, generate_chunk
+from service_provider_api.core.config import settings
+from service_provider_api.core.repositories.service_provider_search import (
+    ServiceProviderSearchRepository,
+)
+from service_provider_api.database.database import SessionLocal, create_schema
+
+TABLES = (
+    "service_providers",
+    "skills",
+    "availability",
+    "reviews",
+    "review_rating_shards",
+    "service_provider_search",
+    "service_provider_search_queue",
+)
+
+_connection = None
+
+
+def _escape(value) -> str:
+    if value is None:
+        return r"\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copy(cursor, table: str, columns: tuple, rows: Iterable[tuple]) -> None:
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_escape(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def _connect():
+    connection = psycopg2.connect(settings.DATABASE_URL)
+    with connection.cursor() as cursor:
+        # the load can be re-run if the server crashes part way through
+        cursor.execute("SET synchronous_commit = off")
+    return connection
+
+
+def _init_worker() -> None:
+    global _connection
+    _connection = _connect()
+
+
+def load_chunk(seed: int, index: int, size: int) -> int:
+    """Generate a chunk of the catalogue and copy it into the database.
+
+    Must be called from a worker process started by `seed_database`.
+
+    Args:
+        seed (int): The seed of the catalogue.
+        index (int): The index of the chunk.
+        size (int): The number of providers in the chunk.
+
+    Returns:
+        int: The number of providers loaded.
+    """
+
+    providers = list(generate_chunk(seed, index, size))
+    # the children's IDs come from their own generator so they're deterministic
+    rng = random.Random(f"{seed}:{index}:children")
+
+    def child_id() -> UUID:
+        return UUID(int=rng.getrandbits(128), version=4)
+
+    with _connection.cursor() as cursor:
+        _copy(
+            cursor,
+            "service_providers",
+            (
+                "id",
+                "user_id",
+                "name",
+                "cost_in_pence",
+                "review_count",
+                "review_rating_sum",
+            ),
+            (
+                (
+                    p.id,
+                    p.user_id,
+                    p.name,
+                    p.cost_in_pence,
+                    len(p.ratings),
+                    sum(p.ratings),
+                )
+                for p in providers
+            ),
+        )
+        _copy(
+            cursor,
+            "skills",
+            ("id", "service_provider_id", "skill"),
+            ((child_id(), p.id, s) for p in providers for s in p.skills),
+        )
+        _copy(
+            cursor,
+            "availability",
+            ("id", "service_provider_id", "availability"),
+            (
+                (child_id(), p.id, f"[{start},{end})")
+                for p in providers
+                for start, end in p.availability
+            ),
+        )
+        _copy(
+            cursor,
+            "reviews",
+            ("id", "service_provider_id", "rating", "user_id"),
+            ((child_id(), p.id, r, child_id()) for p in providers for r in p.ratings),
+        )
+    _connection.commit()
+    return len(providers)
+
+
+def _deferred_ddl(cursor) -> tuple[list[str], list[str]]:
+    """Find the secondary indexes & foreign keys on the catalogue tables.
+
+    Returns:
+        tuple[list[str], list[str]]: The statements to drop them, and the
+            statements to recreate them.
+    """
+
+    drop, create = [], []
+    cursor.execute(
+        """
+        SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE contype = 'f' AND conrelid::regclass::text = ANY(%s)
+        """,
+        (list(TABLES),),
+    )
+    for table, name, definition in cursor.fetchall():
+        drop.append(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+        create.append(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}')
+
+    # indexes that don't back a constraint, such as the primary key
+    cursor.execute(
+        """
+        SELECT index.relname, pg_get_indexdef(pg_index.indexrelid)
+        FROM pg_index
+        JOIN pg_class index ON index.oid = pg_index.indexrelid
+        JOIN pg_class tbl ON tbl.oid = pg_index.indrelid
+        WHERE tbl.relname = ANY(%s)
+        AND NOT EXISTS (
+            SELECT 1 FROM pg_constraint WHERE conindid = pg_index.indexrelid
+        )
+        """,
+        (list(TABLES),),
+    )
+    for name, definition in cursor.fetchall():
+        drop.append(f'DROP INDEX "{name}"')
+        create.append(definition)
+
+    return drop, create
+
+
+def _execute(statement: str) -> None:
+    connection = _connect()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SET maintenance_work_mem = '256MB'")
+            cursor.execute(statement)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def seed_database(
+    size: int,
+    seed: int = 0,
+    workers: Optional[int] = None,
+    truncate: bool = False,
+) -> int:
+    """Load a synthetic catalogue into the database.
+
+    Args:
+        size (int): The number of service providers to load.
+        seed (int, optional): The seed of the catalogue. Defaults to 0.
+        workers (Optional[int], optional): The number of worker processes.
+            Defaults to the number of CPUs.
+        truncate (bool, optional): Empty the catalogue tables first.
+
+    Returns:
+        int: The number of providers loaded.
+    """
+
+    workers = workers or multiprocessing.cpu_count()
+    create_schema()
+    connection = _connect()
+    try:
+        with connection.cursor() as cursor:
+            if truncate:
+                cursor.execute(f"TRUNCATE {', '.join(TABLES)}")
+            drop, create = _deferred_ddl(cursor)
+            for statement in drop:
+                cursor.execute(statement)
+        connection.commit()
+    finally:
+        connection.close()
+
+    start = perf_counter()
+    loaded = 0
+    try:
+        chunks = [(seed, index, n) for index, n in enumerate(chunk_sizes(size))]
+        with multiprocessing.get_context("spawn").Pool(
+            workers, initializer=_init_worker
+        ) as pool:
+            for count in pool.starmap(load_chunk, chunks, chunksize=1):
+                loaded += count
+        print(
+            f"loaded {loaded} providers in {perf_counter() - start:.1f}s",
+            file=sys.stderr,
+        )
+
+        # the copies bypass the search queue, so build the search table in one go
+        start = perf_counter()
+        db = SessionLocal()
+        try:
+            ServiceProviderSearchRepository.rebuild(db)
+        finally:
+            db.close()
+        print(
+            f"built the search table in {perf_counter() - start:.1f}s",
+            file=sys.stderr,
+        )
+    finally:
+        # always put the indexes & constraints back, even if the load failed
+        start = perf_counter()
+        # indexes can be built in parallel, foreign keys need them to exist
+        indexes = [s for s in create if not s.startswith("ALTER TABLE")]
+        foreign_keys = [s for s in create if s.startswith("ALTER TABLE")]
+        with ThreadPoolExecutor(workers) as executor:
+            list(executor.map(_execute, indexes))
+            list(executor.map(_execute, foreign_keys))
+        _execute(f"ANALYZE {', '.join(TABLES)}")
+        print(
+            f"rebuilt indexes in {perf_counter() - start:.1f}s",
+            file=sys.stderr,
+        )
+
+    return loaded
@@ -0,0 +1,83 @@
+"""Benchmark how long the application takes to import and start up.
+
+Each run happens in a fresh interpreter, so nothing is cached between
+runs. The import is timed separately from the startup handlers (schema
+creation & warmup), as the import is paid by every worker, test run and
+CLI, whereas startup is only paid by servers.
+
+Usage:
+    python -m benchmarks.startup --runs 10 --import-budget-ms 1500
+
+Exits with a non-zero status if the median of either exceeds its budget.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Optional
+
+import orjson
+
+from benchmarks.stats import summarise
+
+# run in a fresh interpreter for every sample
+_MEASURE = """
+import asyncio, time
+start = time.perf_counter()
+from service_provider_api.api.app import app
+imported = time.perf_counter()
+asyncio.run(app.router.startup())
+started = time.perf_counter()
+asyncio.run(app.router.shutdown())
+print(f"{imported - start} {started - imported}")
+"""
+
+
+def measure_once() -> tuple[float, float]:
+    """Import & start the application in a fresh interpreter.
+
+    Returns:
+        tuple[float, float]: The import time and startup time in seconds.
+    """
+
+    output = subprocess.run(
+        [sys.executable, "-c", _MEASURE], capture_output=True, text=True, check=True
+    ).stdout
+    import_time, startup_time = output.split()[-2:]
+    return float(import_time), float(startup_time)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--import-budget-ms", type=float, default=1500.0)
+    parser.add_argument("--startup-budget-ms", type=float, default=2000.0)
+    parser.add_argument("--output", default="startup_results.json")
+    args = parser.parse_args(argv)
+
+    samples = [measure_once() for _ in range(args.runs)]
+    results = {}
+    over_budget = []
+    for name, times, budget in (
+        ("import", [s[0] for s in samples], args.import_budget_ms),
+        ("startup", [s[1] for s in samples], args.startup_budget_ms),
+    ):
+        results[name] = summarise(times, sum(times))
+        median_ms = statistics.median(times) * 1000
+        print(
+            f"{name:<8} median={median_ms:>8.1f}ms budget={budget:>8.1f}ms",
+            file=sys.stderr,
+        )
+        if median_ms > budget:
+            over_budget.append(name)
+
+    with open(args.output, "wb") as output:
+        output.write(orjson.dumps({"results": results}, option=orjson.OPT_INDENT_2))
+
+    if over_budget:
+        sys.exit(f"Over budget: {', '.join(over_budget)}")
+
+
+if __name__ == "__main__":
+    main()
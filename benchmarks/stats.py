@@ -0,0 +1,75 @@
+"""Module used to summarise the latencies recorded by the benchmarks."""
+
+# upper bounds of the latency histogram buckets, in milliseconds
+HISTOGRAM_BUCKETS_MS = (
+    1,
+    2,
+    5,
+    10,
+    20,
+    50,
+    100,
+    200,
+    500,
+    1_000,
+    2_000,
+    5_000,
+    10_000,
+)
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Get a percentile from a sorted list using the nearest-rank method."""
+
+    index = max(int(round(fraction * len(sorted_values))) - 1, 0)
+    return sorted_values[index]
+
+
+def summarise(latencies: list[float], elapsed: float) -> dict:
+    """Summarise a set of latencies.
+
+    Args:
+        latencies (list[float]): The latencies in seconds.
+        elapsed (float): The wall-clock time the latencies were recorded over.
+
+    Returns:
+        dict: The throughput and latency percentiles.
+    """
+
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"count": 0, "throughput_per_second": 0.0}
+
+    return {
+        "count": len(latencies),
+        "throughput_per_second": round(len(latencies) / elapsed, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+
+def histogram(latencies: list[float]) -> dict[str, int]:
+    """Count latencies into `HISTOGRAM_BUCKETS_MS`.
+
+    Args:
+        latencies (list[float]): The latencies in seconds.
+
+    Returns:
+        dict[str, int]: The number of latencies in each bucket, keyed by the
+            bucket's upper bound, e.g. `"<=5ms"`. Non-cumulative.
+    """
+
+    counts = {f"<={bound}ms": 0 for bound in HISTOGRAM_BUCKETS_MS}
+    counts[f">{HISTOGRAM_BUCKETS_MS[-1]}ms"] = 0
+    for latency in latencies:
+        ms = latency * 1000
+        for bound in HISTOGRAM_BUCKETS_MS:
+            if ms <= bound:
+                counts[f"<={bound}ms"] += 1
+                break
+        else:
+            counts[f">{HISTOGRAM_BUCKETS_MS[-1]}ms"] += 1
+    return counts
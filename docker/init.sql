@@ -1,8 +1,24 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 CREATE TABLE "service_providers" (
   id uuid DEFAULT gen_random_uuid() PRIMARY KEY,
   "name" text NOT NULL,
   "user_id" uuid NOT NULL,
-  "cost_in_pence" integer NOT NULL
+  "cost_in_pence" integer NOT NULL,
+  "review_count" integer NOT NULL DEFAULT 0,
+  "review_rating_sum" float NOT NULL DEFAULT 0,
+  "review_rating_shards" integer NOT NULL DEFAULT 1
+);
+
+CREATE TABLE "review_rating_shards" (
+  "service_provider_id" uuid NOT NULL,
+  "shard" integer NOT NULL,
+  "review_count" integer NOT NULL DEFAULT 0,
+  "review_rating_sum" float NOT NULL DEFAULT 0,
+   PRIMARY KEY (service_provider_id, shard),
+   CONSTRAINT fk_service_provider
+      FOREIGN KEY(service_provider_id)
+	  REFERENCES service_providers(id)
 );
 
 CREATE TABLE "reviews" (
@@ -32,3 +48,25 @@ CREATE TABLE "availability" (
       FOREIGN KEY(service_provider_id)
 	  REFERENCES service_providers(id)
 );
+
+CREATE TABLE "service_provider_search" (
+  "service_provider_id" uuid PRIMARY KEY,
+  "cost_in_pence" integer,
+  "review_rating" float NOT NULL,
+  "review_count" integer NOT NULL,
+  "skills" text[] NOT NULL,
+  "availability" daterange[] NOT NULL
+);
+
+CREATE TABLE "service_provider_search_queue" (
+  "service_provider_id" uuid PRIMARY KEY,
+  "queued_at" timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX ix_reviews_service_provider_id ON reviews (service_provider_id);
+CREATE INDEX ix_skills_service_provider_id ON skills (service_provider_id);
+CREATE INDEX ix_availability_service_provider_id ON availability (service_provider_id);
+CREATE INDEX ix_service_providers_name_trgm ON service_providers USING gin (name gin_trgm_ops);
+CREATE INDEX ix_service_provider_search_skills ON service_provider_search USING gin (skills);
+CREATE INDEX ix_service_provider_search_ordering ON service_provider_search (cost_in_pence DESC, review_rating DESC);
+CREATE INDEX ix_service_provider_search_queue_queued_at ON service_provider_search_queue (queued_at);
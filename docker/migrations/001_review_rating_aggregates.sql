@@ -0,0 +1,17 @@
+-- Adds the review rating aggregates to the service providers of an existing
+-- database, and backfills them from the reviews. New databases get the
+-- columns from init.sql.
+
+ALTER TABLE service_providers
+  ADD COLUMN IF NOT EXISTS "review_count" integer NOT NULL DEFAULT 0,
+  ADD COLUMN IF NOT EXISTS "review_rating_sum" float NOT NULL DEFAULT 0;
+
+UPDATE service_providers
+SET review_count = ratings.review_count,
+    review_rating_sum = ratings.review_rating_sum
+FROM (
+  SELECT service_provider_id, count(*) AS review_count, sum(rating) AS review_rating_sum
+  FROM reviews
+  GROUP BY service_provider_id
+) AS ratings
+WHERE service_providers.id = ratings.service_provider_id;
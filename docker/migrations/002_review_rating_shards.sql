@@ -0,0 +1,16 @@
+-- Adds sharded rating counters for popular service providers to an existing
+-- database. New databases get them from init.sql.
+
+ALTER TABLE service_providers
+  ADD COLUMN IF NOT EXISTS "review_rating_shards" integer NOT NULL DEFAULT 1;
+
+CREATE TABLE IF NOT EXISTS "review_rating_shards" (
+  "service_provider_id" uuid NOT NULL,
+  "shard" integer NOT NULL,
+  "review_count" integer NOT NULL DEFAULT 0,
+  "review_rating_sum" float NOT NULL DEFAULT 0,
+   PRIMARY KEY (service_provider_id, shard),
+   CONSTRAINT fk_service_provider
+      FOREIGN KEY(service_provider_id)
+	  REFERENCES service_providers(id)
+);
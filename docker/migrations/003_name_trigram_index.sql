@@ -0,0 +1,8 @@
+-- Adds the trigram index used by fuzzy name search to an existing
+-- database. New databases get it from init.sql. The index is built
+-- concurrently, so this must not be run inside a transaction.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_service_providers_name_trgm
+  ON service_providers USING gin (name gin_trgm_ops);
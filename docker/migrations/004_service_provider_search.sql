@@ -0,0 +1,44 @@
+-- Adds the denormalized search table to an existing database, and fills it
+-- from the service providers. New databases get it from init.sql.
+
+CREATE TABLE IF NOT EXISTS "service_provider_search" (
+  "service_provider_id" uuid PRIMARY KEY,
+  "cost_in_pence" integer,
+  "review_rating" float NOT NULL,
+  "review_count" integer NOT NULL,
+  "skills" text[] NOT NULL,
+  "availability" daterange[] NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS "service_provider_search_queue" (
+  "service_provider_id" uuid PRIMARY KEY,
+  "queued_at" timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_service_provider_search_skills
+  ON service_provider_search USING gin (skills);
+CREATE INDEX IF NOT EXISTS ix_service_provider_search_ordering
+  ON service_provider_search (cost_in_pence DESC, review_rating DESC);
+CREATE INDEX IF NOT EXISTS ix_service_provider_search_queue_queued_at
+  ON service_provider_search_queue (queued_at);
+
+INSERT INTO service_provider_search
+SELECT
+  id,
+  cost_in_pence,
+  CASE WHEN review_count > 0 THEN review_rating_sum / review_count ELSE 0 END,
+  review_count,
+  coalesce(
+    (SELECT array_agg(skill) FROM skills WHERE service_provider_id = service_providers.id),
+    '{}'
+  ),
+  coalesce(
+    (
+      SELECT array_agg(availability)
+      FROM availability
+      WHERE service_provider_id = service_providers.id
+    ),
+    '{}'
+  )
+FROM service_providers
+ON CONFLICT (service_provider_id) DO NOTHING;
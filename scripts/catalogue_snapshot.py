@@ -0,0 +1,73 @@
+"""This module contains the CLI that builds the shared catalogue snapshot.
+
+The API's workers load the skill index from the snapshot at
+`CATALOGUE_SNAPSHOT_PATH` when they start, a single builder process writes
+new generations of it.
+
+Usage:
+    python -m scripts.catalogue_snapshot build
+    python -m scripts.catalogue_snapshot build --every 30
+"""
+
+import argparse
+import sys
+import time
+from typing import Optional
+
+import structlog
+
+from service_provider_api.core.catalogue_snapshot import write_snapshot
+from service_provider_api.core.config import settings
+from service_provider_api.database.database import SessionLocal
+
+log = structlog.get_logger()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Writes one or more generations of the catalogue snapshot."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="write a new generation")
+    build.add_argument(
+        "--path",
+        default=settings.CATALOGUE_SNAPSHOT_PATH,
+        help="defaults to CATALOGUE_SNAPSHOT_PATH",
+    )
+    build.add_argument(
+        "--every",
+        type=float,
+        nargs="?",
+        const=settings.CATALOGUE_SNAPSHOT_BUILD_S,
+        help="keep writing a new generation every this many seconds, "
+        "defaults to CATALOGUE_SNAPSHOT_BUILD_S",
+    )
+    args = parser.parse_args(argv)
+    if not args.path:
+        parser.error("--path or CATALOGUE_SNAPSHOT_PATH is required")
+
+    db = SessionLocal()
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                providers = write_snapshot(args.path, db)
+                print(
+                    f"wrote {providers} service providers to {args.path} in "
+                    f"{time.monotonic() - started:.2f}s",
+                    file=sys.stderr,
+                )
+            except Exception as e:
+                if args.every is None:
+                    raise
+                # keep the last generation & try again next time
+                db.rollback()
+                log.error("Failed to write the catalogue snapshot", error=e)
+            if args.every is None:
+                break
+            time.sleep(max(args.every - (time.monotonic() - started), 0.0))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""This module contains a CLI used to manage the sharded rating counters.
+
+Popular service providers can be given several rating shards, so that
+concurrent reviews of them don't queue on a single row. The shards are
+compacted periodically by the API, but can also be compacted on demand.
+
+Usage:
+    python -m scripts.rating_shards set <service provider id> 16
+    python -m scripts.rating_shards compact
+"""
+
+import argparse
+import sys
+from typing import Optional
+from uuid import UUID
+
+from service_provider_api.core.repositories.service_provider_review import (
+    ServiceProviderReviewRepository,
+)
+from service_provider_api.database.database import SessionLocal
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Updates or compacts the rating shards."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    set_shards = commands.add_parser(
+        "set", help="set the number of shards of a service provider"
+    )
+    set_shards.add_argument("service_provider_id", type=UUID)
+    set_shards.add_argument("shards", type=int)
+    commands.add_parser("compact", help="fold every shard into its provider")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "set":
+            ServiceProviderReviewRepository.set_rating_shards(
+                args.service_provider_id, args.shards, db
+            )
+            print(
+                f"{args.service_provider_id} now has {args.shards} shards",
+                file=sys.stderr,
+            )
+        else:
+            compacted = ServiceProviderReviewRepository.compact_rating_shards(db)
+            print(f"compacted {compacted} shards", file=sys.stderr)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
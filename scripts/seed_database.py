@@ -0,0 +1,46 @@
+"""This module contains a CLI used to fill the database with synthetic data.
+
+The data is generated deterministically from a seed, so the same seed and
+size always load the same catalogue, and is copied in by several worker
+processes in parallel. Indexes are rebuilt once the load has finished.
+
+Usage:
+    python -m scripts.seed_database --size 1m --truncate
+"""
+
+import argparse
+import sys
+from time import perf_counter
+from typing import Optional
+
+from benchmarks.catalogue import parse_size
+from benchmarks.seed import seed_database
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Seeds the database."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="100k", help="e.g. 10k, 100k or 1m")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workers", type=int, default=None, help="defaults to the number of CPUs"
+    )
+    parser.add_argument(
+        "--truncate",
+        action="store_true",
+        help="empty the service provider tables before loading",
+    )
+    args = parser.parse_args(argv)
+
+    start = perf_counter()
+    loaded = seed_database(
+        parse_size(args.size), args.seed, args.workers, args.truncate
+    )
+    print(
+        f"seeded {loaded} providers in {perf_counter() - start:.1f}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
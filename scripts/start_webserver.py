@@ -1,13 +1,238 @@
 """This module contains code that is used to start the FastAPI server.
 
-It's used by the Dockerfile to start the server.
+`start` runs a single process and is meant for local development. `serve`
+is the production launcher used by the Dockerfile, it runs several worker
+processes that share one listening socket:
+
+- the application is imported and the schema created in the parent before
+  forking, then `gc.freeze()` moves everything allocated so far out of the
+  garbage collector's reach, so the pages stay shared copy-on-write rather
+  than being copied into every worker by a collection.
+- if a catalogue snapshot is configured and there isn't a recent one, it's
+  written before forking, so the workers load the skill index from it at
+  startup rather than each counting the skills in Postgres.
+- each worker discards the database pool it inherited and opens its own.
+- the workers export their metrics to a shared directory, so whichever
+  serves `/metrics` reports on all of them, and the supervisor folds the
+  counters of the workers that exit into it.
+- uvloop and httptools are used when they're installed.
+- workers are recycled after a configurable number of requests, with some
+  jitter so they don't all restart at once, and respawned if they die.
 """
 
+import gc
+import os
+import random
+import shutil
+import signal
+import socket
+import tempfile
+import time
+
+import structlog
 import uvicorn
+from sqlalchemy.orm import configure_mappers
 
 from service_provider_api.api.app import app
+from service_provider_api.core.catalogue_snapshot import (
+    CatalogueSnapshot,
+    InvalidSnapshot,
+    write_snapshot,
+)
+from service_provider_api.core import metrics
+from service_provider_api.core.config import settings
+from service_provider_api.core.log_setup import flush_logging, start_log_writer
+from service_provider_api.database.database import (
+    SessionLocal,
+    create_schema,
+    dispose_engine,
+)
+
+log = structlog.get_logger()
+
+# workers that exit sooner than this are assumed to be crashing on startup
+MIN_WORKER_LIFETIME = 1.0
+STOP_SIGNALS = {signal.SIGINT, signal.SIGTERM}
 
 
 def start() -> None:
     """Starts the FastAPI server."""
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_config=None, access_log=False)
+
+
+def _worker_count() -> int:
+    if settings.SERVER_WORKERS:
+        return settings.SERVER_WORKERS
+    # respect CPU affinity, e.g. when the container is pinned to some cores
+    return len(os.sched_getaffinity(0))
+
+
+def _ensure_catalogue_snapshot(path: str) -> None:
+    try:
+        if CatalogueSnapshot(path).age <= settings.CATALOGUE_SNAPSHOT_MAX_AGE_S:
+            return
+    except (OSError, InvalidSnapshot):
+        pass
+    db = SessionLocal()
+    try:
+        write_snapshot(path, db)
+    finally:
+        db.close()
+
+
+def _prepare_metrics_directory() -> bool:
+    # returns whether the directory was created, & so should be removed
+    directory = settings.METRICS_MULTIPROCESS_DIR
+    if directory is None:
+        # inherited by the workers
+        settings.METRICS_MULTIPROCESS_DIR = tempfile.mkdtemp(prefix="metrics-")
+        return True
+
+    os.makedirs(directory, exist_ok=True)
+    # a previous server's counters would otherwise be counted again
+    for name in os.listdir(directory):
+        if name.endswith((".json", ".tmp")):
+            os.remove(os.path.join(directory, name))
+    return False
+
+
+def _run_worker(sock: socket.socket) -> None:
+    # the parent's pool connections can't be shared, open new ones
+    dispose_engine(close=False)
+    # the parent already created the schema
+    settings.CREATE_SCHEMA_ON_STARTUP = False
+    for signum in STOP_SIGNALS:
+        signal.signal(signum, signal.SIG_DFL)
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+
+    max_requests = settings.SERVER_MAX_REQUESTS
+    if max_requests:
+        max_requests += random.randint(0, settings.SERVER_MAX_REQUESTS_JITTER)
+
+    config = uvicorn.Config(
+        app,
+        loop="auto",
+        http="auto",
+        limit_max_requests=max_requests,
+        backlog=settings.SERVER_BACKLOG,
+        # log through the application's queue, see `core.log_setup`
+        log_config=None,
+        access_log=False,
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    """Forks the worker processes and replaces them when they exit.
+
+    Args:
+        sock (socket.socket): The listening socket shared by the workers.
+        workers (int): The number of worker processes to run.
+    """
+
+    def __init__(self, sock: socket.socket, workers: int) -> None:
+        self.sock = sock
+        self.workers = workers
+        self.children: dict[int, float] = {}
+        self.stopping = False
+
+    def spawn(self) -> None:
+        """Fork a new worker process.
+
+        Returns:
+            None
+        """
+
+        # a signal arriving mid-fork would reach the child before it resets
+        # its handlers, or the parent before it records the child, so hold
+        # signals until both are done
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        if self.stopping:
+            # told to stop while waiting to respawn
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+            return
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(self.sock)
+            finally:
+                flush_logging()
+                os._exit(0)
+        self.children[pid] = time.monotonic()
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+        metrics.mark_process_started(settings.METRICS_MULTIPROCESS_DIR, pid)
+
+    def stop(self, signum: int, frame) -> None:
+        """Signal handler that asks the workers to shut down gracefully.
+
+        Returns:
+            None
+        """
+
+        self.stopping = True
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+
+    def run(self) -> None:
+        """Run the workers until the supervisor is told to stop.
+
+        Returns:
+            None
+        """
+
+        for signum in STOP_SIGNALS:
+            signal.signal(signum, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+
+        while self.children:
+            pid, status = os.wait()
+            started_at = self.children.pop(pid, None)
+            if started_at is None:
+                continue
+            metrics.mark_process_dead(settings.METRICS_MULTIPROCESS_DIR, pid)
+            if self.stopping:
+                continue
+
+            log.info("worker exited", pid=pid, status=os.waitstatus_to_exitcode(status))
+            if time.monotonic() - started_at < MIN_WORKER_LIFETIME:
+                # don't spin if the workers are failing to start
+                time.sleep(MIN_WORKER_LIFETIME)
+            self.spawn()
+
+
+def serve() -> None:
+    """Starts the FastAPI server with several worker processes."""
+
+    config = uvicorn.Config(
+        app,
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        backlog=settings.SERVER_BACKLOG,
+        log_config=None,
+        access_log=False,
+    )
+    sock = config.bind_socket()
+    # the supervisor logs too, the workers start their own writers
+    start_log_writer()
+    remove_metrics_directory = _prepare_metrics_directory()
+
+    # preload everything the workers share before forking
+    configure_mappers()
+    if settings.CREATE_SCHEMA_ON_STARTUP:
+        create_schema()
+    if settings.CATALOGUE_SNAPSHOT_PATH:
+        _ensure_catalogue_snapshot(settings.CATALOGUE_SNAPSHOT_PATH)
+    dispose_engine()
+    gc.collect()
+    gc.freeze()
+
+    workers = _worker_count()
+    log.info("starting workers", workers=workers, pid=os.getpid())
+    Supervisor(sock, workers).run()
+    if remove_metrics_directory:
+        shutil.rmtree(settings.METRICS_MULTIPROCESS_DIR)
+
+
+if __name__ == "__main__":
+    serve()
@@ -4,23 +4,51 @@ Most of the application setup should be done here.
 """
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi_versioning import VersionedFastAPI, version
 
 from service_provider_api.api.endpoints import (
     service_provider,
     service_provider_aggregations,
+    skills,
 )
-from service_provider_api.database.database import Base, engine
-from service_provider_api.core.log_setup import setup_logging
+from service_provider_api.api.middleware import (
+    AdmissionControlMiddleware,
+    ProfilingMiddleware,
+    RequestTimingMiddleware,
+    TrafficCaptureMiddleware,
+)
+from service_provider_api.api.responses import TimedJSONResponse
+from service_provider_api.database.database import (
+    create_schema,
+    dispose_engine,
+    get_engine,
+)
+from service_provider_api.core import (
+    admission,
+    invalidation,
+    metrics,
+    search_refresh,
+)
+from service_provider_api.core.capture import TrafficRecorder
+from service_provider_api.core.config import settings
+from service_provider_api.core.log_setup import setup_logging, start_log_writer
+from service_provider_api.core.rating_compaction import start_compactor, stop_compactor
+from service_provider_api.core.review_batcher import start_batcher, stop_batcher
+from service_provider_api.core.skill_index import start_refresher, stop_refresher
+from service_provider_api.core.warmup import warm_up
+
+# how long startup waits for the invalidation listener to connect
+LISTENER_STARTUP_TIMEOUT_S = 5.0
 
-# bind the models to the DB engine
-Base.metadata.create_all(bind=engine)
 setup_logging()
+metrics.register_pool_metrics(get_engine)
 
 
-app = FastAPI(title="Service Provider API")
+app = FastAPI(title="Service Provider API", default_response_class=TimedJSONResponse)
 app.include_router(service_provider.router)
 app.include_router(service_provider_aggregations.router)
+app.include_router(skills.router)
 
 
 @app.get("/health")
@@ -38,3 +66,116 @@ async def health() -> dict:
 
 
 app = VersionedFastAPI(app, version_format="{major}.{minor}")
+if settings.ADMISSION_CONTROL:
+    admission_controller = admission.AdmissionController(
+        {
+            route_class: target / 1000
+            for route_class, target in settings.ADMISSION_TARGET_LATENCY_MS.items()
+        },
+        settings.ADMISSION_MAX_CONCURRENCY,
+        settings.ADMISSION_POOL_WAIT_TARGET_MS / 1000,
+    )
+    metrics.register_admission_metrics(admission_controller.stats)
+    # inside the timing middleware, so it can read the request's pool wait
+    app.add_middleware(
+        AdmissionControlMiddleware,
+        controller=admission_controller,
+        retry_after=settings.ADMISSION_RETRY_AFTER_S,
+    )
+app.add_middleware(RequestTimingMiddleware)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(
+        ProfilingMiddleware,
+        sample_rate=settings.PROFILE_SAMPLE_RATE,
+        admin_token=(
+            settings.PROFILE_ADMIN_TOKEN.get_secret_value()
+            if settings.PROFILE_ADMIN_TOKEN
+            else None
+        ),
+        interval=settings.PROFILE_INTERVAL_MS / 1000,
+        output_dir=settings.PROFILE_OUTPUT_DIR,
+    )
+if settings.CAPTURE_ENABLED:
+    app.add_middleware(
+        TrafficCaptureMiddleware,
+        recorder=TrafficRecorder(
+            settings.CAPTURE_PATH,
+            settings.CAPTURE_MAX_BYTES,
+            settings.CAPTURE_BACKUP_COUNT,
+        ),
+        sample_rate=settings.CAPTURE_SAMPLE_RATE,
+    )
+
+
+@app.on_event("startup")
+def startup() -> None:
+    """Prepare the application to serve traffic.
+
+    Nothing touches the database or starts threads at import time, so the
+    log writer is started, the schema created and the application warmed up
+    here instead, before the first request.
+
+    Returns:
+        None
+    """
+
+    start_log_writer()
+    if settings.METRICS_MULTIPROCESS_DIR:
+        metrics.start_exporter(
+            settings.METRICS_MULTIPROCESS_DIR, settings.METRICS_EXPORT_S
+        )
+    if settings.CREATE_SCHEMA_ON_STARTUP:
+        create_schema()
+    if settings.CACHE_INVALIDATION_BUS:
+        # listening before the caches are warmed, so no change falls between
+        # the two. If it takes longer, its resync reloads them once it is
+        listener = invalidation.start_listener()
+        listener.wait_until_listening(LISTENER_STARTUP_TIMEOUT_S)
+    if settings.WARMUP_ON_STARTUP:
+        warm_up(settings.WARMUP_POOL_CONNECTIONS)
+    if settings.REVIEW_WRITE_BEHIND:
+        start_batcher(
+            settings.REVIEW_BATCH_MAX_SIZE, settings.REVIEW_BATCH_MAX_DELAY_MS / 1000
+        )
+    if settings.RATING_COMPACTION_INTERVAL_S:
+        start_compactor(settings.RATING_COMPACTION_INTERVAL_S)
+    if settings.SKILL_INDEX_REFRESH_S:
+        start_refresher(settings.SKILL_INDEX_REFRESH_S)
+    if settings.SEARCH_TABLE_REFRESH_S:
+        search_refresh.start_refresher(settings.SEARCH_TABLE_REFRESH_S)
+
+
+@app.on_event("shutdown")
+def shutdown() -> None:
+    """Write any queued reviews, close the database connections and export
+    the metrics a last time.
+
+    Returns:
+        None
+    """
+
+    invalidation.stop_listener()
+    search_refresh.stop_refresher()
+    stop_refresher()
+    stop_compactor()
+    stop_batcher()
+    dispose_engine()
+    metrics.stop_exporter()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics() -> PlainTextResponse:
+    """Expose the application metrics in the Prometheus text format.
+
+    This endpoint isn't versioned as it's consumed by Prometheus rather
+    than by clients of the API. Under the production server the metrics of
+    every worker are merged, whichever of them serves the scrape.
+
+    Returns:
+        PlainTextResponse: The rendered metrics.
+    """
+
+    return PlainTextResponse(
+        metrics.registry.render(settings.METRICS_MULTIPROCESS_DIR),
+        media_type="text/plain; version=0.0.4",
+    )
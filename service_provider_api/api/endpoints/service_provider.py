@@ -1,12 +1,16 @@
+import asyncio
 from http import HTTPStatus
 from uuid import UUID
 
 import structlog
 from fastapi import APIRouter, Depends, Header, Response
 from fastapi_versioning import version
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from service_provider_api.api.dependencies import get_db
+from service_provider_api.core import provider_misses
+from service_provider_api.core.review_batcher import get_batcher
 from service_provider_api.core.repositories.service_provider import (
     FailedToCreateServiceProvider,
     ServiceProviderRepository,
@@ -71,11 +75,12 @@ def create_service_provider(
     "/{service_provider_id}/review",
     responses={
         HTTPStatus.CREATED: {"model": schemas.ServiceProviderReview},
+        HTTPStatus.NOT_FOUND: {"model": schemas.ErrorResponse},
         HTTPStatus.INTERNAL_SERVER_ERROR: {"model": schemas.ErrorResponse},
     },
 )
 @version(1, 0)
-def add_service_provider_review(
+async def add_service_provider_review(
     service_provider_id: UUID,
     review: schemas.NewServiceProviderReview,
     response: Response,
@@ -84,6 +89,11 @@ def add_service_provider_review(
 ) -> dict:
     """Add a review to a service provider.
 
+    With write-behind enabled the review is written as part of a batch, but
+    the response still waits until it has been committed. Reviews of
+    service providers recently confirmed not to exist are rejected without
+    touching the database.
+
     Args:
         service_provider_id (UUID): The id of the service provider to add the
             review to.
@@ -98,12 +108,29 @@ def add_service_provider_review(
         dict: A dictionary containing the error message.
     """
 
+    if provider_misses.known_missing(service_provider_id):
+        response.status_code = HTTPStatus.NOT_FOUND
+        return schemas.ErrorResponse(error="Service provider not found")
+
     try:
-        new_review = ServiceProviderReviewRepository.new(
-            service_provider_id, review, user_id, db
-        )
+        batcher = get_batcher()
+        if batcher is not None:
+            new_review = await asyncio.wrap_future(
+                batcher.submit(service_provider_id, review, user_id)
+            )
+        else:
+            new_review = await run_in_threadpool(
+                ServiceProviderReviewRepository.new,
+                service_provider_id,
+                review,
+                user_id,
+                db,
+            )
         response.status_code = HTTPStatus.CREATED
         return schemas.ServiceProviderReview.from_orm(new_review)
+    except ServiceProviderNotFound:
+        response.status_code = HTTPStatus.NOT_FOUND
+        return schemas.ErrorResponse(error="Service provider not found")
     except FailedToCreateReview:
         response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
         return schemas.ErrorResponse(
@@ -143,8 +170,10 @@ def get_service_provider(
     """
 
     try:
-        service_provider = ServiceProviderRepository.get(service_provider_id, db)
-        return schemas.ServiceProviderSchema(**service_provider.as_dict())
+        service_provider = ServiceProviderRepository.get_as_dict(
+            service_provider_id, db
+        )
+        return schemas.ServiceProviderSchema(**service_provider)
     except ServiceProviderNotFound:
         response.status_code = HTTPStatus.NOT_FOUND
         return schemas.ErrorResponse(error="Service provider not found")
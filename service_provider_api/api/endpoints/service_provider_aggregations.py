@@ -2,36 +2,63 @@
 service providers."""
 
 from http import HTTPStatus
+from typing import Callable, TypeVar, Union
 
 import structlog
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, Response
 from fastapi_versioning import version
+from sqlalchemy import exc
 from sqlalchemy.orm import Session
 
 from service_provider_api.api import schemas
 from service_provider_api.api.dependencies import (
     get_db,
 )
+from service_provider_api.core import query_guard
+from service_provider_api.core.config import settings
+from service_provider_api.core.log_setup import Lazy
 from service_provider_api.core.repositories.service_provider import (
+    SearchCancelled,
+    SearchTooExpensive,
     ServiceProviderRepository,
 )
+from service_provider_api.database.database import LowPrioritySessionLocal
 
 router = APIRouter(prefix="/service-providers")
 log = structlog.get_logger()
 
+T = TypeVar("T")
 
-@router.post("/", responses={HTTPStatus.OK: {"model": schemas.ServiceProviderSchema}})
+
+SEARCH_RESPONSES = {
+    HTTPStatus.OK: {"model": schemas.ServiceProviderSchema},
+    HTTPStatus.UNPROCESSABLE_ENTITY: {"model": schemas.ErrorResponse},
+    HTTPStatus.SERVICE_UNAVAILABLE: {"model": schemas.ErrorResponse},
+}
+
+
+@router.post("/", responses=SEARCH_RESPONSES)
 @version(1, 0)
-def search_service_provider(
+async def search_service_provider(
     params: schemas.ServiceProviderListFilterParams,
+    request: Request,
+    response: Response,
     page: int = Query(default=1, ge=1),
     page_size: int = Query(default=10, ge=1),
+    facets: bool = Query(default=False),
+    count_mode: schemas.CountMode = Query(default=schemas.CountMode.none),
     db: Session = Depends(get_db),
 ) -> dict:
     """Endpoint to search for service providers.
 
     Args:
         params (ListFilterParams): The body used to filter the search.
+        request (Request): The request, watched for the client disconnecting.
+        response (Response): The response, used to set the status code.
+        count_mode (CountMode): How to count the total number of matching
+            service providers, so clients can size a deep scan up front.
+        facets (bool): Also count every matching service provider by skill,
+            cost & rating, so clients don't need a search per count.
         db (Session): The database session.
 
     Returns:
@@ -39,19 +66,34 @@ def search_service_provider(
         the filters provided by the user in the `params` argument.
     """
 
-    log.info("Searching for service providers", params=params)
-    service_providers = ServiceProviderRepository.list(db, params, page, page_size)
-    return schemas.ServiceProvidersList(
-        service_providers=[s.as_dict() for s in service_providers]
+    log.info(
+        "Searching for service providers",
+        params=Lazy(params.dict, exclude_unset=True),
     )
 
+    def search(db: Session, page_size: int):
+        service_providers, total = ServiceProviderRepository.list_as_dicts(
+            db, params, page, page_size, count_mode
+        )
+        if facets:
+            return schemas.FacetedServiceProvidersList(
+                service_providers=service_providers,
+                total=total,
+                facets=ServiceProviderRepository.facets(db, params),
+            )
+        return schemas.ServiceProvidersList(
+            service_providers=service_providers, total=total
+        )
 
-@router.post(
-    "/recommend", responses={HTTPStatus.OK: {"model": schemas.ServiceProviderSchema}}
-)
+    return await _guarded_search(request, response, db, params, page, page_size, search)
+
+
+@router.post("/recommend", responses=SEARCH_RESPONSES)
 @version(1, 0)
-def recommend_service_provider(
+async def recommend_service_provider(
     params: schemas.ServiceProviderRecommendationParams,
+    request: Request,
+    response: Response,
     page: int = Query(default=1, ge=1),
     page_size: int = Query(default=10, ge=1),
     db: Session = Depends(get_db),
@@ -61,6 +103,8 @@ def recommend_service_provider(
     Args:
         params (ServiceProviderRecommendationParams): The request body used
             to filter the search.
+        request (Request): The request, watched for the client disconnecting.
+        response (Response): The response, used to set the status code.
         db (Session): The database session.
 
     Returns:
@@ -69,7 +113,10 @@ def recommend_service_provider(
         ordered according to the most relevant service provider first.
     """
 
-    log.info("Searching for recommended service providers", params=params)
+    log.info(
+        "Searching for recommended service providers",
+        params=Lazy(params.dict, exclude_unset=True),
+    )
 
     max_cost_per_day = params.job_budget_in_pence / params.expected_job_duration_in_days
     filters = schemas.ServiceProviderListFilterParams(
@@ -79,7 +126,111 @@ def recommend_service_provider(
         availability=params.availability,
     )
 
-    service_providers = ServiceProviderRepository.list(db, filters, page, page_size)
-    return schemas.ServiceProvidersList(
-        service_providers=[s.as_dict() for s in service_providers]
+    def recommend(db: Session, page_size: int):
+        service_providers, _ = ServiceProviderRepository.list_as_dicts(
+            db, filters, page, page_size
+        )
+        return schemas.ServiceProvidersList(service_providers=service_providers)
+
+    return await _guarded_search(
+        request, response, db, filters, page, page_size, recommend
     )
+
+
+async def _guarded_search(
+    request: Request,
+    response: Response,
+    db: Session,
+    filters: schemas.ServiceProviderListFilterParams,
+    page: int,
+    page_size: int,
+    search: Callable[[Session, int], T],
+) -> Union[T, schemas.ErrorResponse]:
+    """Run a search behind the query cost guard.
+
+    The search is planned first, and rejected if it's too expensive, run on
+    the low priority pool if it's expensive, and its page size is capped.
+    Its queries have a statement timeout, and are cancelled if the client
+    disconnects.
+
+    Args:
+        request (Request): The request, watched for the client disconnecting.
+        response (Response): The response, used to set the status code.
+        db (Session): The database session.
+        filters (ListFilterParams): The filters of the search.
+        page (int): The page number.
+        page_size (int): The page size asked for.
+        search (Callable[[Session, int], T]): Runs the search, with the
+            session & page size to use.
+
+    Returns:
+        Union[T, ErrorResponse]: The result of the search, or the error.
+    """
+
+    def run() -> T:
+        with query_guard.statement_timeout(settings.SEARCH_STATEMENT_TIMEOUT_MS):
+            plan = ServiceProviderRepository.plan_search(db, filters, page, page_size)
+            if plan.page_size != page_size:
+                response.headers["X-Page-Size"] = str(plan.page_size)
+            if not plan.low_priority:
+                return search(db, plan.page_size)
+
+            log.info("Running an expensive search", cost=plan.estimated_cost)
+            # hand the planning connection back, rather than leaving it idle
+            # in a transaction on the main pool while the search runs
+            db.close()
+            low_priority_db = LowPrioritySessionLocal()
+            try:
+                return search(low_priority_db, plan.page_size)
+            finally:
+                low_priority_db.close()
+
+    try:
+        return await query_guard.run_cancellable(request, run)
+    except SearchTooExpensive as e:
+        log.info("Rejected an expensive search", reason=str(e))
+        response.status_code = HTTPStatus.UNPROCESSABLE_ENTITY
+        return schemas.ErrorResponse(
+            error=(
+                "The search is too broad. "
+                "Please add filters or ask for fewer results."
+            )
+        )
+    except (SearchCancelled, exc.TimeoutError) as e:
+        log.warning("The search didn't finish in time", error=e)
+        response.status_code = HTTPStatus.SERVICE_UNAVAILABLE
+        return schemas.ErrorResponse(
+            error="The search took too long. Please try again later."
+        )
+
+
+@router.post(
+    "/batch-get",
+    responses={HTTPStatus.OK: {"model": schemas.ServiceProviderBatchGetResponse}},
+)
+@version(1, 0)
+def batch_get_service_providers(
+    params: schemas.ServiceProviderBatchGetParams,
+    db: Session = Depends(get_db),
+) -> dict:
+    """Endpoint to get multiple service providers by their IDs.
+
+    Args:
+        params (ServiceProviderBatchGetParams): The request body containing
+            the IDs of the service providers to get.
+        db (Session): The database session.
+
+    Returns:
+        dict: A dictionary keyed by every requested ID. IDs that could not
+        be found map to `None`.
+    """
+
+    service_providers = dict.fromkeys(params.ids)
+    for service_provider in ServiceProviderRepository.get_many(
+        list(service_providers), db
+    ):
+        service_providers[service_provider.id] = schemas.ServiceProviderSchema(
+            **service_provider.as_dict()
+        )
+
+    return schemas.ServiceProviderBatchGetResponse(service_providers=service_providers)
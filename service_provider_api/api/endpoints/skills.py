@@ -0,0 +1,43 @@
+"""Module to hold the endpoints for service provider skills."""
+
+from http import HTTPStatus
+
+from fastapi import APIRouter, Query
+from fastapi_versioning import version
+from starlette.concurrency import run_in_threadpool
+
+from service_provider_api.api import schemas
+from service_provider_api.core.skill_index import skill_index
+
+router = APIRouter(prefix="/skills")
+
+
+@router.get("/suggest", responses={HTTPStatus.OK: {"model": schemas.SkillSuggestions}})
+@version(1, 0)
+async def suggest_skills(
+    prefix: str = Query(min_length=1, max_length=100),
+    limit: int = Query(default=10, ge=1, le=50),
+) -> dict:
+    """Suggest skills that start with a prefix, for autocomplete.
+
+    Suggestions are served from memory, this endpoint is called on every
+    keystroke and never queries the database once the index is loaded.
+
+    Args:
+        prefix (str): The start of the skill, case is ignored.
+        limit (int): The most suggestions to return.
+
+    Returns:
+        dict: The skills starting with the prefix, with the number of
+            service providers that have them, most common first.
+    """
+
+    if not skill_index.loaded:
+        # only the first request, if the index wasn't loaded at startup
+        await run_in_threadpool(skill_index.ensure_loaded)
+    return schemas.SkillSuggestions(
+        suggestions=[
+            schemas.SkillSuggestion(skill=skill, provider_count=count)
+            for skill, count in skill_index.suggest(prefix, limit)
+        ]
+    )
@@ -0,0 +1,304 @@
+"""Module to hold the ASGI middleware used by the application."""
+
+import hmac
+import random
+import re
+import time
+from pathlib import Path
+from typing import Optional
+
+import anyio.to_thread
+import structlog
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from service_provider_api.core import admission, instrumentation, metrics
+from service_provider_api.core.capture import MAX_BODY_BYTES, TrafficRecorder, sanitize
+from service_provider_api.core.profiling import RequestProfiler
+
+log = structlog.get_logger()
+
+# the versioned sub-applications are mounted under e.g. /v1_0
+_VERSION_PREFIX = re.compile(r"^/v\d+_\d+")
+
+
+class RequestTimingMiddleware:
+    """Middleware that records where each request spends its time.
+
+    The total latency, connection pool wait, SQL statement count & time and
+    serialization time are returned in a `Server-Timing` header and logged
+    once the response has been sent. The latency and status of each request
+    are also recorded in the Prometheus metrics, labelled by the route
+    template and the API version that served it.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # mounted sub-applications rewrite the path in the scope
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        status_code = 500
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        with instrumentation.track_request() as timings:
+
+            async def send_with_server_timing(message: Message) -> None:
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", timings.server_timing())
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_server_timing)
+            finally:
+                metrics.REQUESTS_IN_FLIGHT.dec()
+                self._record_metrics(scope, root_path, status_code, timings)
+                log.info(
+                    "request completed",
+                    method=scope["method"],
+                    path=path,
+                    status_code=status_code,
+                    **timings.as_log_fields(),
+                )
+
+    @staticmethod
+    def _record_metrics(
+        scope: Scope,
+        root_path: str,
+        status_code: int,
+        timings: instrumentation.RequestTimings,
+    ) -> None:
+        """Record the metrics for a request that has been served.
+
+        Args:
+            scope (Scope): The ASGI scope, after routing has updated it.
+            root_path (str): The root path before routing updated it.
+            status_code (int): The status code of the response.
+            timings (RequestTimings): The timings for the request.
+
+        Returns:
+            None
+        """
+
+        # label by the route template rather than the path, so the metrics
+        # don't grow a new series for every service provider ID
+        route = scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        # the versioned sub-applications are mounted under e.g. /v1_0
+        version = scope.get("root_path", "")[len(root_path) :].strip("/")
+
+        labels = (scope["method"], route_path, version or "unversioned")
+        metrics.REQUEST_DURATION.observe(timings.elapsed, labels)
+        metrics.REQUESTS.inc(labels + (str(status_code),))
+        metrics.POOL_WAIT.observe(timings.pool_wait)
+
+
+class ProfilingMiddleware:
+    """Middleware that profiles a sample of requests.
+
+    A request is profiled if it's picked by the sample rate, or if it sends
+    the admin token in the `X-Profile` header. The collapsed stacks are
+    written to one file per request in the output directory. This middleware
+    is only installed when profiling is enabled, so it costs nothing
+    otherwise.
+
+    Args:
+        app (ASGIApp): The application to wrap.
+        sample_rate (float): The fraction of requests to profile.
+        admin_token (Optional[str]): The token that forces a request to be
+            profiled.
+        interval (float): The time between samples in seconds.
+        output_dir (str): The directory the profiles are written to.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        sample_rate: float,
+        admin_token: Optional[str],
+        interval: float,
+        output_dir: str,
+    ) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token.encode() if admin_token else None
+        self.interval = interval
+        self.output_dir = Path(output_dir)
+
+    def _should_profile(self, scope: Scope) -> bool:
+        if self.admin_token is not None:
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    return hmac.compare_digest(value, self.admin_token)
+        return random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profiler = RequestProfiler(self.interval)
+        if not profiler.start():
+            # another request is already being profiled
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], scope["path"]
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.stop()
+            name = f"{time.time_ns()}-{method}-{path.strip('/').replace('/', '_')}"
+            profile_path = self.output_dir / f"{name}.collapsed"
+            await anyio.to_thread.run_sync(profiler.dump, profile_path)
+            log.info(
+                "request profiled", method=method, path=path, profile=str(profile_path)
+            )
+
+
+class TrafficCaptureMiddleware:
+    """Middleware that captures the shape of a sample of requests.
+
+    The route, path, query parameters, status & latency of each sampled
+    request are written by the recorder, along with the body of requests to
+    the search endpoints. Bodies are only buffered for `POST` requests, and
+    only up to `MAX_BODY_BYTES`. This middleware is only installed when
+    capture is enabled, so it costs nothing otherwise.
+
+    Args:
+        app (ASGIApp): The application to wrap.
+        recorder (TrafficRecorder): Writes the captured requests.
+        sample_rate (float): The fraction of requests to capture.
+    """
+
+    def __init__(
+        self, app: ASGIApp, recorder: TrafficRecorder, sample_rate: float
+    ) -> None:
+        self.app = app
+        self.recorder = recorder
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        # mounted sub-applications rewrite the path in the scope
+        method, path = scope["method"], scope["path"]
+        body, buffering = [], method == "POST"
+        status_code = 500
+
+        async def receive_and_buffer() -> Message:
+            nonlocal buffering
+            message = await receive()
+            if buffering and message["type"] == "http.request":
+                body.append(message.get("body", b""))
+                if sum(len(chunk) for chunk in body) > MAX_BODY_BYTES:
+                    body.clear()
+                    buffering = False
+            return message
+
+        async def send_and_record_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_and_buffer, send_and_record_status)
+        finally:
+            route = scope.get("route")
+            record = sanitize(
+                method,
+                route.path if route is not None else None,
+                path,
+                scope.get("query_string", b""),
+                b"".join(body) if buffering else None,
+            )
+            self.recorder.record(
+                {
+                    "timestamp": started_at,
+                    **record,
+                    "status_code": status_code,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                }
+            )
+
+
+class AdmissionControlMiddleware:
+    """Middleware that sheds requests over their route class's concurrency limit.
+
+    Requests are classed as point reads, writes, searches or recommendations
+    by their method & path. Requests over their class's limit are rejected
+    with a `503` and a `Retry-After` header before they take a thread or a
+    database connection. The latency & pool wait of the admitted requests
+    adapt the limits, see `core.admission`. Other routes, e.g. the health
+    check & metrics, are never shed.
+
+    Args:
+        app (ASGIApp): The application to wrap.
+        controller (AdmissionController): Decides which requests to admit.
+        retry_after (int): The seconds rejected clients are told to wait.
+    """
+
+    def __init__(
+        self, app: ASGIApp, controller: admission.AdmissionController, retry_after: int
+    ) -> None:
+        self.app = app
+        self.controller = controller
+        self.retry_after = retry_after
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        route_class = (
+            _route_class(scope["method"], scope["path"])
+            if scope["type"] == "http"
+            else None
+        )
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not self.controller.try_acquire(route_class):
+            response = JSONResponse(
+                {"error": "The service is overloaded, please try again later"},
+                status_code=503,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            timings = instrumentation.current()
+            self.controller.release(
+                route_class,
+                time.perf_counter() - started_at,
+                timings.pool_wait if timings is not None else 0.0,
+            )
+
+
+def _route_class(method: str, path: str) -> Optional[str]:
+    path = _VERSION_PREFIX.sub("", path).rstrip("/")
+    if path.startswith("/service-providers"):
+        if path.endswith("/recommend"):
+            return admission.RECOMMEND
+        if path.endswith("/batch-get"):
+            return admission.READ
+        return admission.SEARCH
+    if path.startswith("/service-provider"):
+        return admission.READ if method == "GET" else admission.WRITE
+    if path.startswith("/skills"):
+        return admission.READ
+    return None
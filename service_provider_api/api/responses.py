@@ -0,0 +1,19 @@
+"""Module to hold the response classes used by the API."""
+
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from service_provider_api.core import instrumentation
+
+
+class TimedJSONResponse(JSONResponse):
+    """A JSON response that records how long it took to render its body.
+
+    The render time is added to the serialization time of the request
+    currently being served.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with instrumentation.timed("serialization"):
+            return super().render(content)
@@ -1,3 +1,4 @@
+from enum import Enum
 from uuid import UUID
 from datetime import date
 from typing import Optional
@@ -139,14 +140,115 @@ class ServiceProviderReview(BaseSchema):
     user_id: UUID
 
 
+class CountMode(str, Enum):
+    """How the total number of search results is counted.
+
+    Attributes:
+        exact: Counted exactly, in the same statement as the page.
+        estimated: Estimated from the query planner's row estimate, which is
+            much cheaper than an exact count for very broad searches.
+        none: Not counted.
+    """
+
+    exact = "exact"
+    estimated = "estimated"
+    none = "none"
+
+
 class ServiceProvidersList(BaseSchema):
     """Schema for a list of service providers.
 
     Args:
         service_providers (list): A list of service providers.
+        total (int, optional): The number of service providers matching the
+            search, across every page. None unless it was asked for.
     """
 
     service_providers: list[ServiceProviderSchema]
+    total: Optional[int] = None
+
+
+class SkillFacet(BaseSchema):
+    """Schema for the number of matching service providers with a skill.
+
+    Args:
+        skill (str): The skill.
+        count (int): The number of matching service providers with it.
+    """
+
+    skill: str
+    count: int
+
+
+class RangeFacet(BaseSchema):
+    """Schema for the number of matching service providers in a range.
+
+    Args:
+        gte (float): The lower bound of the range, inclusive.
+        lt (float, optional): The upper bound of the range, exclusive. None
+            if the range is unbounded.
+        count (int): The number of matching service providers in the range.
+    """
+
+    gte: float
+    lt: Optional[float]
+    count: int
+
+
+class SearchFacets(BaseSchema):
+    """Schema for the facet counts of a search.
+
+    The counts are over every service provider matching the search, not
+    just the page returned.
+
+    Args:
+        skills (list): The most common skills among the matches.
+        cost_in_pence (list): The matches in each cost range.
+        review_rating (list): The matches in each review rating range.
+    """
+
+    skills: list[SkillFacet]
+    cost_in_pence: list[RangeFacet]
+    review_rating: list[RangeFacet]
+
+
+class FacetedServiceProvidersList(ServiceProvidersList):
+    """Schema for a list of service providers, with the search's facets.
+
+    Args:
+        service_providers (list): A list of service providers.
+        total (int, optional): The number of service providers matching the
+            search, across every page. None unless it was asked for.
+        facets (SearchFacets): The facet counts of the search.
+    """
+
+    facets: SearchFacets
+
+
+class ServiceProviderBatchGetParams(BaseSchema):
+    """A class used to represent the body used to fetch multiple service
+    providers by their IDs in a single request.
+
+    Args:
+        ids (list[UUID]): The IDs of the service providers to fetch.
+    """
+
+    ids: list[UUID] = Field(min_items=1, max_items=500)
+
+
+class ServiceProviderBatchGetResponse(BaseSchema):
+    """Schema for the response of a batch get of service providers.
+
+    Every requested ID is present as a key. IDs that could not be found
+    map to `null` so clients can tell a missing provider apart from one
+    that was never requested.
+
+    Args:
+        service_providers (dict): A mapping of service provider ID to the
+            service provider, or `None` if it could not be found.
+    """
+
+    service_providers: dict[UUID, Optional[ServiceProviderSchema]]
 
 
 class ServiceProviderRecommendationParams(BaseSchema):
@@ -182,6 +284,10 @@ class ServiceProviderListFilterParams(BaseSchema):
         reviews_lt (int, optional): The maximum average review of the service provider.
         reviews_gt (int, optional): The minimum average review of the service provider.
         name (str, optional): The name of the service provider to filter by.
+        name_query (str, optional): Part of the name of the service provider to
+            search for. Matches names that start with or contain it, ignoring
+            case, and names that are close to it if the database supports
+            trigram matching. The closest matches are listed first.
         skills (list, optional): A list of skills that the service provider needs.
         cost_gt (int, optional): The minimum cost of the service provider.
         cost_lt (int, optional): The maximum cost of the service provider.
@@ -192,7 +298,30 @@ class ServiceProviderListFilterParams(BaseSchema):
     reviews_gt: float = Field(default=0, ge=0, le=5)
     reviews_lt: float = Field(default=5, le=5, ge=0)
     name: Optional[str] = Field(default=None)
+    name_query: Optional[str] = Field(default=None, min_length=1, max_length=100)
     skills: Optional[list[str]] = Field(default=None)
     cost_gt: Optional[int] = Field(default=None)
     cost_lt: Optional[int] = Field(default=None)
     availability: Optional[list[ServiceProviderAvailabilitySchema]] = Field(default=[])
+
+
+class SkillSuggestion(BaseSchema):
+    """Schema for a suggested skill.
+
+    Args:
+        skill (str): The skill.
+        provider_count (int): The number of service providers with the skill.
+    """
+
+    skill: str
+    provider_count: int
+
+
+class SkillSuggestions(BaseSchema):
+    """Schema for the skills suggested for a prefix.
+
+    Args:
+        suggestions (list): The suggested skills, most common first.
+    """
+
+    suggestions: list[SkillSuggestion]
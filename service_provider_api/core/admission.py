@@ -0,0 +1,182 @@
+"""Module used to decide which requests to admit while the service is overloaded.
+
+Under overload requests queue for a thread in the threadpool and then for a
+connection in the database pool, so their latency grows without bound until
+everything times out. Instead each class of route has a limit on how many of
+its requests are served at once, and requests over the limit are rejected
+straight away, so that the requests that are admitted are served quickly.
+
+The limits adapt to the latency they produce, like TCP's congestion window
+(additive increase, multiplicative decrease). They start at their maximum,
+so an idle service admits everything it's configured to. While a class's
+requests are served within its target latency, and its limit is being used,
+the limit grows slowly back towards it. When a request is slower than the
+target the limit is cut.
+
+Every class shares the database pool. When requests wait too long for a
+connection, the cut is taken by the lowest priority class that's being
+served, e.g. recommendations before searches and searches before point
+reads. So expensive queries are shed first, and cheap reads keep their
+capacity while they're still fast.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from service_provider_api.core import metrics
+
+# route classes, from the highest priority to the lowest
+READ = "read"
+WRITE = "write"
+SEARCH = "search"
+RECOMMEND = "recommend"
+ROUTE_CLASSES = (READ, WRITE, SEARCH, RECOMMEND)
+
+# how much a limit is cut by when its requests are too slow
+BACKOFF = 0.9
+MIN_LIMIT = 1
+
+
+@dataclass
+class AdaptiveLimit:
+    """The adaptive concurrency limit of one class of route.
+
+    Args:
+        target_latency (float): The seconds its requests should be served in.
+        max_limit (int): The most requests of the class served at once.
+        limit (int, optional): The current limit. Defaults to the max.
+    """
+
+    target_latency: float
+    max_limit: int
+    limit: Optional[int] = None
+    in_flight: int = 0
+    _fast_requests: int = field(default=0, repr=False)
+    _last_decrease: float = field(default=0.0, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.limit is None:
+            self.limit = max(self.max_limit, MIN_LIMIT)
+
+    def increase(self) -> None:
+        """Grow the limit by one request per limit's worth of fast requests.
+
+        Returns:
+            None
+        """
+
+        # only while the limit is being used, otherwise it's not being tested
+        if self.limit >= self.max_limit or self.in_flight + 1 < self.limit / 2:
+            return
+        self._fast_requests += 1
+        if self._fast_requests >= self.limit:
+            self.limit += 1
+            self._fast_requests = 0
+
+    def decrease(self) -> None:
+        """Cut the limit, at most once per target latency.
+
+        The requests already in flight when the limit is cut finish over the
+        next target latency or so, and are as slow as the one that caused
+        the cut, so they don't cut it again.
+
+        Returns:
+            None
+        """
+
+        now = time.monotonic()
+        if now - self._last_decrease >= self.target_latency:
+            self.limit = max(int(self.limit * BACKOFF), MIN_LIMIT)
+            self._fast_requests = 0
+            self._last_decrease = now
+
+
+class AdmissionController:
+    """Admits requests while their route class is under its adaptive limit.
+
+    It's only used from the event loop, so it needs no locking.
+
+    Args:
+        target_latencies (dict[str, float]): The target latency of each route
+            class in seconds.
+        max_limits (dict[str, int]): The most requests of each route class
+            served at once.
+        pool_wait_target (float): The most seconds requests should wait for a
+            database connection.
+    """
+
+    def __init__(
+        self,
+        target_latencies: dict[str, float],
+        max_limits: dict[str, int],
+        pool_wait_target: float,
+    ) -> None:
+        self.limits = {
+            route_class: AdaptiveLimit(
+                target_latencies[route_class], max_limits[route_class]
+            )
+            for route_class in ROUTE_CLASSES
+        }
+        self.pool_wait_target = pool_wait_target
+
+    def try_acquire(self, route_class: str) -> bool:
+        """Admit a request, if its class is under its limit.
+
+        Args:
+            route_class (str): The class of the request's route.
+
+        Returns:
+            bool: True if the request is admitted, and must be released.
+        """
+
+        limit = self.limits[route_class]
+        if limit.in_flight >= limit.limit:
+            metrics.ADMISSION_REJECTED.inc((route_class,))
+            return False
+        limit.in_flight += 1
+        return True
+
+    def release(self, route_class: str, latency: float, pool_wait: float) -> None:
+        """Record that an admitted request finished, and adapt the limits.
+
+        Args:
+            route_class (str): The class of the request's route.
+            latency (float): The seconds the request took.
+            pool_wait (float): The seconds it waited for a database connection.
+
+        Returns:
+            None
+        """
+
+        limit = self.limits[route_class]
+        limit.in_flight -= 1
+
+        congested = None
+        if pool_wait > self.pool_wait_target:
+            congested = self._lowest_priority_in_flight(route_class)
+            self.limits[congested].decrease()
+
+        if latency > limit.target_latency:
+            limit.decrease()
+        elif congested is None:
+            limit.increase()
+
+    def stats(self) -> dict:
+        """The limit & requests in flight of each route class.
+
+        Returns:
+            dict: The values keyed by route class & state, for a gauge.
+        """
+
+        stats = {}
+        for route_class, limit in self.limits.items():
+            stats[(route_class, "limit")] = limit.limit
+            stats[(route_class, "in_flight")] = limit.in_flight
+        return stats
+
+    def _lowest_priority_in_flight(self, route_class: str) -> str:
+        for candidate in reversed(ROUTE_CLASSES):
+            if candidate == route_class or self.limits[candidate].in_flight:
+                return candidate
+        return route_class
@@ -0,0 +1,111 @@
+"""Module used to capture the shape of production traffic.
+
+Captured requests are appended to a local JSONL file that's rotated once it
+reaches a maximum size, so that they can be replayed against another build
+with `benchmarks.replay`. Captures are sanitized: headers are never
+recorded, so neither are the user IDs sent in them, and bodies are only
+recorded for the read-only endpoints whose bodies are filters rather than
+user data.
+"""
+
+import logging
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs
+
+import orjson
+
+# route templates of the endpoints whose bodies are recorded
+BODY_ROUTES = frozenset(
+    {
+        "/service-providers/",
+        "/service-providers/recommend",
+        "/service-providers/batch-get",
+    }
+)
+# bodies larger than this aren't buffered, and aren't recorded
+MAX_BODY_BYTES = 64 * 1024
+
+
+def sanitize(
+    method: str,
+    route: Optional[str],
+    path: str,
+    query_string: bytes,
+    body: Optional[bytes],
+) -> dict:
+    """Build the sanitized record of a request.
+
+    Args:
+        method (str): The HTTP method of the request.
+        route (Optional[str]): The route template that served the request,
+            or None if no route matched.
+        path (str): The path of the request.
+        query_string (bytes): The raw query string of the request.
+        body (Optional[bytes]): The body of the request, if it was buffered.
+
+    Returns:
+        dict: The request, without its headers, and without its body unless
+            the route is one of `BODY_ROUTES`.
+    """
+
+    record = {
+        "method": method,
+        "route": route,
+        "path": path,
+        "query": parse_qs(query_string.decode("latin-1")),
+    }
+    if route in BODY_ROUTES and body:
+        try:
+            record["body"] = orjson.loads(body)
+        except orjson.JSONDecodeError:
+            pass
+    return record
+
+
+class TrafficRecorder:
+    """Appends captured requests to a rotating JSONL file.
+
+    The file is written through a dedicated logger that doesn't propagate to
+    the application logs, and rotated by the standard library's
+    `RotatingFileHandler`.
+
+    Args:
+        path (str): The file to write the captures to.
+        max_bytes (int): The size at which the file is rotated.
+        backup_count (int): The number of rotated files to keep.
+    """
+
+    def __init__(self, path: str, max_bytes: int, backup_count: int) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count
+        )
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger = logging.getLogger(f"{__name__}.{path}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._logger.addHandler(self._handler)
+
+    def record(self, record: dict) -> None:
+        """Append a captured request.
+
+        Args:
+            record (dict): The sanitized request.
+
+        Returns:
+            None
+        """
+
+        self._logger.info(orjson.dumps(record).decode())
+
+    def close(self) -> None:
+        """Flush & close the capture file.
+
+        Returns:
+            None
+        """
+
+        self._logger.removeHandler(self._handler)
+        self._handler.close()
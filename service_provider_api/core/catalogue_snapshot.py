@@ -0,0 +1,279 @@
+"""Module used to share a snapshot of the catalogue's skill counts between workers.
+
+Every worker process loads the skill autocomplete index at startup, and
+counting the providers with each skill in Postgres takes a few hundred
+milliseconds for a large catalogue, run again by every worker started or
+recycled. Instead one builder process writes the counts to a small binary
+file, and a worker starting up reads them from it.
+
+The file is a header, a table of sections, then the sections themselves,
+each aligned to 8 bytes and in native byte order, as it's only read on the
+host that wrote it:
+
+- `skill_name_offsets` & `skill_names`: the distinct skills, sorted by
+  their case-folded name, as UTF-8. Skill `i`'s name is
+  `skill_names[skill_name_offsets[i]:skill_name_offsets[i + 1]]`.
+- `skill_counts`: how many providers have each skill.
+
+A new generation is written to a temporary file which then replaces the
+snapshot, so readers never see a partial file.
+"""
+
+import mmap
+import os
+import struct
+import time
+from array import array
+from typing import Optional
+
+import structlog
+from sqlalchemy import distinct, func, select
+from sqlalchemy.orm import Session
+
+from service_provider_api.core.config import settings
+from service_provider_api.core.repositories.service_provider_search import (
+    REFRESH_BATCH_SIZE,
+    ServiceProviderSearchRepository,
+)
+from service_provider_api.database import models
+
+log = structlog.get_logger()
+
+MAGIC = b"SPCATLG\x00"
+VERSION = 2
+# written in native byte order, read back to check the reader's matches
+_BYTE_ORDER_MARK = 0x01020304
+# magic, version, byte order mark, providers, skills, generation, built at
+_HEADER = struct.Struct("=8sIIIIQd")
+# the sections, in the order they're written, and their array typecodes
+_SECTIONS = (
+    ("skill_name_offsets", "I"),
+    ("skill_names", "B"),
+    ("skill_counts", "I"),
+)
+# the offset & length in bytes of each section
+_SECTION = struct.Struct("=QQ")
+_ALIGNMENT = 8
+
+
+class InvalidSnapshot(Exception):
+    """Raised when a file isn't a catalogue snapshot this version can read."""
+
+    pass
+
+
+class CatalogueSnapshot:
+    """A catalogue snapshot, mapped read-only into memory.
+
+    Nothing is copied out of the file when it's opened, the sections are
+    read in place through typed memoryviews. The mapping is released once
+    the snapshot is no longer referenced.
+
+    Args:
+        path (str): The path of the snapshot file.
+
+    Raises:
+        InvalidSnapshot: If the file isn't a snapshot this version can read.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as file:
+            try:
+                self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise InvalidSnapshot(f"{path} is empty") from e
+        self.path = path
+
+        view = memoryview(self._mmap)
+        sections_at = _HEADER.size
+        if len(view) < sections_at + _SECTION.size * len(_SECTIONS):
+            raise InvalidSnapshot(f"{path} is truncated")
+        (
+            magic,
+            version,
+            byte_order_mark,
+            providers,
+            skills,
+            generation,
+            built_at,
+        ) = _HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise InvalidSnapshot(f"{path} isn't a catalogue snapshot")
+        if version != VERSION or byte_order_mark != _BYTE_ORDER_MARK:
+            raise InvalidSnapshot(f"{path} was written by an incompatible version")
+
+        sections = {}
+        for index, (name, typecode) in enumerate(_SECTIONS):
+            offset, length = _SECTION.unpack_from(
+                view, sections_at + index * _SECTION.size
+            )
+            if offset + length > len(view):
+                raise InvalidSnapshot(f"{path} is truncated")
+            sections[name] = view[offset : offset + length].cast(typecode)
+
+        self.generation: int = generation
+        self.built_at: float = built_at
+        self._providers = providers
+        self._skills = skills
+        self._skill_name_offsets = sections["skill_name_offsets"]
+        self._skill_names = sections["skill_names"]
+        self._skill_counts = sections["skill_counts"]
+
+    def __len__(self) -> int:
+        return self._providers
+
+    @property
+    def age(self) -> float:
+        """The number of seconds since the snapshot was built."""
+        return time.time() - self.built_at
+
+    def skill_counts(self) -> dict[str, int]:
+        """Count the service providers with each skill.
+
+        Returns:
+            dict[str, int]: The number of service providers with each skill.
+        """
+
+        return {
+            self._skill(number): self._skill_counts[number]
+            for number in range(self._skills)
+        }
+
+    def _skill(self, number: int) -> str:
+        start, end = self._skill_name_offsets[number : number + 2]
+        return str(self._skill_names[start:end], "utf-8")
+
+
+def write_snapshot(path: str, db: Session, generation: Optional[int] = None) -> int:
+    """Write a new generation of the catalogue snapshot.
+
+    The search table is refreshed first, then the providers with each skill
+    are counted from it. The snapshot replaces the file at `path` atomically
+    once it's been written in full.
+
+    Args:
+        path (str): The path of the snapshot file.
+        db (Session): The database session.
+        generation (Optional[int], optional): The generation of the new
+            snapshot. Defaults to one more than the snapshot it replaces.
+
+    Returns:
+        int: The number of service providers in the snapshot.
+
+    Raises:
+        FailedToRefreshSearch: If the search table couldn't be refreshed.
+    """
+
+    while ServiceProviderSearchRepository.refresh(db) == REFRESH_BATCH_SIZE:
+        pass
+    if generation is None:
+        generation = _current_generation(path) + 1
+    built_at = time.time()
+
+    search = models.ServiceProviderSearch
+    provider_skills = select(
+        search.service_provider_id, func.unnest(search.skills).label("skill")
+    ).subquery()
+    counts = dict(
+        db.query(
+            provider_skills.c.skill,
+            func.count(distinct(provider_skills.c.service_provider_id)),
+        )
+        .group_by(provider_skills.c.skill)
+        .all()
+    )
+    providers = db.query(func.count()).select_from(search).scalar()
+    db.commit()
+
+    skills = sorted(counts, key=lambda skill: (skill.casefold(), skill))
+    skill_counts = array("I", (counts[skill] for skill in skills))
+    skill_names, skill_name_offsets = bytearray(), array("I", [0])
+    for skill in skills:
+        skill_names += skill.encode()
+        skill_name_offsets.append(len(skill_names))
+
+    sections = {
+        "skill_name_offsets": skill_name_offsets,
+        "skill_names": skill_names,
+        "skill_counts": skill_counts,
+    }
+    _write_atomically(
+        path,
+        _HEADER.pack(
+            MAGIC,
+            VERSION,
+            _BYTE_ORDER_MARK,
+            providers,
+            len(skills),
+            generation,
+            built_at,
+        ),
+        [memoryview(sections[name]).cast("B") for name, _ in _SECTIONS],
+    )
+    log.info(
+        "wrote catalogue snapshot",
+        path=path,
+        generation=generation,
+        service_providers=providers,
+    )
+    return providers
+
+
+def _current_generation(path: str) -> int:
+    try:
+        return CatalogueSnapshot(path).generation
+    except (OSError, InvalidSnapshot):
+        return 0
+
+
+def _write_atomically(path: str, header: bytes, sections: list[memoryview]) -> None:
+    offset = _align(len(header) + _SECTION.size * len(sections))
+    table = bytearray()
+    for section in sections:
+        table += _SECTION.pack(offset, len(section))
+        offset = _align(offset + len(section))
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as file:
+            file.write(header)
+            file.write(table)
+            for section in sections:
+                file.write(bytes(_align(file.tell()) - file.tell()))
+                file.write(section)
+            file.flush()
+            os.fsync(file.fileno())
+        # readers either see the old file or the new one, never part of one
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def fresh_snapshot() -> Optional[CatalogueSnapshot]:
+    """Open the catalogue snapshot, if it's configured & recent enough.
+
+    Returns:
+        Optional[CatalogueSnapshot]: The snapshot, or None if the caller
+            should read from the database instead.
+    """
+
+    path = settings.CATALOGUE_SNAPSHOT_PATH
+    if not path:
+        return None
+    try:
+        snapshot = CatalogueSnapshot(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, InvalidSnapshot) as e:
+        log.error("Failed to open the catalogue snapshot", error=e)
+        return None
+    if snapshot.age > settings.CATALOGUE_SNAPSHOT_MAX_AGE_S:
+        return None
+    log.info("opened catalogue snapshot", generation=snapshot.generation)
+    return snapshot
@@ -6,6 +6,8 @@ the environment variables. The settings are then used to configure
 the application.
 """
 
+from typing import Optional
+
 from pydantic import BaseSettings, SecretStr
 
 
@@ -14,6 +16,127 @@ class Settings(BaseSettings):
     DATABASE_HOST: str = "localhost"
     DATABASE_PASSWORD: SecretStr = SecretStr("password")
     LOG_LEVEL: str = "INFO"
+    # log records waiting to be written, more than this are dropped
+    LOG_QUEUE_SIZE: int = 10_000
+    # by event name, e.g. LOG_SAMPLE_RATES='{"request completed": 0.1}'
+    LOG_SAMPLE_RATES: dict[str, float] = {}
+    LOG_RATE_LIMITS: dict[str, float] = {}
+
+    # the production server, see `scripts.start_webserver.serve`
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    # defaults to one worker per CPU available to the process
+    SERVER_WORKERS: Optional[int] = None
+    # workers are recycled after this many requests, plus up to the jitter
+    SERVER_MAX_REQUESTS: Optional[int] = 10_000
+    SERVER_MAX_REQUESTS_JITTER: int = 1_000
+    SERVER_BACKLOG: int = 2048
+    # the workers export their metrics to this directory, and whichever serves
+    # a scrape merges them, see `core.metrics`. The server creates a temporary
+    # one if it isn't set.
+    METRICS_MULTIPROCESS_DIR: Optional[str] = None
+    METRICS_EXPORT_S: float = 1.0
+
+    # admission control, requests over their route class's adaptive concurrency
+    # limit are rejected with a 503, see `core.admission`. The route classes
+    # are read, write, search & recommend.
+    ADMISSION_CONTROL: bool = True
+    ADMISSION_TARGET_LATENCY_MS: dict[str, float] = {
+        "read": 50.0,
+        "write": 100.0,
+        "search": 250.0,
+        "recommend": 500.0,
+    }
+    ADMISSION_MAX_CONCURRENCY: dict[str, int] = {
+        "read": 40,
+        "write": 20,
+        "search": 10,
+        "recommend": 4,
+    }
+    ADMISSION_POOL_WAIT_TARGET_MS: float = 10.0
+    ADMISSION_RETRY_AFTER_S: int = 1
+
+    # startup, the schema is managed by `docker/init.sql` in production
+    CREATE_SCHEMA_ON_STARTUP: bool = True
+    WARMUP_ON_STARTUP: bool = True
+    WARMUP_POOL_CONNECTIONS: int = 5
+
+    # write-behind reviews, written in batches, see `core.review_batcher`
+    REVIEW_WRITE_BEHIND: bool = False
+    REVIEW_BATCH_MAX_SIZE: int = 500
+    REVIEW_BATCH_MAX_DELAY_MS: float = 5.0
+
+    # how often the rating shards of popular providers are compacted
+    RATING_COMPACTION_INTERVAL_S: Optional[float] = 60.0
+
+    # writes publish change events over NOTIFY, so every worker's in-process
+    # caches follow the other workers' writes, see `core.invalidation`
+    CACHE_INVALIDATION_BUS: bool = True
+
+    # identical concurrent reads share one set of queries, see `core.singleflight`
+    READ_COALESCING: bool = True
+
+    # provider IDs confirmed missing are answered from memory, without a query,
+    # see `core.provider_misses`
+    PROVIDER_MISS_CACHE: bool = True
+    PROVIDER_MISS_CACHE_TTL_S: float = 60.0
+    PROVIDER_MISS_CACHE_SIZE: int = 10_000
+
+    # the skill autocomplete index is also reloaded periodically, as a backstop
+    SKILL_INDEX_REFRESH_S: Optional[float] = 300.0
+
+    # the skill counts the workers load the skill index from at startup, see
+    # `core.catalogue_snapshot`, disabled unless a path is set
+    CATALOGUE_SNAPSHOT_PATH: Optional[str] = None
+    # older snapshots aren't used, the skill index is loaded from Postgres instead
+    CATALOGUE_SNAPSHOT_MAX_AGE_S: float = 120.0
+    # how often the builder, `scripts.catalogue_snapshot`, writes a generation
+    CATALOGUE_SNAPSHOT_BUILD_S: float = 30.0
+
+    # searches read the denormalized search table while it's no more than this
+    # far behind, None to always search the live tables. A few refreshes, as
+    # under constant writes the queue always holds about a refresh's worth
+    SEARCH_TABLE_MAX_STALENESS_S: Optional[float] = 5.0
+    # how often each process refreshes the search rows of changed providers
+    SEARCH_TABLE_REFRESH_S: Optional[float] = 1.0
+
+    # the query cost guard of searches & recommendations, see
+    # `core.repositories.service_provider.plan_search`. Costs are the planner's
+    # estimated total cost of the page's query, None disables the threshold.
+    SEARCH_MAX_PAGE_SIZE: int = 50
+    SEARCH_MAX_AVAILABILITY_RANGES: int = 10
+    SEARCH_REJECT_COST: Optional[float] = 250_000.0
+    # searches estimated to cost more run on the small low priority pool
+    SEARCH_LOW_PRIORITY_COST: Optional[float] = 25_000.0
+    SEARCH_LOW_PRIORITY_POOL_SIZE: int = 2
+    SEARCH_LOW_PRIORITY_POOL_TIMEOUT_S: float = 5.0
+    # the statement timeout of each of a search's queries, None for no limit
+    SEARCH_STATEMENT_TIMEOUT_MS: Optional[float] = 5_000.0
+
+    # slow query log, disabled unless a threshold is set
+    SLOW_QUERY_THRESHOLD_MS: Optional[float] = None
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = 0.1
+    SLOW_QUERY_EXPLAIN_PATH: str = "slow_query_plans.jsonl"
+
+    # per-request profiling, disabled unless a sample rate or admin token is set
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_ADMIN_TOKEN: Optional[SecretStr] = None
+    PROFILE_INTERVAL_MS: float = 1.0
+    PROFILE_OUTPUT_DIR: str = "profiles"
+
+    # traffic capture, disabled unless a sample rate is set
+    CAPTURE_SAMPLE_RATE: float = 0.0
+    CAPTURE_PATH: str = "captures/traffic.jsonl"
+    CAPTURE_MAX_BYTES: int = 50 * 1024 * 1024
+    CAPTURE_BACKUP_COUNT: int = 10
+
+    @property
+    def PROFILING_ENABLED(self) -> bool:
+        return self.PROFILE_SAMPLE_RATE > 0 or self.PROFILE_ADMIN_TOKEN is not None
+
+    @property
+    def CAPTURE_ENABLED(self) -> bool:
+        return self.CAPTURE_SAMPLE_RATE > 0
 
     @property
     def DATABASE_URL(self) -> str:
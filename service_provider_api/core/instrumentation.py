@@ -0,0 +1,170 @@
+"""Module used to collect timings for the request currently being served.
+
+A `RequestTimings` instance is bound to a context variable at the start of
+each request. Because FastAPI copies the context into the threadpool that
+runs our sync endpoints, the SQLAlchemy engine events and the connection
+pool below can find the timings of the request they're doing work for.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+
+@dataclass
+class RequestTimings:
+    """The timings collected while serving a single request.
+
+    All durations are in seconds.
+
+    Args:
+        started_at (float): The `perf_counter` value when the request started.
+        pool_wait (float): Time spent waiting for a connection from the pool.
+        sql_count (int): The number of SQL statements executed.
+        sql_time (float): Time spent executing SQL statements.
+        serialization (float): Time spent rendering the response body.
+    """
+
+    started_at: float = field(default_factory=perf_counter)
+    pool_wait: float = 0.0
+    sql_count: int = 0
+    sql_time: float = 0.0
+    serialization: float = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        """The time since the request started."""
+        return perf_counter() - self.started_at
+
+    def server_timing(self) -> str:
+        """Format the timings as the value of a `Server-Timing` header.
+
+        Returns:
+            str: The header value.
+        """
+
+        return ", ".join(
+            [
+                f"total;dur={self.elapsed * 1000:.2f}",
+                f"pool;dur={self.pool_wait * 1000:.2f}",
+                f'db;dur={self.sql_time * 1000:.2f};desc="{self.sql_count} queries"',
+                f"serialize;dur={self.serialization * 1000:.2f}",
+            ]
+        )
+
+    def as_log_fields(self) -> dict:
+        """Return the timings as fields for a structured log event.
+
+        Returns:
+            dict: The timings in milliseconds, and the SQL statement count.
+        """
+
+        return {
+            "duration_ms": round(self.elapsed * 1000, 2),
+            "pool_wait_ms": round(self.pool_wait * 1000, 2),
+            "sql_count": self.sql_count,
+            "sql_ms": round(self.sql_time * 1000, 2),
+            "serialization_ms": round(self.serialization * 1000, 2),
+        }
+
+
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def current() -> Optional[RequestTimings]:
+    """Get the timings of the request currently being served.
+
+    Returns:
+        Optional[RequestTimings]: The timings, or None outside of a request.
+    """
+
+    return _current_timings.get()
+
+
+@contextmanager
+def track_request() -> Iterator[RequestTimings]:
+    """Bind a new `RequestTimings` to the current context.
+
+    Yields:
+        RequestTimings: The timings for the request.
+    """
+
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+@contextmanager
+def timed(attribute: str) -> Iterator[None]:
+    """Add the time spent in the block to a duration on the current request.
+
+    Args:
+        attribute (str): The name of the `RequestTimings` duration to add to.
+    """
+
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        setattr(
+            timings, attribute, getattr(timings, attribute) + perf_counter() - start
+        )
+
+
+class InstrumentedQueuePool(QueuePool):
+    """A `QueuePool` that records how long requests wait for a connection."""
+
+    def _do_get(self):
+        with timed("pool_wait"):
+            return super()._do_get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = perf_counter() - conn.info["query_start_time"].pop()
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.sql_count += 1
+        timings.sql_time += duration
+
+
+def _handle_error(context) -> None:
+    # after_cursor_execute isn't called for failed statements
+    if context.connection is not None and context.connection.info.get(
+        "query_start_time"
+    ):
+        context.connection.info["query_start_time"].pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach the SQL timing listeners to an engine.
+
+    Args:
+        engine (Engine): The engine to instrument.
+
+    Returns:
+        None
+    """
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
@@ -0,0 +1,365 @@
+"""Module used to keep in-process caches coherent across worker processes.
+
+Every worker keeps its own in-memory caches, such as the skill index, and
+only sees its own writes. Writes therefore publish a change event with
+Postgres' `NOTIFY`, in the same transaction as the change, so the event is
+only delivered if the change commits. Each worker runs a listener thread
+which `LISTEN`s for the events of other workers and passes them to the
+caches that subscribed, so they can evict or update the affected entries.
+
+Notifications sent while a listener isn't listening are lost, so each time
+it starts listening, when it first connects and after it reconnects, every
+subscriber is asked to resync, e.g. by reloading.
+"""
+
+import json
+import os
+import select
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+from uuid import UUID, uuid4
+
+import psycopg2
+import psycopg2.extensions
+import structlog
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from service_provider_api.core import metrics
+from service_provider_api.core.config import settings
+
+log = structlog.get_logger()
+
+CHANNEL = "service_provider_changes"
+# Postgres rejects notifications with payloads of 8000 bytes or more
+MAX_PAYLOAD_BYTES = 7_900
+# events about many providers are split, so that each fits in a notification
+MAX_IDS_PER_EVENT = 100
+# how long the listener waits for a notification before checking if it's stopping
+POLL_INTERVAL = 0.5
+
+# kinds of event. Only changes a cache subscribes to are published, as each
+# NOTIFY takes a cluster-wide lock while its transaction commits
+SERVICE_PROVIDER_CHANGED = "service_provider"
+# sent instead of an event too large for a notification, everything resyncs
+RESYNC = "resync"
+
+
+@dataclass
+class ChangeEvent:
+    """A change to one or more service providers, published by a worker.
+
+    Attributes:
+        kind (str): What changed, e.g. `SERVICE_PROVIDER_CHANGED`.
+        service_provider_ids (list[UUID]): The IDs of the changed providers.
+        origin (str): The worker process that made the change.
+        sent_at (float): When the change was published, as a UNIX timestamp.
+        data (dict): Anything else subscribers need to know about the change.
+    """
+
+    kind: str
+    service_provider_ids: list[UUID]
+    origin: str
+    sent_at: float
+    data: dict = field(default_factory=dict)
+
+
+@dataclass
+class _Subscriber:
+    on_change: Callable[[ChangeEvent], None]
+    on_resync: Callable[[], None]
+
+
+_subscribers: list[_Subscriber] = []
+_origin = uuid4().hex
+
+
+def _new_origin() -> None:
+    global _origin
+    _origin = uuid4().hex
+
+
+# forked workers mustn't share their parent's origin, or they'd ignore each other
+os.register_at_fork(after_in_child=_new_origin)
+
+
+def origin() -> str:
+    """The ID this process publishes its changes under.
+
+    Returns:
+        str: The ID of this worker process.
+    """
+
+    return _origin
+
+
+def subscribe(
+    on_change: Callable[[ChangeEvent], None], on_resync: Callable[[], None]
+) -> None:
+    """Receive the changes other workers make.
+
+    Args:
+        on_change (Callable[[ChangeEvent], None]): Called, on the listener's
+            thread, with each change made by another worker.
+        on_resync (Callable[[], None]): Called when changes may have been
+            missed, so everything derived from the database has to be reloaded.
+
+    Returns:
+        None
+    """
+
+    _subscribers.append(_Subscriber(on_change, on_resync))
+
+
+def unsubscribe(on_change: Callable[[ChangeEvent], None]) -> None:
+    """Stop receiving changes.
+
+    Args:
+        on_change (Callable[[ChangeEvent], None]): The function passed to
+            `subscribe`.
+
+    Returns:
+        None
+    """
+
+    _subscribers[:] = [s for s in _subscribers if s.on_change is not on_change]
+
+
+def publish(
+    db: Session, kind: str, service_provider_ids: Iterable[UUID], **data
+) -> None:
+    """Tell the other workers about a change.
+
+    Must be called in the transaction that makes the change, the event is
+    only delivered if the transaction commits. It doesn't commit.
+
+    Args:
+        db (Session): The database session making the change.
+        kind (str): What changed, e.g. `SERVICE_PROVIDER_CHANGED`.
+        service_provider_ids (Iterable[UUID]): The IDs of the changed providers.
+        **data: Anything else subscribers need to know about the change. Must
+            be serializable to JSON.
+
+    Returns:
+        None
+    """
+
+    ids = [str(id) for id in service_provider_ids]
+    if not settings.CACHE_INVALIDATION_BUS or not ids:
+        return
+
+    sent_at = time.time()
+    payloads = []
+    for start in range(0, len(ids), MAX_IDS_PER_EVENT):
+        payload = json.dumps(
+            {
+                "kind": kind,
+                "ids": ids[start : start + MAX_IDS_PER_EVENT],
+                "origin": _origin,
+                "sent_at": sent_at,
+                "data": data,
+            }
+        )
+        if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+            payload = json.dumps(
+                {"kind": RESYNC, "ids": [], "origin": _origin, "sent_at": sent_at}
+            )
+        payloads.append(payload)
+
+    db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        [
+            {"channel": CHANNEL, "payload": payload}
+            for payload in dict.fromkeys(payloads)
+        ],
+    )
+
+
+def dispatch(event: ChangeEvent) -> None:
+    """Pass a change to every subscriber.
+
+    Args:
+        event (ChangeEvent): The change.
+
+    Returns:
+        None
+    """
+
+    if event.kind == RESYNC:
+        resync()
+        return
+
+    for subscriber in list(_subscribers):
+        try:
+            subscriber.on_change(event)
+        except Exception as e:
+            log.error("Failed to apply a change event", kind=event.kind, error=e)
+
+
+def resync() -> None:
+    """Ask every subscriber to reload, as changes may have been missed.
+
+    Returns:
+        None
+    """
+
+    metrics.CACHE_INVALIDATION_RESYNCS.inc()
+    for subscriber in list(_subscribers):
+        try:
+            subscriber.on_resync()
+        except Exception as e:
+            log.error("Failed to resync after missing change events", error=e)
+
+
+class InvalidationListener:
+    """Listens for the changes other workers publish, on a background thread.
+
+    The listener holds its own connection outside of the pool, as it's
+    idle in `LISTEN` for its whole life. Every time it starts listening,
+    when it first connects and after reconnecting, it resyncs every
+    subscriber, as changes published before then were missed.
+
+    Args:
+        reconnect_delay (float, optional): The seconds to wait between
+            attempts to reconnect.
+        ignore_origin (Optional[str], optional): Changes published under this
+            ID are ignored. Defaults to this process's own changes.
+    """
+
+    def __init__(
+        self, reconnect_delay: float = 1.0, ignore_origin: Optional[str] = None
+    ) -> None:
+        self.reconnect_delay = reconnect_delay
+        self._ignore_origin = ignore_origin
+        self._stopping = threading.Event()
+        self._listening = threading.Event()
+        self._backend_pid: Optional[int] = None
+        self._thread = threading.Thread(
+            target=self._run, name="invalidation-listener", daemon=True
+        )
+
+    @property
+    def backend_pid(self) -> Optional[int]:
+        """The process ID of the listener's Postgres backend, if it's connected."""
+        return self._backend_pid
+
+    def start(self) -> None:
+        """Start listening.
+
+        Returns:
+            None
+        """
+
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop listening, and close the listener's connection.
+
+        Returns:
+            None
+        """
+
+        self._stopping.set()
+        self._thread.join()
+
+    def wait_until_listening(self, timeout: float) -> bool:
+        """Wait for the listener to connect & start listening.
+
+        Args:
+            timeout (float): The most seconds to wait.
+
+        Returns:
+            bool: True if the listener is listening.
+        """
+
+        return self._listening.wait(timeout)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(settings.DATABASE_URL)
+                connection.set_isolation_level(
+                    psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                self._backend_pid = connection.get_backend_pid()
+                # anything published before we were listening was missed,
+                # whether we were disconnected or hadn't connected yet, e.g.
+                # while the caches were being loaded
+                log.info("invalidation listener connected, resyncing")
+                resync()
+                self._listening.set()
+                self._listen(connection)
+            except psycopg2.Error as e:
+                log.warning("invalidation listener disconnected", error=e)
+                self._stopping.wait(self.reconnect_delay)
+            finally:
+                self._listening.clear()
+                self._backend_pid = None
+                if connection is not None:
+                    connection.close()
+
+    def _listen(self, connection) -> None:
+        ignore_origin = self._ignore_origin or _origin
+        while not self._stopping.is_set():
+            if not select.select([connection], [], [], POLL_INTERVAL)[0]:
+                continue
+            connection.poll()
+            while connection.notifies:
+                notification = connection.notifies.pop(0)
+                event = _parse(notification.payload)
+                if event is None:
+                    continue
+                metrics.CACHE_INVALIDATION_LAG.observe(
+                    max(time.time() - event.sent_at, 0.0)
+                )
+                if event.origin != ignore_origin:
+                    dispatch(event)
+
+
+def _parse(payload: str) -> Optional[ChangeEvent]:
+    try:
+        message = json.loads(payload)
+        return ChangeEvent(
+            kind=message["kind"],
+            service_provider_ids=[UUID(id) for id in message["ids"]],
+            origin=message["origin"],
+            sent_at=message["sent_at"],
+            data=message.get("data", {}),
+        )
+    except (ValueError, KeyError, TypeError) as e:
+        log.error("Ignoring a malformed change event", payload=payload, error=e)
+        return None
+
+
+_listener: Optional[InvalidationListener] = None
+
+
+def start_listener() -> InvalidationListener:
+    """Start the process's invalidation listener.
+
+    Returns:
+        InvalidationListener: The running listener.
+    """
+
+    global _listener
+    _listener = InvalidationListener()
+    _listener.start()
+    return _listener
+
+
+def stop_listener() -> None:
+    """Stop the process's invalidation listener.
+
+    Returns:
+        None
+    """
+
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
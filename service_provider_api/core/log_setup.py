@@ -1,29 +1,212 @@
 """Module used to configure the application logging.
 
-Creates a basic structlog logging configuration that can be used
-by the application.
+Creates a structlog logging configuration that can be used by the
+application. Logging is kept off the request path as much as possible:
+
+- events below the configured level are dropped before any processing.
+- events can be sampled or rate limited by name, before any fields are
+  computed or rendered.
+- fields wrapped in `Lazy` are only computed for events that are emitted.
+- events are rendered with orjson, and written to stderr by a background
+  thread that drains a bounded queue. If the queue is full, the event is
+  dropped rather than blocking the request. Uvicorn is run without its own
+  logging config, so its loggers propagate to the same queue, and without
+  its access log, as the request timing middleware logs every request.
 """
 
+import atexit
 import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Optional
 
+import orjson
 import structlog
-from structlog.stdlib import LoggerFactory
+from pydantic import BaseModel
 from structlog.processors import JSONRenderer
+from structlog.stdlib import LoggerFactory
 
+from service_provider_api.core import metrics
 from service_provider_api.core.config import settings
 
+_handler: Optional["_DroppingQueueHandler"] = None
+_listener: Optional[QueueListener] = None
+
+
+class Lazy:
+    """A log field that's only computed if the event is emitted.
+
+    The field is computed on the thread that logged the event, so it's safe
+    to use objects, such as database sessions, that belong to that thread.
+
+    Args:
+        func (Callable): Computes the value of the field.
+        *args: Positional arguments for `func`.
+        **kwargs: Keyword arguments for `func`.
+    """
+
+    def __init__(self, func: Callable[..., Any], *args, **kwargs) -> None:
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __call__(self) -> Any:
+        return self.func(*self.args, **self.kwargs)
+
+
+def evaluate_lazy_fields(logger, method_name: str, event_dict: dict) -> dict:
+    """Structlog processor that computes the `Lazy` fields of an event."""
+
+    for key, value in event_dict.items():
+        if isinstance(value, Lazy):
+            event_dict[key] = value()
+    return event_dict
+
+
+class EventSampler:
+    """Structlog processor that samples & rate limits events by name.
+
+    Args:
+        sample_rates (dict[str, float]): The fraction of each event to keep.
+        rate_limits (dict[str, float]): The most of each event to keep per
+            second. Bursts of up to one second's worth are allowed.
+    """
+
+    def __init__(
+        self, sample_rates: dict[str, float], rate_limits: dict[str, float]
+    ) -> None:
+        self.sample_rates = sample_rates
+        self.rate_limits = rate_limits
+        # event -> (tokens, last refill)
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, logger, method_name: str, event_dict: dict) -> dict:
+        event = event_dict.get("event")
+        rate = self.sample_rates.get(event)
+        if rate is not None and random.random() >= rate:
+            raise structlog.DropEvent
+
+        limit = self.rate_limits.get(event)
+        if limit is not None and not self._take_token(event, limit):
+            raise structlog.DropEvent
+
+        return event_dict
+
+    def _take_token(self, event: str, limit: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            tokens, refilled_at = self._buckets.get(event, (limit, now))
+            tokens = min(tokens + (now - refilled_at) * limit, limit)
+            if tokens < 1:
+                self._buckets[event] = (tokens, now)
+                return False
+            self._buckets[event] = (tokens - 1, now)
+            return True
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.dict()
+    return repr(value)
+
+
+def _render(event_dict: dict, **kwargs) -> str:
+    return orjson.dumps(event_dict, default=_default).decode()
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """A queue handler that drops records when the queue is full."""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.LOG_RECORDS_DROPPED.inc()
+
+
+def _new_queue() -> None:
+    global _listener
+    # a forked process doesn't inherit the writer thread, and mustn't write
+    # the records its parent had queued
+    _handler.queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _listener = None
+
+
+def start_log_writer() -> None:
+    """Start the background thread that writes the queued log records.
+
+    It's started by each process that serves traffic, e.g. from the
+    application's startup event, rather than when logging is set up, so a
+    process that's about to fork doesn't start threads its children can't
+    inherit. Records logged before it's started wait in the queue. Safe to
+    call more than once.
+
+    Returns:
+        None
+    """
+
+    global _listener
+    if _handler is None or _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    _listener = QueueListener(_handler.queue, stream_handler)
+    _listener.start()
+
+
+def flush_logging() -> None:
+    """Write out any queued log records and stop the writer thread.
+
+    Returns:
+        None
+    """
+
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 def setup_logging() -> None:
     """Setup the application logging.
 
-    Global configuration for application logging
+    Global configuration for application logging. Safe to call more than
+    once, only the first call has any effect. It doesn't start the writer
+    thread, see `start_log_writer`.
 
     Returns:
         None
     """
 
-    logging.basicConfig(level=settings.LOG_LEVEL.upper())
+    global _handler
+    if _handler is not None:
+        return
+
+    level = logging.getLevelName(settings.LOG_LEVEL.upper())
+    _handler = _DroppingQueueHandler(None)
+    _new_queue()
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_handler)
+
     structlog.configure(
         logger_factory=LoggerFactory(),
-        processors=[JSONRenderer()],
+        wrapper_class=structlog.make_filtering_bound_logger(level),
+        processors=[
+            EventSampler(settings.LOG_SAMPLE_RATES, settings.LOG_RATE_LIMITS),
+            evaluate_lazy_fields,
+            JSONRenderer(serializer=_render),
+        ],
+        cache_logger_on_first_use=True,
     )
+
+    os.register_at_fork(after_in_child=_new_queue)
+    atexit.register(flush_logging)
@@ -0,0 +1,634 @@
+"""Module used to collect application metrics and expose them in the
+Prometheus text format.
+
+The metric types here are deliberately minimal so that recording a value on
+the request path only costs a lock acquisition and a dictionary update.
+Metrics that are expensive to compute, such as the connection pool stats,
+are `GaugeFunction`s which are only evaluated when `/metrics` is scraped.
+
+Under the production server every worker process has its own metrics, and a
+scrape is served by whichever worker accepts it. So each worker exports its
+samples to a file in a directory they share every `METRICS_EXPORT_S`, and
+the worker serving a scrape merges the other workers' files with its own
+samples. Counters & histograms are summed, and keep counting the requests
+of workers that have exited, as the supervisor folds an exited worker's
+file into `dead.json`. Gauges are only summed across the running workers.
+"""
+
+import os
+import threading
+from bisect import bisect_left
+from typing import Callable, Optional
+
+import anyio.to_thread
+import orjson
+from sqlalchemy.engine import Engine
+
+from service_provider_api.core.periodic import PeriodicTask
+
+# latency buckets in seconds, from 1ms to 10s
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(labelnames: tuple, labels: tuple) -> str:
+    if not labelnames:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in zip(labelnames, labels)
+    )
+    return "{" + pairs + "}"
+
+
+class Registry:
+    """A collection of metrics that can be rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics = []
+
+    def register(self, metric: "Metric") -> None:
+        """Add a metric to the registry.
+
+        Args:
+            metric (Metric): The metric to add.
+        """
+        self._metrics.append(metric)
+
+    def collect(self) -> dict:
+        """Collect the samples of every registered metric.
+
+        Returns:
+            dict: The samples of each metric, keyed by metric name.
+        """
+        return {metric.name: metric._samples() for metric in self._metrics}
+
+    def render(self, directory: Optional[str] = None) -> str:
+        """Render every registered metric in the Prometheus text format.
+
+        Args:
+            directory (str, optional): The directory the worker processes
+                export their metrics to. Their samples are merged with this
+                process's. Defaults to None, only this process's metrics.
+
+        Returns:
+            str: The rendered metrics.
+        """
+        if directory is None:
+            return "".join(metric.render() for metric in self._metrics)
+
+        others = read_exported(directory, exclude=os.getpid())
+        return "".join(
+            metric.render(
+                metric.merge([metric._samples()] + others.get(metric.name, []))
+            )
+            for metric in self._metrics
+        )
+
+
+registry = Registry()
+
+
+class Metric:
+    """Base class for all metric types.
+
+    Args:
+        name (str): The name of the metric.
+        documentation (str): The help text of the metric.
+        labelnames (tuple, optional): The names of the metric labels.
+        registry (Registry, optional): The registry to add the metric to.
+    """
+
+    type = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        registry: Optional[Registry] = registry,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _header(self) -> str:
+        return (
+            f"# HELP {self.name} {_escape(self.documentation)}\n"
+            f"# TYPE {self.name} {self.type}\n"
+        )
+
+    def _samples(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, samples: list[dict]) -> dict:
+        """Merge the samples of several processes.
+
+        Args:
+            samples (list[dict]): The samples of each process.
+
+        Returns:
+            dict: The merged samples.
+        """
+        merged = {}
+        for process_samples in samples:
+            for labels, value in process_samples.items():
+                merged[labels] = merged.get(labels, 0.0) + value
+        return merged
+
+    def render(self, samples: Optional[dict] = None) -> str:
+        lines = [self._header()]
+        if samples is None:
+            samples = self._samples()
+        for labels, value in samples.items():
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} {value}\n"
+            )
+        return "".join(lines)
+
+
+class Counter(Metric):
+    """A value that only ever increases."""
+
+    type = "counter"
+
+    def inc(self, labels: tuple = (), amount: float = 1.0) -> None:
+        """Increment the counter.
+
+        Args:
+            labels (tuple, optional): The label values to increment.
+            amount (float, optional): The amount to increment by. Defaults to 1.
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(Metric):
+    """A value that can go up and down."""
+
+    type = "gauge"
+
+    def set(self, value: float, labels: tuple = ()) -> None:
+        """Set the gauge to a value.
+
+        Args:
+            value (float): The value to set.
+            labels (tuple, optional): The label values to set.
+        """
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, labels: tuple = (), amount: float = 1.0) -> None:
+        """Increment the gauge.
+
+        Args:
+            labels (tuple, optional): The label values to increment.
+            amount (float, optional): The amount to increment by. Defaults to 1.
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, labels: tuple = (), amount: float = 1.0) -> None:
+        """Decrement the gauge.
+
+        Args:
+            labels (tuple, optional): The label values to decrement.
+            amount (float, optional): The amount to decrement by. Defaults to 1.
+        """
+        self.inc(labels, -amount)
+
+
+class GaugeFunction(Metric):
+    """A gauge whose values are computed when the metrics are rendered.
+
+    Args:
+        callback (Callable[[], dict]): Returns a mapping of label values to
+            the current value of the gauge.
+    """
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], dict],
+        labelnames: tuple = (),
+        registry: Optional[Registry] = registry,
+    ) -> None:
+        super().__init__(name, documentation, labelnames, registry)
+        self.callback = callback
+
+    def _samples(self) -> dict:
+        return self.callback()
+
+
+class Histogram(Metric):
+    """Counts observations into buckets.
+
+    Args:
+        buckets (tuple, optional): The upper bounds of the buckets.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+        registry: Optional[Registry] = registry,
+    ) -> None:
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = buckets
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        """Record an observation.
+
+        Args:
+            value (float): The value observed.
+            labels (tuple, optional): The label values to record against.
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(labels) or (
+                [0] * (len(self.buckets) + 1),
+                0.0,
+            )
+            counts[index] += 1
+            self._values[labels] = (counts, total + value)
+
+    def _samples(self) -> dict:
+        with self._lock:
+            return {
+                labels: (list(counts), total)
+                for labels, (counts, total) in self._values.items()
+            }
+
+    def merge(self, samples: list[dict]) -> dict:
+        merged = {}
+        for process_samples in samples:
+            for labels, (counts, total) in process_samples.items():
+                if labels in merged:
+                    merged_counts, merged_total = merged[labels]
+                    counts = [a + b for a, b in zip(merged_counts, counts)]
+                    total += merged_total
+                merged[labels] = (list(counts), total)
+        return merged
+
+    def render(self, samples: Optional[dict] = None) -> str:
+        lines = [self._header()]
+        labelnames = self.labelnames + ("le",)
+        if samples is None:
+            samples = self._samples()
+        for labels, (counts, total) in samples.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                bucket_labels = _format_labels(labelnames, labels + (bound,))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}\n")
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {total}\n")
+            lines.append(f"{self.name}_count{suffix} {cumulative}\n")
+        return "".join(lines)
+
+
+#######################
+# application metrics
+#######################
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time taken to serve a request.",
+    ("method", "route", "version"),
+)
+REQUESTS = Counter(
+    "http_requests_total",
+    "Number of requests served.",
+    ("method", "route", "version", "status"),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Number of requests currently being served."
+)
+POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Time requests spent waiting for a database connection."
+)
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Number of log records dropped because the log queue was full.",
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Number of cache lookups, by cache and whether they hit or missed.",
+    ("cache", "result"),
+)
+SEARCH_QUERIES = Counter(
+    "search_queries_total",
+    "Number of searches, by whether they read the search table or joined the "
+    "live tables because the search table was too stale.",
+    ("source",),
+)
+CACHE_INVALIDATION_LAG = Histogram(
+    "cache_invalidation_lag_seconds",
+    "Time from a worker publishing a change to a worker's listener receiving it.",
+)
+CACHE_INVALIDATION_RESYNCS = Counter(
+    "cache_invalidation_resyncs_total",
+    "Number of times the in-process caches were reloaded because change "
+    "events may have been missed.",
+)
+COALESCED_READS = Counter(
+    "coalesced_reads_total",
+    "Number of reads by operation, and whether they ran their own queries "
+    "(leader) or shared those of an identical read in flight (follower).",
+    ("operation", "role"),
+)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total",
+    "Number of requests rejected by admission control, by route class.",
+    ("route_class",),
+)
+QUERY_GUARD_ACTIONS = Counter(
+    "query_guard_actions_total",
+    "Number of searches the query cost guard acted on, by what it did, e.g. "
+    "rejected, low_priority, statement_timeout or client_disconnect.",
+    ("action",),
+)
+REVIEW_BATCH_SIZE = Histogram(
+    "review_batch_size",
+    "Number of reviews written by each write-behind batch.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+
+# the threadpool's limiter, once the exporter has captured it
+_limiter = None
+
+
+def _threadpool_stats() -> dict:
+    # this must be called from the event loop, which /metrics is served on,
+    # unless the exporter captured the limiter there for its thread
+    limiter = _limiter or anyio.to_thread.current_default_thread_limiter()
+    return {
+        ("busy",): limiter.borrowed_tokens,
+        ("max",): limiter.total_tokens,
+    }
+
+
+THREADPOOL_THREADS = GaugeFunction(
+    "threadpool_threads",
+    "Threads in the pool used to run sync endpoints, by state.",
+    _threadpool_stats,
+    ("state",),
+)
+
+
+def register_pool_metrics(get_engine: Callable[[], Engine]) -> None:
+    """Expose the connection pool stats of an engine.
+
+    Args:
+        get_engine (Callable[[], Engine]): Gets the engine whose pool should
+            be reported on. It's called on every scrape, so that the engine
+            can be created lazily.
+
+    Returns:
+        None
+    """
+
+    def pool_stats() -> dict:
+        pool = get_engine().pool
+        return {
+            ("size",): pool.size(),
+            ("checked_in",): pool.checkedin(),
+            ("checked_out",): pool.checkedout(),
+            ("overflow",): pool.overflow(),
+        }
+
+    GaugeFunction(
+        "db_pool_connections",
+        "Connections in the database pool, by state.",
+        pool_stats,
+        ("state",),
+    )
+
+
+def register_admission_metrics(stats: Callable[[], dict]) -> None:
+    """Expose the adaptive concurrency limits of the admission controller.
+
+    Args:
+        stats (Callable[[], dict]): Returns the limit & requests in flight,
+            keyed by route class & state.
+
+    Returns:
+        None
+    """
+
+    GaugeFunction(
+        "admission_concurrency",
+        "Adaptive concurrency limits & requests in flight, by route class & state.",
+        stats,
+        ("route_class", "state"),
+    )
+
+
+#######################
+# multi-process export
+#######################
+
+DEAD_FILE = "dead.json"
+
+_exporter: Optional[PeriodicTask] = None
+_export_directory: Optional[str] = None
+
+
+def _dump(path: str, data: dict) -> None:
+    # written aside & renamed, so readers never see a partial file
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(orjson.dumps(data))
+    os.replace(temporary, path)
+
+
+def _load(path: str) -> Optional[dict]:
+    try:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def _encode(samples: dict) -> dict:
+    return {
+        name: [[list(labels), value] for labels, value in metric_samples.items()]
+        for name, metric_samples in samples.items()
+    }
+
+
+def _decode(samples: dict) -> dict:
+    return {
+        name: {tuple(labels): value for labels, value in metric_samples}
+        for name, metric_samples in samples.items()
+    }
+
+
+def export(directory: str) -> None:
+    """Export this process's samples for the other workers to merge.
+
+    Args:
+        directory (str): The directory the worker processes export to.
+
+    Returns:
+        None
+    """
+
+    _dump(
+        os.path.join(directory, f"{os.getpid()}.json"),
+        {"pid": os.getpid(), "metrics": _encode(registry.collect())},
+    )
+
+
+def read_exported(directory: str, exclude: Optional[int] = None) -> dict:
+    """Read the samples the worker processes have exported.
+
+    Args:
+        directory (str): The directory the worker processes export to.
+        exclude (int, optional): The pid of a process whose samples are left
+            out, e.g. the caller's own, as it has fresher ones in memory.
+
+    Returns:
+        dict: A list of the samples of each process, keyed by metric name.
+    """
+
+    names = [
+        name
+        for name in os.listdir(directory)
+        if name.endswith(".json") and name not in (DEAD_FILE, f"{exclude}.json")
+    ]
+    # the dead file is read last: a worker's file is only removed after the
+    # dead file has absorbed it, so either its own file was read or the dead
+    # file includes it, and the pids absorbed meanwhile aren't counted twice
+    processes = [_load(os.path.join(directory, name)) for name in names]
+    # a file removed since the listing was absorbed into the dead file
+    processes = [data for data in processes if data is not None]
+    dead = _load(os.path.join(directory, DEAD_FILE))
+    if dead is not None:
+        absorbed = set(dead["pids"])
+        processes = [data for data in processes if data["pid"] not in absorbed]
+        processes.append(dead)
+
+    exported = {}
+    for data in processes:
+        for name, samples in _decode(data["metrics"]).items():
+            exported.setdefault(name, []).append(samples)
+    return exported
+
+
+def mark_process_dead(directory: str, pid: int) -> None:
+    """Fold an exited worker's counters & histograms into the dead file.
+
+    This is called by the supervisor, the only process that writes the dead
+    file. The exited worker's gauges are dropped.
+
+    Args:
+        directory (str): The directory the worker processes export to.
+        pid (int): The pid of the worker that exited.
+
+    Returns:
+        None
+    """
+
+    path = os.path.join(directory, f"{pid}.json")
+    data = _load(path)
+    dead_path = os.path.join(directory, DEAD_FILE)
+    dead = _load(dead_path) or {"pids": [], "metrics": {}}
+    if data is not None:
+        samples = _decode(data["metrics"])
+        dead_samples = _decode(dead["metrics"])
+        for metric in registry._metrics:
+            if metric.type == "gauge" or metric.name not in samples:
+                continue
+            dead_samples[metric.name] = metric.merge(
+                [dead_samples.get(metric.name, {}), samples[metric.name]]
+            )
+        dead["metrics"] = _encode(dead_samples)
+    dead["pids"].append(pid)
+    _dump(dead_path, dead)
+    if data is not None:
+        os.remove(path)
+
+
+def mark_process_started(directory: str, pid: int) -> None:
+    """Forget that a pid belonged to an exited worker, once it's reused.
+
+    Args:
+        directory (str): The directory the worker processes export to.
+        pid (int): The pid of the new worker.
+
+    Returns:
+        None
+    """
+
+    dead_path = os.path.join(directory, DEAD_FILE)
+    dead = _load(dead_path)
+    if dead is not None and pid in dead["pids"]:
+        dead["pids"].remove(pid)
+        _dump(dead_path, dead)
+
+
+def start_exporter(directory: str, interval: float) -> PeriodicTask:
+    """Start exporting this process's samples periodically.
+
+    This must be called from the event loop, as the threadpool's stats are
+    read through its limiter.
+
+    Args:
+        directory (str): The directory the worker processes export to.
+        interval (float): The number of seconds between exports.
+
+    Returns:
+        PeriodicTask: The running exporter.
+    """
+
+    global _exporter, _export_directory, _limiter
+    _limiter = anyio.to_thread.current_default_thread_limiter()
+    _export_directory = directory
+    export(directory)
+    _exporter = PeriodicTask("metrics-exporter", interval, lambda: export(directory))
+    _exporter.start()
+    return _exporter
+
+
+def stop_exporter() -> None:
+    """Stop exporting, after a last export of this process's samples.
+
+    Returns:
+        None
+    """
+
+    global _exporter
+    if _exporter is not None:
+        _exporter.stop()
+        export(_export_directory)
+        _exporter = None
@@ -0,0 +1,53 @@
+"""Module used to run background jobs on a fixed interval."""
+
+import threading
+from typing import Callable
+
+import structlog
+
+log = structlog.get_logger()
+
+
+class PeriodicTask:
+    """Runs a function on a background thread every `interval` seconds.
+
+    Exceptions raised by the function are logged, and don't stop the task.
+
+    Args:
+        name (str): The name of the task, used for its thread & logs.
+        interval (float): The number of seconds between runs.
+        func (Callable[[], None]): The function to run.
+    """
+
+    def __init__(self, name: str, interval: float, func: Callable[[], None]) -> None:
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self) -> None:
+        """Start running the task.
+
+        Returns:
+            None
+        """
+
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop running the task, waiting for a run in progress to finish.
+
+        Returns:
+            None
+        """
+
+        self._stopping.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                self.func()
+            except Exception as e:
+                log.error("Periodic task failed", task=self.name, error=e)
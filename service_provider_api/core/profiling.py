@@ -0,0 +1,130 @@
+"""Module used to profile individual requests in-process.
+
+A `RequestProfiler` samples the Python stacks of the process on a
+background thread while a request is being served, and writes them out in
+the collapsed stack format understood by `flamegraph.pl`, speedscope and
+most other flamegraph tools.
+
+Sync endpoints run on the threadpool and responses are rendered on the
+event loop, so every thread is sampled. Stacks that don't pass through the
+application or the libraries it's built on (idle threads) are dropped. Only
+one request is profiled at a time, but other requests served concurrently
+can still show up in the profile.
+"""
+
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Optional
+
+# stacks that don't include one of these are considered idle
+DEFAULT_INCLUDE = (
+    "service_provider_api",
+    "fastapi",
+    "starlette",
+    "sqlalchemy",
+    "psycopg2",
+    "pydantic",
+    "structlog",
+    "logging",
+    "json",
+    "orjson",
+)
+
+# there's only ever one request being profiled at a time
+_profiling = threading.Lock()
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+class RequestProfiler:
+    """Samples the stacks of the process while a request is served.
+
+    Args:
+        interval (float): The time between samples in seconds.
+        include (tuple, optional): Path fragments, at least one of which must
+            appear in a stack for it to be kept.
+    """
+
+    def __init__(self, interval: float, include: tuple = DEFAULT_INCLUDE) -> None:
+        self.interval = interval
+        self.include = include
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """Start sampling, unless another request is already being profiled.
+
+        Returns:
+            bool: Whether sampling was started.
+        """
+
+        if not _profiling.acquire(blocking=False):
+            return False
+
+        self._thread = threading.Thread(
+            target=self._sample, name="request-profiler", daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        """Stop sampling.
+
+        Returns:
+            None
+        """
+
+        self._stop.set()
+        self._thread.join()
+        _profiling.release()
+
+    def collapsed(self) -> str:
+        """Render the samples in the collapsed stack format.
+
+        Returns:
+            str: One `frame;frame;frame count` line per unique stack.
+        """
+
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.items())
+
+    def dump(self, path: Path) -> None:
+        """Write the collapsed stacks to a file.
+
+        Args:
+            path (Path): The file to write to.
+
+        Returns:
+            None
+        """
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(self.collapsed())
+
+    def _sample(self) -> None:
+        own_thread = threading.get_ident()
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+
+                if not any(part in name for name in stack for part in self.include):
+                    continue
+
+                if thread_id not in thread_names:
+                    # the threadpool starts threads on demand
+                    thread_names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
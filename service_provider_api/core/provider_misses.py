@@ -0,0 +1,115 @@
+"""Module used to answer repeated requests for unknown service providers from memory.
+
+Scrapers & stale links request a lot of service providers that don't exist,
+over & over, and each request would cost a query to find nothing. Instead
+the IDs a lookup confirms are missing are remembered for a short while in a
+cache of confirmed misses, and answered without touching Postgres.
+
+A confirmed miss never goes stale. Service provider IDs are random UUIDs
+generated by the server when a provider is created, so nobody can request
+an ID before the provider that has it is committed, and a deleted
+provider's ID is never reused. So there's nothing to invalidate, and the
+cache doesn't need to know which providers exist. The TTL & size only
+bound its memory.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from uuid import UUID
+
+from service_provider_api.core import metrics
+from service_provider_api.core.config import settings
+
+
+class MissCache:
+    """The IDs recently confirmed not to exist, each kept for a fixed time.
+
+    Args:
+        ttl (float): The seconds a miss is kept for.
+        max_size (int): The most misses kept, the oldest are evicted first.
+    """
+
+    def __init__(self, ttl: float, max_size: int) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        # ID -> expiry, in the order they expire
+        self._misses: OrderedDict[UUID, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, item: UUID) -> None:
+        """Remember that an ID doesn't exist.
+
+        Args:
+            item (UUID): The ID.
+
+        Returns:
+            None
+        """
+
+        with self._lock:
+            self._misses.pop(item, None)
+            self._misses[item] = time.monotonic() + self.ttl
+            while len(self._misses) > self.max_size:
+                self._misses.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget every ID.
+
+        Returns:
+            None
+        """
+
+        with self._lock:
+            self._misses.clear()
+
+    def __contains__(self, item: UUID) -> bool:
+        with self._lock:
+            expiry = self._misses.get(item)
+            if expiry is None:
+                return False
+            if expiry < time.monotonic():
+                del self._misses[item]
+                return False
+            return True
+
+
+misses = MissCache(
+    settings.PROVIDER_MISS_CACHE_TTL_S, settings.PROVIDER_MISS_CACHE_SIZE
+)
+
+
+def record_miss(service_provider_id: UUID) -> None:
+    """Remember that a service provider was confirmed not to exist.
+
+    Args:
+        service_provider_id (UUID): The ID of the service provider.
+
+    Returns:
+        None
+    """
+
+    if settings.PROVIDER_MISS_CACHE:
+        misses.add(service_provider_id)
+
+
+def known_missing(service_provider_id: UUID) -> bool:
+    """Check whether a service provider was recently confirmed not to exist.
+
+    It only reads memory, so it's safe to call from the event loop.
+
+    Args:
+        service_provider_id (UUID): The ID of the service provider.
+
+    Returns:
+        bool: True if it definitely doesn't exist, False if it might.
+    """
+
+    if not settings.PROVIDER_MISS_CACHE:
+        return False
+
+    if service_provider_id in misses:
+        metrics.CACHE_REQUESTS.inc(("provider_misses", "hit"))
+        return True
+    metrics.CACHE_REQUESTS.inc(("provider_misses", "miss"))
+    return False
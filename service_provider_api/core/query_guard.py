@@ -0,0 +1,221 @@
+"""Module used to bound how long the queries run for a request can take.
+
+Two guards are applied to the queries of the request currently being served:
+
+- a statement timeout. Every transaction begun while `statement_timeout` is
+  in effect sets Postgres' `statement_timeout` for itself, with `SET LOCAL`,
+  so the setting ends with the transaction rather than staying on the
+  pooled connection.
+- cancellation when the client disconnects. `run_cancellable` runs a sync
+  function on the threadpool while watching for the client to disconnect.
+  The connections the function checks out of the pool are recorded, and if
+  the client goes away their queries are cancelled, rather than left running
+  for a response nobody will read.
+
+Queries that other requests are waiting on, see `core.singleflight`, are
+shared and so aren't cancelled when one of their clients disconnects.
+"""
+
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional, TypeVar
+
+import structlog
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+from service_provider_api.core import metrics
+
+log = structlog.get_logger()
+
+T = TypeVar("T")
+
+# how often the client is checked for having disconnected
+DISCONNECT_POLL_INTERVAL = 0.05
+
+
+class CancelScope:
+    """The database connections a request is using, so its queries can be cancelled."""
+
+    def __init__(self) -> None:
+        self.shared = False
+        self.cancelled = False
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    def add(self, dbapi_connection) -> None:
+        """Record a connection checked out for the request.
+
+        Args:
+            dbapi_connection: The psycopg2 connection.
+
+        Returns:
+            None
+        """
+
+        with self._lock:
+            self._connections.add(dbapi_connection)
+
+    def discard(self, dbapi_connection) -> None:
+        """Forget a connection the request returned to the pool.
+
+        Args:
+            dbapi_connection: The psycopg2 connection.
+
+        Returns:
+            None
+        """
+
+        with self._lock:
+            self._connections.discard(dbapi_connection)
+
+    def share(self) -> bool:
+        """Mark the queries as shared with other requests, so they aren't cancelled.
+
+        Returns:
+            bool: False if they've already been cancelled, and can't be shared.
+        """
+
+        with self._lock:
+            if self.cancelled:
+                return False
+            self.shared = True
+            return True
+
+    def cancel(self) -> bool:
+        """Cancel the queries running on the request's connections.
+
+        Returns:
+            bool: False if the queries are shared with other requests, and
+                so weren't cancelled.
+        """
+
+        with self._lock:
+            if self.shared:
+                return False
+            self.cancelled = True
+            for dbapi_connection in self._connections:
+                # sends a cancel request to the backend, it's safe to call
+                # while another thread is waiting on the connection
+                dbapi_connection.cancel()
+            return True
+
+
+_current_scope: ContextVar[Optional[CancelScope]] = ContextVar(
+    "cancel_scope", default=None
+)
+_statement_timeout: ContextVar[Optional[float]] = ContextVar(
+    "statement_timeout", default=None
+)
+
+
+def current_scope() -> Optional[CancelScope]:
+    """Get the cancel scope of the request currently being served.
+
+    Returns:
+        Optional[CancelScope]: The scope, or None if the request's queries
+            can't be cancelled.
+    """
+
+    return _current_scope.get()
+
+
+@contextmanager
+def statement_timeout(timeout_ms: Optional[float]) -> Iterator[None]:
+    """Limit how long each statement of the transactions begun in the block can run.
+
+    Args:
+        timeout_ms (Optional[float]): The most milliseconds a statement can
+            run for, None for no limit.
+
+    Yields:
+        None
+    """
+
+    token = _statement_timeout.set(timeout_ms)
+    try:
+        yield
+    finally:
+        _statement_timeout.reset(token)
+
+
+async def run_cancellable(request: Request, func: Callable[..., T], *args) -> T:
+    """Run a sync function on the threadpool, watching for the client to disconnect.
+
+    If the client disconnects before the function returns, its queries are
+    cancelled.
+
+    Args:
+        request (Request): The request the function serves.
+        func (Callable[..., T]): The function.
+        *args: The arguments to call it with.
+
+    Returns:
+        T: The result of the function.
+
+    Raises:
+        Exception: Whatever the function raised, e.g. the error of a query
+            that was cancelled.
+    """
+
+    scope = CancelScope()
+    token = _current_scope.set(scope)
+    try:
+        # the context, and so the scope, is copied into the task & its thread
+        task = asyncio.ensure_future(run_in_threadpool(func, *args))
+    finally:
+        _current_scope.reset(token)
+
+    while not task.done():
+        await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+        if not task.done() and await request.is_disconnected():
+            if scope.cancel():
+                metrics.QUERY_GUARD_ACTIONS.inc(("client_disconnect",))
+                log.info("client disconnected, cancelled its queries")
+            break
+    return await task
+
+
+def _apply_statement_timeout(session: Session, transaction, connection) -> None:
+    timeout_ms = _statement_timeout.get()
+    if timeout_ms is not None:
+        connection.exec_driver_sql(
+            f"SET LOCAL statement_timeout = {max(int(timeout_ms), 1)}"
+        )
+
+
+def _record_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.add(dbapi_connection)
+        connection_record.info["cancel_scope"] = scope
+
+
+def _record_checkin(dbapi_connection, connection_record) -> None:
+    # the connection could be handed to another request, so it must not be
+    # cancelled on behalf of this one any more
+    scope = connection_record.info.pop("cancel_scope", None)
+    if scope is not None:
+        scope.discard(dbapi_connection)
+
+
+event.listen(Session, "after_begin", _apply_statement_timeout)
+
+
+def attach(engine: Engine) -> None:
+    """Record the connections requests check out of an engine's pool.
+
+    Args:
+        engine (Engine): The engine.
+
+    Returns:
+        None
+    """
+
+    event.listen(engine, "checkout", _record_checkout)
+    event.listen(engine, "checkin", _record_checkin)
@@ -0,0 +1,67 @@
+"""Module used to periodically compact the rating shards.
+
+Reviews of service providers with more than one rating shard are counted
+in their shards, and only reach the aggregates on the provider, which
+search filters & sorts on, when the shards are compacted. Every worker
+process runs a compactor, but the compaction takes a database lock, so
+only one of them compacts at a time.
+"""
+
+from typing import Optional
+
+import structlog
+
+from service_provider_api.core.periodic import PeriodicTask
+from service_provider_api.core.repositories.service_provider_review import (
+    ServiceProviderReviewRepository,
+)
+from service_provider_api.database.database import SessionLocal
+
+log = structlog.get_logger()
+
+_compactor: Optional[PeriodicTask] = None
+
+
+def compact() -> None:
+    """Compact the rating shards once.
+
+    Returns:
+        None
+    """
+
+    db = SessionLocal()
+    try:
+        compacted = ServiceProviderReviewRepository.compact_rating_shards(db)
+        if compacted:
+            log.debug("compacted rating shards", shards=compacted)
+    finally:
+        db.close()
+
+
+def start_compactor(interval: float) -> PeriodicTask:
+    """Start the process's rating compactor.
+
+    Args:
+        interval (float): The number of seconds between compactions.
+
+    Returns:
+        PeriodicTask: The running compactor.
+    """
+
+    global _compactor
+    _compactor = PeriodicTask("rating-compactor", interval, compact)
+    _compactor.start()
+    return _compactor
+
+
+def stop_compactor() -> None:
+    """Stop the process's rating compactor.
+
+    Returns:
+        None
+    """
+
+    global _compactor
+    if _compactor is not None:
+        _compactor.stop()
+        _compactor = None
@@ -1,23 +1,43 @@
 """Module to hold the service provider repo,
 and all of the classes and methods relevant to it.."""
 
-from typing import Optional
+from dataclasses import dataclass
+from typing import Callable, Hashable, Optional, TypeVar
 from uuid import UUID, uuid4
 
 import structlog
+from psycopg2 import errors
 from psycopg2.extras import DateRange
-from sqlalchemy import exc
-from sqlalchemy.orm import Session
-from sqlalchemy.sql import func
-from sqlalchemy.sql.functions import coalesce
+from sqlalchemy import any_, case, distinct, exc, func, literal, or_, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session, selectinload
 
 
 from service_provider_api.api import schemas
-from service_provider_api.core.utils import list_pairs
+from service_provider_api.core import invalidation, metrics, provider_misses
+from service_provider_api.core.config import settings
+from service_provider_api.core.repositories.service_provider_search import (
+    ServiceProviderSearchRepository,
+)
+from service_provider_api.core.singleflight import SingleFlight
+from service_provider_api.core.skill_index import skill_index
+from service_provider_api.core.utils import escape_like, list_pairs
 from service_provider_api.database import models
+from service_provider_api.database.database import has_extension
 
 log = structlog.get_logger()
 
+# the lower bounds of the facet buckets, the last bucket is unbounded
+COST_FACET_BUCKETS = (0, 5_000, 10_000, 20_000, 50_000, 100_000)
+RATING_FACET_BUCKETS = (0, 1, 2, 3, 4, 5)
+# the most common skills among the matches are counted
+MAX_SKILL_FACETS = 20
+
+# identical concurrent reads share one call
+_reads = SingleFlight()
+
+T = TypeVar("T")
+
 
 class FailedToCreateServiceProvider(Exception):
     """Raised when a service provider cannot be created."""
@@ -43,6 +63,34 @@ class FailedToDeleteServiceProvider(Exception):
     pass
 
 
+class SearchTooExpensive(Exception):
+    """Raised when a search is estimated to be too expensive to run."""
+
+    pass
+
+
+class SearchCancelled(Exception):
+    """Raised when a search's query is cancelled, e.g. because it timed out."""
+
+    pass
+
+
+@dataclass
+class SearchPlan:
+    """How a search is run, decided before running it.
+
+    Args:
+        page_size (int): The page size, capped at `SEARCH_MAX_PAGE_SIZE`.
+        low_priority (bool): Run the search on the low priority pool.
+        estimated_cost (Optional[float]): The planner's estimated cost of the
+            page's query, None if it wasn't planned.
+    """
+
+    page_size: int
+    low_priority: bool = False
+    estimated_cost: Optional[float] = None
+
+
 class ServiceProviderRepository:
     """Repository for service providers.
 
@@ -80,9 +128,16 @@ class ServiceProviderRepository:
             session_provider = ServiceProviderRepository._insert_service_provider(
                 service_provider, provider, db
             )
+            invalidation.publish(
+                db,
+                invalidation.SERVICE_PROVIDER_CHANGED,
+                [service_provider_id],
+                added_skills=provider.skills,
+            )
 
             # save our changes to the db
             db.commit()
+            skill_index.add(provider.skills)
             db.refresh(session_provider)
 
             return session_provider
@@ -95,6 +150,9 @@ class ServiceProviderRepository:
     ) -> models.ServiceProvider:
         """Gets a service provider from the database.
 
+        IDs recently confirmed not to exist, see `core.provider_misses`, are
+        answered without a query.
+
         Args:
             service_provider_id (UUID): The ID of the service provider to get.
             db (Session): The database connection.
@@ -107,6 +165,9 @@ class ServiceProviderRepository:
             ServiceProviderNotFound: If the service provider could not be found.
         """
 
+        if provider_misses.known_missing(service_provider_id):
+            raise ServiceProviderNotFound
+
         if user_id:
             # we want to make sure the calling user owns this service provider resource
             # if the user_id has been provided. This check is mainly used for a get
@@ -125,12 +186,65 @@ class ServiceProviderRepository:
                 .filter(models.ServiceProvider.id == service_provider_id)
                 .first()
             )
+            if not service_provider:
+                provider_misses.record_miss(service_provider_id)
 
         if not service_provider:
             raise ServiceProviderNotFound
 
         return service_provider
 
+    @staticmethod
+    def get_as_dict(service_provider_id: UUID, db: Session) -> dict:
+        """Gets a service provider from the database, as a dictionary.
+
+        Concurrent gets of the same service provider share one query, and
+        its result.
+
+        Args:
+            service_provider_id (UUID): The ID of the service provider to get.
+            db (Session): The database connection.
+
+        Returns:
+            dict: The service provider identified by the ID. It's shared with
+                the other callers, so mustn't be modified.
+
+        Raises:
+            ServiceProviderNotFound: If the service provider could not be found.
+        """
+
+        return _reads.do(
+            "get",
+            service_provider_id,
+            lambda: ServiceProviderRepository.get(service_provider_id, db).as_dict(),
+        )
+
+    @staticmethod
+    def get_many(
+        service_provider_ids: list[UUID], db: Session
+    ) -> list[models.ServiceProvider]:
+        """Gets multiple service providers from the database.
+
+        The service providers and their skills & availability are loaded in a
+        constant number of queries regardless of how many IDs are requested.
+
+        Args:
+            service_provider_ids (list[UUID]): The IDs of the service providers
+                to get.
+            db (Session): The database connection.
+
+        Returns:
+            list[ServiceProvider]: The service providers that were found. IDs
+                that could not be found are omitted.
+        """
+
+        return (
+            db.query(models.ServiceProvider)
+            .filter(models.ServiceProvider.id.in_(service_provider_ids))
+            .options(*_serialized_children())
+            .all()
+        )
+
     @staticmethod
     def delete(service_provider_id: UUID, user_id: UUID, db: Session) -> None:
         """Deletes a service provider from the database.
@@ -160,11 +274,23 @@ class ServiceProviderRepository:
             # delete our service provider reviews as they dont cascade delete due to
             # us using delete in our PUT, we dont want to delete all reviews when we
             # are updating a service provider.
+            skills = [skill.skill for skill in service_provider.skills]
             db.delete(service_provider)
             db.query(models.Reviews).filter(
                 models.Reviews.service_provider_id == service_provider_id
             ).delete()
+            db.query(models.ReviewRatingShard).filter(
+                models.ReviewRatingShard.service_provider_id == service_provider_id
+            ).delete()
+            ServiceProviderSearchRepository.queue([service_provider_id], db)
+            invalidation.publish(
+                db,
+                invalidation.SERVICE_PROVIDER_CHANGED,
+                [service_provider_id],
+                removed_skills=skills,
+            )
             db.commit()
+            skill_index.remove(skills)
 
         except exc.SQLAlchemyError as e:
             raise FailedToDeleteServiceProvider from e
@@ -208,6 +334,7 @@ class ServiceProviderRepository:
 
             # this is a put, so we delete everything and then re-insert it in a
             # transaction
+            skills = [skill.skill for skill in service_provider.skills]
             db.delete(service_provider)
 
             service_provider = models.ServiceProvider(
@@ -215,18 +342,135 @@ class ServiceProviderRepository:
                 user_id=user_id,
                 name=updated_service_provider.name,
                 cost_in_pence=updated_service_provider.cost_in_pence,
+                # the reviews are kept, so their aggregates have to be too
+                review_count=service_provider.review_count,
+                review_rating_sum=service_provider.review_rating_sum,
+                review_rating_shards=service_provider.review_rating_shards,
             )
 
             service_provider = ServiceProviderRepository._insert_service_provider(
                 service_provider, updated_service_provider, db
             )
+            invalidation.publish(
+                db,
+                invalidation.SERVICE_PROVIDER_CHANGED,
+                [service_provider_id],
+                removed_skills=skills,
+                added_skills=updated_service_provider.skills,
+            )
             db.commit()
+            skill_index.remove(skills)
+            skill_index.add(updated_service_provider.skills)
             db.refresh(service_provider)
             return service_provider
 
         except exc.SQLAlchemyError as e:
             raise FailedToUpdateServiceProvider from e
 
+    @staticmethod
+    def list_as_dicts(
+        db: Session,
+        filters: schemas.ServiceProviderListFilterParams,
+        page: int,
+        page_size: int,
+        count_mode: schemas.CountMode = schemas.CountMode.none,
+    ) -> tuple[list[dict], Optional[int]]:
+        """Gets a page of service providers as dictionaries, and the total.
+
+        Concurrent identical searches share one set of queries, and their
+        result. Searches are identical if their filters are once normalized,
+        e.g. the order of the skills doesn't matter.
+
+        Args:
+            db (Session): The database session.
+            filters (ListFilterParams): The filters to apply to the query.
+            page (int): The page number.
+            page_size (int): The page size.
+            count_mode (CountMode, optional): How to count the total, see
+                `list_with_total`.
+
+        Returns:
+            tuple[list[dict], Optional[int]]: The page of service providers,
+                and the total, or None if the count mode is none. They're
+                shared with the other callers, so mustn't be modified.
+
+        Raises:
+            SearchCancelled: If a query is cancelled.
+            exc.SQLAlchemyError: If the query fails.
+        """
+
+        @_cancellable
+        def search() -> tuple[list[dict], Optional[int]]:
+            service_providers, total = ServiceProviderRepository.list_with_total(
+                db, filters, page, page_size, count_mode
+            )
+            return [s.as_dict() for s in service_providers], total
+
+        key = (_search_key(filters), page, page_size, count_mode)
+        return _reads.do("search", key, search)
+
+    @staticmethod
+    def list_with_total(
+        db: Session,
+        filters: schemas.ServiceProviderListFilterParams,
+        page: int,
+        page_size: int,
+        count_mode: schemas.CountMode,
+    ) -> tuple[list[models.ServiceProvider], Optional[int]]:
+        """Gets a page of service providers, and the total number that match.
+
+        Args:
+            db (Session): The database session.
+            filters (ListFilterParams): The filters to apply to the query.
+            page (int): The page number.
+            page_size (int): The page size.
+            count_mode (CountMode): How to count the total. An exact count is
+                a window function in the same statement as the page, an
+                estimate comes from the planner's estimate of the rows the
+                search matches.
+
+        Returns:
+            tuple[list[ServiceProvider], Optional[int]]: The page of service
+                providers, and the total, or None if the count mode is none.
+
+        Raises:
+            exc.SQLAlchemyError: If the query fails.
+        """
+
+        if count_mode != schemas.CountMode.exact:
+            service_providers = ServiceProviderRepository.list(
+                db, filters, page, page_size
+            )
+            if count_mode == schemas.CountMode.estimated:
+                return service_providers, ServiceProviderRepository._estimate_count(
+                    filters, db
+                )
+            return service_providers, None
+
+        offset = ServiceProviderRepository._calculate_offset(page, page_size)
+        # the window is computed after grouping, so it counts providers
+        rows = (
+            ServiceProviderRepository._filtered_query(filters, db)
+            .add_columns(func.count().over())
+            .options(*_serialized_children())
+            .offset(offset)
+            .limit(page_size)
+            .all()
+        )
+        if rows:
+            return [service_provider for service_provider, _ in rows], rows[0][1]
+        if offset == 0:
+            return [], 0
+
+        # past the last page there are no rows to read the count from
+        matches = (
+            ServiceProviderRepository._filtered_query(filters, db)
+            .order_by(None)
+            .with_entities(models.ServiceProvider.id)
+            .subquery()
+        )
+        return [], db.scalar(select(func.count()).select_from(matches))
+
     @staticmethod
     def list(
         db: Session,
@@ -249,22 +493,345 @@ class ServiceProviderRepository:
 
         offset = ServiceProviderRepository._calculate_offset(page, page_size)
 
-        # create all of the conditions for the query
-        conditions = ServiceProviderRepository._generate_conditions_for_listing(filters)
-        service_providers_query = ServiceProviderRepository._perform_joins_for_listing(
-            filters, db
-        )
-        service_providers_query = service_providers_query.filter(*conditions)
+        service_providers_query = ServiceProviderRepository._filtered_query(filters, db)
         service_providers = (
-            service_providers_query.offset(offset).limit(page_size).all()
+            service_providers_query.options(*_serialized_children())
+            .offset(offset)
+            .limit(page_size)
+            .all()
         )
 
         return service_providers
 
+    @staticmethod
+    def facets(
+        db: Session, filters: schemas.ServiceProviderListFilterParams
+    ) -> schemas.SearchFacets:
+        """Count the service providers matching a search by facet.
+
+        The counts are over every matching provider rather than a page of
+        them. They're all computed by one query, which groups the matches by
+        skill, cost bucket & rating bucket with GROUPING SETS. Concurrent
+        identical searches share the query.
+
+        Args:
+            db (Session): The database session.
+            filters (ListFilterParams): The filters to apply to the query.
+
+        Returns:
+            SearchFacets: The number of matching providers with each skill,
+                and in each cost & rating bucket. They're shared with the
+                other callers, so mustn't be modified.
+
+        Raises:
+            SearchCancelled: If the query is cancelled.
+            exc.SQLAlchemyError: If the query fails.
+        """
+
+        return _reads.do(
+            "facets",
+            _search_key(filters),
+            _cancellable(lambda: ServiceProviderRepository._count_facets(db, filters)),
+        )
+
+    @staticmethod
+    def plan_search(
+        db: Session,
+        filters: schemas.ServiceProviderListFilterParams,
+        page: int,
+        page_size: int,
+    ) -> SearchPlan:
+        """Decide how to run a search, before running it.
+
+        Searches with too many availability ranges are rejected without
+        planning them, and the page size is capped. Then the page's query is
+        planned but not run, and the planner's estimate of its total cost
+        decides whether it's rejected, run on the low priority pool, or run
+        as normal. Concurrent identical searches share the plan.
+
+        Args:
+            db (Session): The database session.
+            filters (ListFilterParams): The filters of the search.
+            page (int): The page number.
+            page_size (int): The page size asked for.
+
+        Returns:
+            SearchPlan: How to run the search.
+
+        Raises:
+            SearchTooExpensive: If the search is too expensive to run.
+            SearchCancelled: If planning it is cancelled.
+            exc.SQLAlchemyError: If planning it fails.
+        """
+
+        if len(filters.availability or []) > settings.SEARCH_MAX_AVAILABILITY_RANGES:
+            metrics.QUERY_GUARD_ACTIONS.inc(("rejected",))
+            raise SearchTooExpensive(
+                f"More than {settings.SEARCH_MAX_AVAILABILITY_RANGES} availability "
+                "ranges"
+            )
+
+        if page_size > settings.SEARCH_MAX_PAGE_SIZE:
+            metrics.QUERY_GUARD_ACTIONS.inc(("page_size_capped",))
+            page_size = settings.SEARCH_MAX_PAGE_SIZE
+
+        reject, low_priority = (
+            settings.SEARCH_REJECT_COST,
+            settings.SEARCH_LOW_PRIORITY_COST,
+        )
+        if reject is None and low_priority is None:
+            return SearchPlan(page_size)
+
+        @_cancellable
+        def estimate_cost() -> float:
+            offset = ServiceProviderRepository._calculate_offset(page, page_size)
+            query = (
+                ServiceProviderRepository._filtered_query(filters, db)
+                .offset(offset)
+                .limit(page_size)
+            )
+            return float(ServiceProviderRepository._explain(query, db)["Total Cost"])
+
+        key = (_search_key(filters), page, page_size)
+        cost = _reads.do("plan", key, estimate_cost)
+
+        if reject is not None and cost > reject:
+            metrics.QUERY_GUARD_ACTIONS.inc(("rejected",))
+            raise SearchTooExpensive(f"Estimated cost {cost:.0f} is over {reject:.0f}")
+        if low_priority is not None and cost > low_priority:
+            metrics.QUERY_GUARD_ACTIONS.inc(("low_priority",))
+            return SearchPlan(page_size, low_priority=True, estimated_cost=cost)
+        return SearchPlan(page_size, estimated_cost=cost)
+
     #######################
     # private methods ###
     #######################
 
+    @staticmethod
+    def _count_facets(
+        db: Session, filters: schemas.ServiceProviderListFilterParams
+    ) -> schemas.SearchFacets:
+        # the buckets are over the values the filters matched, so the search
+        # table's when the search is of the table
+        search_table = ServiceProviderRepository._search_table_is_fresh(db)
+        matches = ServiceProviderRepository._filtered_query(
+            filters, db, search_table
+        ).order_by(None)
+        if search_table:
+            search = models.ServiceProviderSearch
+            # referenced twice, so it's only run once
+            matches = matches.with_entities(
+                models.ServiceProvider.id.label("id"),
+                search.cost_in_pence.label("cost_in_pence"),
+                search.review_rating.label("review_rating"),
+                search.skills.label("skills"),
+            ).cte()
+            provider_skills = select(
+                matches.c.id, func.unnest(matches.c.skills).label("skill")
+            ).subquery()
+        else:
+            matches = matches.with_entities(
+                models.ServiceProvider.id.label("id"),
+                models.ServiceProvider.cost_in_pence.label("cost_in_pence"),
+                models.ServiceProvider.average_review_rating.label("review_rating"),
+            ).subquery()
+            # the skill filter only joins the matching skills, so join them all
+            provider_skills = select(
+                models.Skills.service_provider_id.label("id"), models.Skills.skill
+            ).subquery()
+
+        skill = provider_skills.c.skill
+        cost_bucket = func.width_bucket(
+            matches.c.cost_in_pence, postgresql.array(COST_FACET_BUCKETS)
+        )
+        rating_bucket = func.width_bucket(
+            matches.c.review_rating, postgresql.array(RATING_FACET_BUCKETS)
+        )
+        rows = db.execute(
+            select(
+                func.grouping(skill, cost_bucket, rating_bucket),
+                skill,
+                cost_bucket,
+                rating_bucket,
+                func.count(distinct(matches.c.id)),
+            )
+            .select_from(matches)
+            .outerjoin(provider_skills, provider_skills.c.id == matches.c.id)
+            .group_by(func.grouping_sets(skill, cost_bucket, rating_bucket))
+        ).all()
+
+        facets = schemas.SearchFacets(skills=[], cost_in_pence=[], review_rating=[])
+        for grouping, skill, cost_bucket, rating_bucket, count in rows:
+            # each bit of `grouping` is set if that column isn't grouped on
+            if grouping == 0b011 and skill is not None:
+                facets.skills.append(schemas.SkillFacet(skill=skill, count=count))
+            elif grouping == 0b101:
+                facets.cost_in_pence.append(
+                    _range_facet(COST_FACET_BUCKETS, cost_bucket, count)
+                )
+            elif grouping == 0b110:
+                facets.review_rating.append(
+                    _range_facet(RATING_FACET_BUCKETS, rating_bucket, count)
+                )
+
+        facets.skills = sorted(facets.skills, key=lambda f: (-f.count, f.skill))[
+            :MAX_SKILL_FACETS
+        ]
+        facets.cost_in_pence.sort(key=lambda f: f.gte)
+        facets.review_rating.sort(key=lambda f: f.gte)
+        return facets
+
+    @staticmethod
+    def _filtered_query(
+        filters: schemas.ServiceProviderListFilterParams,
+        db: Session,
+        search_table: Optional[bool] = None,
+    ):
+        """Builds the search query, with its joins, conditions & ordering.
+
+        The search table is searched if it's no more than
+        `SEARCH_TABLE_MAX_STALENESS_S` behind, otherwise the live tables are.
+
+        Args:
+            filters (schemas.ServiceProviderListFilterParams): The filters to apply
+                to the query.
+            db (Session): The database session.
+            search_table (Optional[bool], optional): Whether to search the
+                search table. Defaults to None, to search it if it's fresh.
+
+        Returns:
+            Query: The query for every matching service provider.
+        """
+
+        if search_table is None:
+            search_table = ServiceProviderRepository._search_table_is_fresh(db)
+        if search_table:
+            metrics.SEARCH_QUERIES.inc(("table",))
+            return ServiceProviderRepository._search_table_query(filters, db)
+
+        metrics.SEARCH_QUERIES.inc(("live",))
+        conditions = ServiceProviderRepository._generate_conditions_for_listing(filters)
+        return ServiceProviderRepository._perform_joins_for_listing(filters, db).filter(
+            *conditions
+        )
+
+    @staticmethod
+    def _search_table_is_fresh(db: Session) -> bool:
+        """Checks whether searches should read the search table.
+
+        Args:
+            db (Session): The database session.
+
+        Returns:
+            bool: True if it's within `SEARCH_TABLE_MAX_STALENESS_S`.
+        """
+
+        return ServiceProviderSearchRepository.is_fresh(
+            settings.SEARCH_TABLE_MAX_STALENESS_S, db
+        )
+
+    @staticmethod
+    def _search_table_query(
+        filters: schemas.ServiceProviderListFilterParams, db: Session
+    ):
+        """Builds the search query against the search table.
+
+        Returns the same providers, in the same order, as the live query,
+        as of the last time their search rows were refreshed. Each provider
+        has one search row, so there's nothing to group.
+
+        Args:
+            filters (schemas.ServiceProviderListFilterParams): The filters to apply
+                to the query.
+            db (Session): The database session.
+
+        Returns:
+            Query: The query for every matching service provider.
+        """
+
+        search = models.ServiceProviderSearch
+        query = (
+            db.query(models.ServiceProvider)
+            .join(search, search.service_provider_id == models.ServiceProvider.id)
+            .filter(search.review_rating >= filters.reviews_gt)
+            .filter(search.review_rating <= filters.reviews_lt)
+        )
+        if filters.name_query:
+            query = query.order_by(
+                *ServiceProviderRepository._rank_name_matches(filters.name_query)
+            )
+        query = query.order_by(search.cost_in_pence.desc()).order_by(
+            search.review_rating.desc()
+        )
+
+        if filters.skills:
+            query = query.filter(search.skills.overlap(filters.skills))
+
+        # each range has to contain at least one of the provider's ranges
+        for availability in filters.availability:
+            the_daterange = DateRange(availability.from_date, availability.to_date)
+            query = query.filter(
+                literal(the_daterange, postgresql.DATERANGE).op("@>")(
+                    any_(search.availability)
+                )
+            )
+
+        conditions = ServiceProviderRepository._generate_conditions_for_listing(
+            filters, cost_in_pence=search.cost_in_pence
+        )
+        return query.filter(*conditions)
+
+    @staticmethod
+    def _estimate_count(
+        filters: schemas.ServiceProviderListFilterParams, db: Session
+    ) -> int:
+        """Estimates the number of service providers matching a search.
+
+        The search is planned but not run, and the planner's estimate of the
+        number of rows it returns is used.
+
+        Args:
+            filters (schemas.ServiceProviderListFilterParams): The filters to apply
+                to the query.
+            db (Session): The database session.
+
+        Returns:
+            int: The estimated number of matching service providers.
+        """
+
+        query = (
+            ServiceProviderRepository._filtered_query(filters, db)
+            .order_by(None)
+            .with_entities(models.ServiceProvider.id)
+        )
+        return int(ServiceProviderRepository._explain(query, db)["Plan Rows"])
+
+    @staticmethod
+    def _explain(query, db: Session) -> dict:
+        """Plans a query without running it.
+
+        Args:
+            query (Query): The query.
+            db (Session): The database session.
+
+        Returns:
+            dict: The top node of the plan, with the planner's estimates,
+                e.g. "Plan Rows" & "Total Cost".
+        """
+
+        compiled = query.statement.compile(
+            dialect=db.get_bind().dialect,
+            compile_kwargs={"render_postcompile": True},
+        )
+        plan = (
+            db.connection()
+            .exec_driver_sql(
+                "EXPLAIN (FORMAT JSON) " + compiled.string, compiled.params
+            )
+            .scalar()
+        )
+        return plan[0]["Plan"]
+
     @staticmethod
     def _calculate_offset(page: int, page_size: int) -> int:
         """Calculates the offset for a query.
@@ -294,14 +861,21 @@ class ServiceProviderRepository:
             Query: The query with the joins performed.
         """
 
+        average_review_rating = models.ServiceProvider.average_review_rating
         query = (
             db.query(models.ServiceProvider)
-            .having(coalesce(func.avg(models.Reviews.rating), 0) >= filters.reviews_gt)
-            .having(coalesce(func.avg(models.Reviews.rating), 0) <= filters.reviews_lt)
-            .outerjoin(models.Reviews)
+            .filter(average_review_rating >= filters.reviews_gt)
+            .filter(average_review_rating <= filters.reviews_lt)
+            # the skill & availability joins can match a provider more than once
             .group_by(models.ServiceProvider.id)
-            .order_by(models.ServiceProvider.cost_in_pence.desc())
-            .order_by(func.avg(models.Reviews.rating).desc())
+        )
+        if filters.name_query:
+            # the closest name matches come first, then the usual ordering
+            query = query.order_by(
+                *ServiceProviderRepository._rank_name_matches(filters.name_query)
+            )
+        query = query.order_by(models.ServiceProvider.cost_in_pence.desc()).order_by(
+            average_review_rating.desc()
         )
 
         # relationship filters have to work using joins as sqlalchemy doesn't support
@@ -322,16 +896,64 @@ class ServiceProviderRepository:
     @staticmethod
     def _generate_conditions_for_listing(
         filters: schemas.ServiceProviderListFilterParams,
+        cost_in_pence=models.ServiceProvider.cost_in_pence,
     ) -> list:
         conditions = []
         if filters.name:
             conditions.append(models.ServiceProvider.name == filters.name)
+        if filters.name_query:
+            conditions.append(
+                ServiceProviderRepository._match_names(filters.name_query)
+            )
         if filters.cost_gt is not None:
-            conditions.append(models.ServiceProvider.cost_in_pence > filters.cost_gt)
+            conditions.append(cost_in_pence > filters.cost_gt)
         if filters.cost_lt is not None:
-            conditions.append(models.ServiceProvider.cost_in_pence < filters.cost_lt)
+            conditions.append(cost_in_pence < filters.cost_lt)
         return conditions
 
+    @staticmethod
+    def _match_names(name_query: str):
+        """Build the condition for a fuzzy name search.
+
+        Names match if they contain the query, ignoring case. With pg_trgm
+        installed, names containing a word close to the query match too, so
+        typos are tolerated. Both are served by the trigram index.
+
+        Args:
+            name_query (str): The partial name to search for.
+
+        Returns:
+            The condition.
+        """
+
+        name = models.ServiceProvider.name
+        contains = name.ilike(f"%{escape_like(name_query)}%", escape="\\")
+        if not has_extension("pg_trgm"):
+            return contains
+        # `<%` is true when the query is similar to a word in the name
+        return or_(contains, literal(name_query).op("<%")(name))
+
+    @staticmethod
+    def _rank_name_matches(name_query: str) -> list:
+        """Build the ordering for a fuzzy name search.
+
+        Names that start with the query come first, then the names most
+        similar to it if pg_trgm is installed.
+
+        Args:
+            name_query (str): The partial name to search for.
+
+        Returns:
+            list: The order by clauses.
+        """
+
+        name = models.ServiceProvider.name
+        starts_with = name.ilike(f"{escape_like(name_query)}%", escape="\\")
+        ranking = [case((starts_with, 0), else_=1)]
+        if has_extension("pg_trgm"):
+            ranking.append(func.word_similarity(name_query, name).desc())
+        return ranking
+
     @staticmethod
     def _insert_service_provider(
         service_provider: models.ServiceProvider,
@@ -340,6 +962,7 @@ class ServiceProviderRepository:
     ) -> models.ServiceProvider:
 
         db.add(service_provider)
+        ServiceProviderSearchRepository.queue([service_provider.id], db)
 
         # insert the service-providers skills
         for skill in service_provider_schema.skills:
@@ -357,3 +980,52 @@ class ServiceProviderRepository:
             )
 
         return service_provider
+
+
+def _cancellable(func: Callable[[], T]) -> Callable[[], T]:
+    # a cancelled query, because it timed out or its client disconnected, is
+    # raised as SearchCancelled, to every caller sharing it
+    def call() -> T:
+        try:
+            return func()
+        except exc.OperationalError as e:
+            if not isinstance(e.orig, errors.QueryCanceled):
+                raise
+            if "statement timeout" in str(e.orig):
+                metrics.QUERY_GUARD_ACTIONS.inc(("statement_timeout",))
+            raise SearchCancelled(str(e.orig).strip()) from e
+
+    return call
+
+
+def _serialized_children() -> tuple:
+    # everything `as_dict` reads, loaded for a whole page in one query per
+    # relationship rather than one per provider. The rating shards are only
+    # read for providers with more than one, but a page can have any number
+    return (
+        selectinload(models.ServiceProvider.skills),
+        selectinload(models.ServiceProvider.availability),
+        selectinload(models.ServiceProvider.rating_shards),
+    )
+
+
+def _range_facet(buckets: tuple, bucket: int, count: int) -> schemas.RangeFacet:
+    # width_bucket numbers the buckets from 1, 0 is below the first bound
+    index = max(bucket - 1, 0)
+    upper = buckets[index + 1] if index + 1 < len(buckets) else None
+    return schemas.RangeFacet(gte=buckets[index], lt=upper, count=count)
+
+
+def _search_key(filters: schemas.ServiceProviderListFilterParams) -> Hashable:
+    # the order & repetition of the skills and availability don't change what
+    # a search matches, so equivalent searches get equal keys
+    return (
+        filters.reviews_gt,
+        filters.reviews_lt,
+        filters.name,
+        filters.name_query,
+        tuple(sorted(set(filters.skills or []))),
+        filters.cost_gt,
+        filters.cost_lt,
+        tuple(sorted({(a.from_date, a.to_date) for a in filters.availability or []})),
+    )
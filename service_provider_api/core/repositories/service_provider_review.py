@@ -1,20 +1,31 @@
 """Module to hold the service provider review repo,
 and all of the classes and methods relevant to it.."""
 
-from uuid import UUID
+import random
+from collections import defaultdict
+from typing import Optional
+from uuid import UUID, uuid4
 
 import structlog
-from sqlalchemy import exc
+from sqlalchemy import delete, exc, func, insert, select
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import Session
 
 from service_provider_api.api import schemas
+from service_provider_api.core.log_setup import Lazy
 from service_provider_api.core.repositories.service_provider import (
     ServiceProviderRepository,
 )
+from service_provider_api.core.repositories.service_provider_search import (
+    ServiceProviderSearchRepository,
+)
 from service_provider_api.database import models
 
 log = structlog.get_logger()
 
+# held while compacting, so only one process compacts the shards at a time
+_COMPACTION_LOCK_KEY = 0x7261_7469_6E67
+
 
 class FailedToCreateReview(Exception):
     """Raised when a review cannot be created."""
@@ -22,6 +33,12 @@ class FailedToCreateReview(Exception):
     pass
 
 
+class FailedToUpdateRatingShards(Exception):
+    """Raised when the rating shards cannot be updated or compacted."""
+
+    pass
+
+
 class ServiceProviderReviewRepository:
     """Repository for service provider reviews.
 
@@ -56,8 +73,10 @@ class ServiceProviderReviewRepository:
             service_provider = ServiceProviderRepository.get(service_provider_id, db)
             if not service_provider:
                 raise FailedToCreateReview("Service provider not found")
-            log.info(
-                "service provider found", service_provider=service_provider.as_dict()
+            # as_dict loads every relationship, only do it if it's logged
+            log.debug(
+                "service provider found",
+                service_provider=Lazy(service_provider.as_dict),
             )
 
             # create the service provider review
@@ -67,8 +86,13 @@ class ServiceProviderReviewRepository:
                 rating=review.rating,
             )
 
-            # add the review to the database
+            # add the review to the database, and to the provider's aggregates
             db.add(service_provider_review)
+            ServiceProviderReviewRepository._add_to_aggregates(
+                db,
+                {service_provider_id: (1, review.rating)},
+                {service_provider_id: service_provider.review_rating_shards},
+            )
             db.commit()
             db.refresh(service_provider_review)
             return service_provider_review
@@ -78,3 +102,261 @@ class ServiceProviderReviewRepository:
             raise FailedToCreateReview(
                 "An error occurred creating the service provider review"
             ) from e
+
+    @staticmethod
+    def new_many(
+        reviews: list[tuple[UUID, schemas.NewServiceProviderReview, UUID]],
+        db: Session,
+    ) -> list[Optional[models.Reviews]]:
+        """Create many service provider reviews in a single transaction.
+
+        The reviews are written with one multi-row insert, and each service
+        provider's rating aggregates are updated once for all of its new
+        reviews.
+
+        Args:
+            reviews (list[tuple[UUID, NewServiceProviderReview, UUID]]): The
+                ID of the service provider to review, the review, and the ID
+                of the user creating it, for each review to create.
+            db (Session): The database session.
+
+        Returns:
+            list[Optional[Reviews]]: The created reviews, in the order they
+                were given. None for reviews of service providers that don't
+                exist, which aren't created.
+
+        Raises:
+            FailedToCreateReview: If the reviews could not be created.
+        """
+
+        try:
+            requested = {service_provider_id for service_provider_id, _, _ in reviews}
+            # the number of rating shards of each provider that exists
+            existing = dict(
+                db.query(
+                    models.ServiceProvider.id,
+                    models.ServiceProvider.review_rating_shards,
+                )
+                .filter(models.ServiceProvider.id.in_(requested))
+                .all()
+            )
+
+            created: list[Optional[models.Reviews]] = []
+            ratings: dict[UUID, tuple[int, float]] = defaultdict(lambda: (0, 0.0))
+            for service_provider_id, review, user_id in reviews:
+                if service_provider_id not in existing:
+                    created.append(None)
+                    continue
+                created.append(
+                    models.Reviews(
+                        id=uuid4(),
+                        service_provider_id=service_provider_id,
+                        user_id=user_id,
+                        rating=review.rating,
+                    )
+                )
+                count, rating_sum = ratings[service_provider_id]
+                ratings[service_provider_id] = (count + 1, rating_sum + review.rating)
+
+            rows = [
+                {
+                    "id": review.id,
+                    "service_provider_id": review.service_provider_id,
+                    "user_id": review.user_id,
+                    "rating": review.rating,
+                }
+                for review in created
+                if review is not None
+            ]
+            if rows:
+                db.execute(insert(models.Reviews), rows)
+                ServiceProviderReviewRepository._add_to_aggregates(
+                    db, ratings, existing
+                )
+            db.commit()
+            return created
+
+        except exc.SQLAlchemyError as e:
+            db.rollback()
+            log.error("Failed to create service provider reviews", error=e)
+            raise FailedToCreateReview(
+                "An error occurred creating the service provider reviews"
+            ) from e
+
+    @staticmethod
+    def set_rating_shards(service_provider_id: UUID, shards: int, db: Session) -> None:
+        """Set the number of shards a service provider's ratings are counted in.
+
+        Popular service providers should be given more shards, so that their
+        reviews don't queue on the lock of a single row. Going back to one
+        shard compacts the provider's existing shards straight away.
+
+        Args:
+            service_provider_id (UUID): The ID of the service provider.
+            shards (int): The number of shards, at least 1.
+            db (Session): The database session.
+
+        Returns:
+            None
+
+        Raises:
+            ServiceProviderNotFound: If the service provider could not be found.
+            FailedToUpdateRatingShards: If the shards could not be updated.
+        """
+
+        if shards < 1:
+            raise ValueError("A service provider needs at least one rating shard")
+
+        try:
+            service_provider = ServiceProviderRepository.get(service_provider_id, db)
+            service_provider.review_rating_shards = shards
+            if shards == 1:
+                ServiceProviderReviewRepository._compact(db, [service_provider_id])
+            db.commit()
+        except exc.SQLAlchemyError as e:
+            db.rollback()
+            raise FailedToUpdateRatingShards from e
+
+    @staticmethod
+    def compact_rating_shards(db: Session) -> int:
+        """Fold every rating shard into its service provider's aggregates.
+
+        This is run periodically, so that the aggregates that service
+        providers are filtered & sorted by catch up with their shards. If
+        another process is already compacting, this does nothing.
+
+        Args:
+            db (Session): The database session.
+
+        Returns:
+            int: The number of shards that were compacted.
+
+        Raises:
+            FailedToUpdateRatingShards: If the shards could not be compacted.
+        """
+
+        try:
+            if not db.scalar(
+                select(func.pg_try_advisory_xact_lock(_COMPACTION_LOCK_KEY))
+            ):
+                db.rollback()
+                return 0
+            compacted = ServiceProviderReviewRepository._compact(db)
+            db.commit()
+            return compacted
+        except exc.SQLAlchemyError as e:
+            db.rollback()
+            raise FailedToUpdateRatingShards from e
+
+    @staticmethod
+    def _compact(db: Session, service_provider_ids: Optional[list[UUID]] = None) -> int:
+        """Move the counts in the rating shards into the service providers.
+
+        Args:
+            db (Session): The database session.
+            service_provider_ids (Optional[list[UUID]], optional): Only compact
+                the shards of these service providers. Defaults to all of them.
+
+        Returns:
+            int: The number of shards that were compacted.
+        """
+
+        statement = delete(models.ReviewRatingShard).returning(
+            models.ReviewRatingShard.service_provider_id,
+            models.ReviewRatingShard.review_count,
+            models.ReviewRatingShard.review_rating_sum,
+        )
+        if service_provider_ids is not None:
+            statement = statement.where(
+                models.ReviewRatingShard.service_provider_id.in_(service_provider_ids)
+            )
+        shards = db.execute(statement).all()
+
+        ratings: dict[UUID, tuple[int, float]] = defaultdict(lambda: (0, 0.0))
+        for service_provider_id, count, rating_sum in shards:
+            total_count, total_sum = ratings[service_provider_id]
+            ratings[service_provider_id] = (total_count + count, total_sum + rating_sum)
+
+        # every provider is given one shard, so its row is updated directly
+        ServiceProviderReviewRepository._add_to_aggregates(
+            db, ratings, {service_provider_id: 1 for service_provider_id in ratings}
+        )
+        return len(shards)
+
+    @staticmethod
+    def _add_to_aggregates(
+        db: Session,
+        ratings: dict[UUID, tuple[int, float]],
+        shards: dict[UUID, int],
+    ) -> None:
+        """Add new reviews to the rating aggregates of service providers.
+
+        Providers with one shard have their own row updated. Providers with
+        more are updated in a random one of their shards instead, so that
+        concurrent reviews of the same provider rarely wait on each other.
+
+        Args:
+            db (Session): The database session.
+            ratings (dict[UUID, tuple[int, float]]): The number of new reviews
+                of each service provider, and the sum of their ratings.
+            shards (dict[UUID, int]): The number of rating shards of each
+                service provider.
+
+        Returns:
+            None
+        """
+
+        sharded, unsharded = [], []
+        # a consistent lock order, so concurrent batches can't deadlock
+        for service_provider_id in sorted(ratings):
+            count, rating_sum = ratings[service_provider_id]
+            if shards[service_provider_id] > 1:
+                sharded.append(
+                    {
+                        "service_provider_id": service_provider_id,
+                        "shard": random.randrange(shards[service_provider_id]),
+                        "review_count": count,
+                        "review_rating_sum": rating_sum,
+                    }
+                )
+                continue
+
+            unsharded.append(service_provider_id)
+            db.query(models.ServiceProvider).filter(
+                models.ServiceProvider.id == service_provider_id
+            ).update(
+                {
+                    models.ServiceProvider.review_count: (
+                        models.ServiceProvider.review_count + count
+                    ),
+                    models.ServiceProvider.review_rating_sum: (
+                        models.ServiceProvider.review_rating_sum + rating_sum
+                    ),
+                },
+                synchronize_session=False,
+            )
+
+        if sharded:
+            statement = postgresql.insert(models.ReviewRatingShard)
+            db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[
+                        models.ReviewRatingShard.service_provider_id,
+                        models.ReviewRatingShard.shard,
+                    ],
+                    set_={
+                        "review_count": (
+                            models.ReviewRatingShard.review_count
+                            + statement.excluded.review_count
+                        ),
+                        "review_rating_sum": (
+                            models.ReviewRatingShard.review_rating_sum
+                            + statement.excluded.review_rating_sum
+                        ),
+                    },
+                ),
+                sharded,
+            )
+
+        # the shards aren't searched on until they're compacted
+        ServiceProviderSearchRepository.queue(unsharded, db)
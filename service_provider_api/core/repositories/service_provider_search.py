@@ -0,0 +1,256 @@
+"""Module to hold the service provider search repo,
+which maintains the denormalized search table."""
+
+import time
+from typing import Iterable, Optional
+from uuid import UUID
+
+import structlog
+from sqlalchemy import delete, exc, func, insert, literal_column, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from service_provider_api.database import models
+
+log = structlog.get_logger()
+
+# the most service providers refreshed in one transaction
+REFRESH_BATCH_SIZE = 1_000
+
+# the staleness bound last checked, & the monotonic time until which the
+# table is known to be within it
+_fresh_until: tuple[Optional[float], float] = (None, 0.0)
+
+
+class FailedToRefreshSearch(Exception):
+    """Raised when the search table cannot be refreshed."""
+
+    pass
+
+
+class ServiceProviderSearchRepository:
+    """Repository for the service provider search table.
+
+    Every change to a service provider, its skills, availability or rating
+    aggregates queues the provider in the same transaction as the change.
+    The refresher recomputes the search rows of the queued providers, so
+    only the providers touched since the last refresh are reprocessed.
+    """
+
+    @staticmethod
+    def queue(service_provider_ids: Iterable[UUID], db: Session) -> None:
+        """Queue service providers to have their search rows refreshed.
+
+        Must be called in the transaction that changes the service providers,
+        it doesn't commit.
+
+        Args:
+            service_provider_ids (Iterable[UUID]): The IDs of the changed
+                service providers.
+            db (Session): The database session.
+
+        Returns:
+            None
+        """
+
+        rows = [{"service_provider_id": id} for id in sorted(set(service_provider_ids))]
+        if not rows:
+            return
+
+        queue = models.ServiceProviderSearchQueue
+        statement = postgresql.insert(queue)
+        # a no-op update rather than DO NOTHING, so the queued row is locked &
+        # a refresh that's already running skips it instead of dequeuing it
+        # before this change is committed. The oldest change is kept.
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[queue.service_provider_id],
+                set_={"queued_at": queue.queued_at},
+            ),
+            rows,
+        )
+
+    @staticmethod
+    def refresh(db: Session, batch_size: int = REFRESH_BATCH_SIZE) -> int:
+        """Refresh the search rows of a batch of queued service providers.
+
+        Providers queued by transactions that haven't committed are skipped,
+        and refreshed by a later call. Several processes can refresh at once,
+        each takes a different batch.
+
+        Args:
+            db (Session): The database session.
+            batch_size (int, optional): The most providers to refresh.
+
+        Returns:
+            int: The number of providers refreshed.
+
+        Raises:
+            FailedToRefreshSearch: If the search rows couldn't be refreshed.
+        """
+
+        queue = models.ServiceProviderSearchQueue
+        try:
+            batch = (
+                select(queue.service_provider_id)
+                .order_by(queue.queued_at)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            service_provider_ids = (
+                db.execute(
+                    delete(queue)
+                    .where(queue.service_provider_id.in_(batch))
+                    .returning(queue.service_provider_id)
+                    .execution_options(synchronize_session=False)
+                )
+                .scalars()
+                .all()
+            )
+            if service_provider_ids:
+                ServiceProviderSearchRepository._replace(db, service_provider_ids)
+            db.commit()
+            return len(service_provider_ids)
+        except exc.SQLAlchemyError as e:
+            db.rollback()
+            raise FailedToRefreshSearch from e
+
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """Rebuild the whole search table from the service providers.
+
+        Used to fill the table after a bulk load that bypasses the queue.
+
+        Args:
+            db (Session): The database session.
+
+        Returns:
+            int: The number of search rows.
+
+        Raises:
+            FailedToRefreshSearch: If the search table couldn't be rebuilt.
+        """
+
+        try:
+            db.execute(delete(models.ServiceProviderSearchQueue))
+            rows = ServiceProviderSearchRepository._replace(db)
+            db.commit()
+            return rows
+        except exc.SQLAlchemyError as e:
+            db.rollback()
+            raise FailedToRefreshSearch from e
+
+    @staticmethod
+    def is_fresh(max_staleness: Optional[float], db: Session) -> bool:
+        """Check whether the search table is fresh enough to be searched.
+
+        Nothing queued can get older than the bound before the oldest entry
+        seen does, so a fresh answer holds until then and isn't checked again
+        in the meantime. Only stale answers cost a query on every call.
+
+        Args:
+            max_staleness (Optional[float]): The most seconds the table may
+                lag behind the service providers. None if it's never fresh
+                enough, 0 if it has to be up to date.
+            db (Session): The database session.
+
+        Returns:
+            bool: True if no change older than `max_staleness` is queued.
+        """
+
+        global _fresh_until
+
+        if max_staleness is None:
+            return False
+
+        checked_at = time.monotonic()
+        bound, until = _fresh_until
+        if bound == max_staleness and checked_at < until:
+            return True
+
+        oldest = select(
+            func.min(models.ServiceProviderSearchQueue.queued_at)
+        ).scalar_subquery()
+        # the wall clock rather than now(), which is when the transaction began
+        age = db.scalar(
+            select(
+                func.coalesce(func.extract("epoch", func.clock_timestamp() - oldest), 0)
+            )
+        )
+        age = float(age)
+        if age > max_staleness:
+            return False
+
+        _fresh_until = (max_staleness, checked_at + max_staleness - age)
+        return True
+
+    @staticmethod
+    def _replace(db: Session, service_provider_ids: Optional[list[UUID]] = None) -> int:
+        """Recompute the search rows of service providers.
+
+        Args:
+            db (Session): The database session.
+            service_provider_ids (Optional[list[UUID]], optional): The service
+                providers to recompute, or None for every service provider.
+
+        Returns:
+            int: The number of search rows written. Deleted providers have
+                their rows removed.
+        """
+
+        search = models.ServiceProviderSearch
+        provider = models.ServiceProvider
+        # aggregated & joined rather than correlated, so a rebuild is a hash
+        # join instead of a lookup per provider
+        skills = select(
+            models.Skills.service_provider_id.label("id"),
+            func.array_agg(models.Skills.skill).label("skills"),
+        ).group_by(models.Skills.service_provider_id)
+        availability = select(
+            models.Availability.service_provider_id.label("id"),
+            func.array_agg(models.Availability.availability).label("availability"),
+        ).group_by(models.Availability.service_provider_id)
+        rows = select(
+            provider.id,
+            provider.cost_in_pence,
+            provider.average_review_rating,
+            provider.review_count,
+        )
+
+        remove = delete(search)
+        if service_provider_ids is not None:
+            remove = remove.where(search.service_provider_id.in_(service_provider_ids))
+            rows = rows.where(provider.id.in_(service_provider_ids))
+            skills = skills.where(
+                models.Skills.service_provider_id.in_(service_provider_ids)
+            )
+            availability = availability.where(
+                models.Availability.service_provider_id.in_(service_provider_ids)
+            )
+        db.execute(remove)
+
+        skills, availability = skills.subquery(), availability.subquery()
+        rows = (
+            rows.add_columns(
+                # an empty array, typed by the first argument
+                func.coalesce(skills.c.skills, literal_column("'{}'")),
+                func.coalesce(availability.c.availability, literal_column("'{}'")),
+            )
+            .outerjoin(skills, skills.c.id == provider.id)
+            .outerjoin(availability, availability.c.id == provider.id)
+        )
+
+        return db.execute(
+            insert(search).from_select(
+                [
+                    search.service_provider_id,
+                    search.cost_in_pence,
+                    search.review_rating,
+                    search.review_count,
+                    search.skills,
+                    search.availability,
+                ],
+                rows,
+            )
+        ).rowcount
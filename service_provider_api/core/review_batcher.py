@@ -0,0 +1,209 @@
+"""Module used to write reviews in batches (group commit).
+
+When write-behind is enabled, review requests don't write to the database
+themselves. They queue their review and wait, and a background thread
+writes everything queued with a single multi-row insert and commit,
+updating each service provider's rating aggregates once per batch. A
+batch is written when it reaches a maximum size, or when its oldest review
+has waited for the maximum delay, whichever comes first.
+
+Requests still only succeed once their review is committed, so nothing is
+lost if the process dies, but many reviews share the cost of one commit.
+If a batch fails its reviews are retried one at a time, so that a single
+bad review only fails its own request.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+from uuid import UUID
+
+import structlog
+
+from service_provider_api.api import schemas
+from service_provider_api.core import metrics, provider_misses
+from service_provider_api.core.repositories.service_provider import (
+    ServiceProviderNotFound,
+)
+from service_provider_api.core.repositories.service_provider_review import (
+    FailedToCreateReview,
+    ServiceProviderReviewRepository,
+)
+from service_provider_api.database.database import SessionLocal
+
+log = structlog.get_logger()
+
+_batcher: Optional["ReviewBatcher"] = None
+# tells the writer thread to flush what's queued and exit
+_STOP = object()
+
+
+class ReviewBatcher:
+    """Writes queued reviews in batches on a background thread.
+
+    Args:
+        max_batch_size (int): The most reviews written in one batch.
+        max_delay (float): The longest, in seconds, a review waits for a
+            batch to fill up before it's written.
+    """
+
+    def __init__(self, max_batch_size: int, max_delay: float) -> None:
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="review-batcher", daemon=True
+        )
+
+    def start(self) -> None:
+        """Start the writer thread.
+
+        Returns:
+            None
+        """
+
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write any queued reviews, then stop the writer thread.
+
+        Returns:
+            None
+        """
+
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def submit(
+        self,
+        service_provider_id: UUID,
+        review: schemas.NewServiceProviderReview,
+        user_id: UUID,
+    ) -> Future:
+        """Queue a review to be written.
+
+        Args:
+            service_provider_id (UUID): The ID of the service provider to review.
+            review (NewServiceProviderReview): The review to create.
+            user_id (UUID): The ID of the user creating the review.
+
+        Returns:
+            Future: Resolves to the created review once it's committed.
+        """
+
+        future = Future()
+        self._queue.put((future, (service_provider_id, review, user_id)))
+        return future
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._write(batch)
+
+    def _write(self, batch: list[tuple[Future, tuple]]) -> None:
+        # the requests that went away while their review was queued have
+        # cancelled it, and the rest can't be cancelled from here on, so
+        # setting their results can't fail
+        batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        metrics.REVIEW_BATCH_SIZE.observe(len(batch))
+        db = SessionLocal()
+        try:
+            try:
+                created = ServiceProviderReviewRepository.new_many(
+                    [review for _, review in batch], db
+                )
+            except FailedToCreateReview:
+                log.warning(
+                    "review batch failed, retrying individually", size=len(batch)
+                )
+                for future, review in batch:
+                    self._write_one(future, review, db)
+                return
+
+            for (future, (service_provider_id, _, _)), review in zip(batch, created):
+                if review is None:
+                    provider_misses.record_miss(service_provider_id)
+                    future.set_exception(
+                        ServiceProviderNotFound(
+                            f"Service provider with id {service_provider_id} not found"
+                        )
+                    )
+                else:
+                    future.set_result(review)
+        except Exception as e:
+            # never leave a request waiting forever
+            for future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _write_one(future: Future, review: tuple, db) -> None:
+        try:
+            future.set_result(ServiceProviderReviewRepository.new(*review, db))
+        except Exception as e:
+            db.rollback()
+            future.set_exception(e)
+
+
+def start_batcher(max_batch_size: int, max_delay: float) -> ReviewBatcher:
+    """Start the process's review batcher.
+
+    Args:
+        max_batch_size (int): The most reviews written in one batch.
+        max_delay (float): The longest, in seconds, a review waits for a
+            batch to fill up before it's written.
+
+    Returns:
+        ReviewBatcher: The running batcher.
+    """
+
+    global _batcher
+    _batcher = ReviewBatcher(max_batch_size, max_delay)
+    _batcher.start()
+    return _batcher
+
+
+def stop_batcher() -> None:
+    """Write any queued reviews and stop the process's review batcher.
+
+    Returns:
+        None
+    """
+
+    global _batcher
+    if _batcher is not None:
+        _batcher.stop()
+        _batcher = None
+
+
+def get_batcher() -> Optional[ReviewBatcher]:
+    """Get the process's review batcher.
+
+    Returns:
+        Optional[ReviewBatcher]: The batcher, or None if write-behind is off.
+    """
+
+    return _batcher
@@ -0,0 +1,70 @@
+"""Module used to periodically refresh the search table.
+
+Changes to service providers queue them to have their search rows
+refreshed. Every worker process runs a refresher, which drains the queue a
+batch at a time. Providers being refreshed by another process are skipped,
+so the processes share the work rather than repeating it.
+"""
+
+from typing import Optional
+
+import structlog
+
+from service_provider_api.core.periodic import PeriodicTask
+from service_provider_api.core.repositories.service_provider_search import (
+    REFRESH_BATCH_SIZE,
+    ServiceProviderSearchRepository,
+)
+from service_provider_api.database.database import SessionLocal
+
+log = structlog.get_logger()
+
+_refresher: Optional[PeriodicTask] = None
+
+
+def refresh() -> None:
+    """Refresh the search rows of every queued service provider.
+
+    Returns:
+        None
+    """
+
+    db = SessionLocal()
+    try:
+        refreshed = batch = ServiceProviderSearchRepository.refresh(db)
+        while batch == REFRESH_BATCH_SIZE:
+            batch = ServiceProviderSearchRepository.refresh(db)
+            refreshed += batch
+        if refreshed:
+            log.debug("refreshed search rows", service_providers=refreshed)
+    finally:
+        db.close()
+
+
+def start_refresher(interval: float) -> PeriodicTask:
+    """Start the process's search table refresher.
+
+    Args:
+        interval (float): The number of seconds between refreshes.
+
+    Returns:
+        PeriodicTask: The running refresher.
+    """
+
+    global _refresher
+    _refresher = PeriodicTask("search-refresher", interval, refresh)
+    _refresher.start()
+    return _refresher
+
+
+def stop_refresher() -> None:
+    """Stop the process's search table refresher.
+
+    Returns:
+        None
+    """
+
+    global _refresher
+    if _refresher is not None:
+        _refresher.stop()
+        _refresher = None
@@ -0,0 +1,108 @@
+"""Module used to coalesce identical concurrent reads.
+
+When a provider is linked somewhere popular, hundreds of requests for the
+same provider, or the same search, arrive within a few milliseconds, and
+each would run its own queries. Instead the first request for a key makes
+the call, and the identical requests that arrive while it's in flight wait
+for it and share its result, or its exception. Once the call returns the
+key is forgotten, so nothing is cached: a request only shares a call that
+was already running when it arrived.
+
+Results are shared between threads, so the calls coalesced must return
+values that don't depend on the caller's session, and callers mustn't
+modify them. Once another caller waits for a call, the call's queries are
+marked as shared, so they aren't cancelled if the caller that made it
+disconnects, see `core.query_guard`. A call whose queries were already
+cancelled isn't joined, the caller makes a new call instead.
+"""
+
+import threading
+from typing import Any, Callable, Hashable, Optional, TypeVar
+
+import structlog
+
+from service_provider_api.core import metrics, query_guard
+from service_provider_api.core.config import settings
+
+log = structlog.get_logger()
+
+T = TypeVar("T")
+
+
+class _Call:
+    """A call in flight, and the callers waiting for it."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+        self.cancel_scope = query_guard.current_scope()
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time, sharing it with identical calls."""
+
+    def __init__(self) -> None:
+        self._calls: dict[tuple[str, Hashable], _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, operation: str, key: Hashable, func: Callable[[], T]) -> T:
+        """Call `func`, or wait for the identical call already in flight.
+
+        Args:
+            operation (str): The kind of call, e.g. "get". Calls are only
+                coalesced with calls of the same operation, and it's used to
+                label the metrics.
+            key (Hashable): Identifies the call, calls with equal keys must
+                return equal results.
+            func (Callable[[], T]): Makes the call.
+
+        Returns:
+            T: The result of the call, shared by every caller that waited for it.
+
+        Raises:
+            Exception: Whatever the call raised, raised to every caller.
+        """
+
+        if not settings.READ_COALESCING:
+            return func()
+
+        with self._lock:
+            call = self._calls.get((operation, key))
+            # a call whose caller disconnected is failing, so it's replaced
+            # rather than shared
+            leader = call is None or (
+                call.cancel_scope is not None and not call.cancel_scope.share()
+            )
+            if leader:
+                call = self._calls[(operation, key)] = _Call()
+            else:
+                call.followers += 1
+
+        if not leader:
+            metrics.COALESCED_READS.inc((operation, "follower"))
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        metrics.COALESCED_READS.inc((operation, "leader"))
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get((operation, key)) is call:
+                    del self._calls[(operation, key)]
+            call.done.set()
+            if call.followers:
+                log.debug(
+                    "coalesced reads",
+                    operation=operation,
+                    key=key,
+                    followers=call.followers,
+                )
@@ -0,0 +1,301 @@
+"""Module used to hold the in-memory skill index used for autocomplete.
+
+Skill suggestions are requested on every keystroke, so they're served from
+memory rather than from Postgres. The distinct skills are kept in a list
+sorted by their case-folded name, so the skills starting with a prefix are
+found by bisecting the list, along with the number of service providers
+that have each skill.
+
+The index is loaded the first time it's used, from the shared catalogue
+snapshot if there's a recent one, otherwise from the database, and kept
+up to date by the repository as this process adds & removes skills. The
+skills other processes add & remove arrive as change events, see
+`core.invalidation`, and the index is reloaded periodically as a backstop.
+Only the first load uses the snapshot: it can be minutes old, so later
+loads, which replace an index the change events have kept current, read
+the database.
+
+Only one load runs at a time, and only the first load is waited for by
+requests. When changes may have been missed the index is reloaded in the
+background, and the old contents are served meanwhile, so keystrokes never
+wait on Postgres once the index has been loaded.
+"""
+
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Callable, Iterable, Optional
+
+import structlog
+from sqlalchemy import distinct, func
+
+from service_provider_api.core import catalogue_snapshot, invalidation
+from service_provider_api.core.periodic import PeriodicTask
+from service_provider_api.database import models
+from service_provider_api.database.database import SessionLocal
+
+log = structlog.get_logger()
+
+
+class SkillIndex:
+    """A prefix index over the skills of every service provider.
+
+    Args:
+        loader (Callable[[], dict[str, int]]): Loads the number of service
+            providers with each skill.
+        initial_loader (Optional[Callable[[], Optional[dict[str, int]]]]):
+            Loads the counts for the first load only, e.g. from a snapshot.
+            Returns None if it can't, and the first load uses `loader`.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], dict[str, int]],
+        initial_loader: Optional[Callable[[], Optional[dict[str, int]]]] = None,
+    ) -> None:
+        self.loader = loader
+        self.initial_loader = initial_loader
+        # (case-folded skill, skill), sorted
+        self._keys: list[tuple[str, str]] = []
+        self._counts: dict[str, int] = {}
+        self._loaded = False
+        self._started = False
+        # the changes made while a load is running, None if there isn't one
+        self._pending: Optional[Counter] = None
+        self._reload_queued = False
+        self._lock = threading.Lock()
+        # only one load runs at a time
+        self._load_lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the index has been loaded."""
+        return self._loaded
+
+    def ensure_loaded(self) -> None:
+        """Load the index if it hasn't been loaded yet.
+
+        Concurrent callers wait for a single load.
+
+        Returns:
+            None
+        """
+
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            if not self._started and self.initial_loader is not None:
+                if self._load(self.initial_loader):
+                    return
+            self._load(self.loader)
+
+    def reload(self) -> None:
+        """Replace the contents of the index with the skills in the database.
+
+        The old contents are served until the new ones are loaded.
+
+        Returns:
+            None
+        """
+
+        with self._load_lock:
+            self._load(self.loader)
+
+    def invalidate(self) -> None:
+        """Reload the index in the background, as it may have missed changes.
+
+        The old contents are served until the reload finishes. An index
+        that hasn't been loaded is left to be loaded when it's first used.
+
+        Returns:
+            None
+        """
+
+        with self._lock:
+            if self._reload_queued or not (self._loaded or self._pending is not None):
+                return
+            self._reload_queued = True
+        threading.Thread(
+            target=self._background_reload, name="skill-index-reload", daemon=True
+        ).start()
+
+    def add(self, skills: Iterable[str]) -> None:
+        """Count a service provider that has the given skills.
+
+        Args:
+            skills (Iterable[str]): The skills of the service provider.
+
+        Returns:
+            None
+        """
+
+        self._update(Counter(set(skills)))
+
+    def remove(self, skills: Iterable[str]) -> None:
+        """Stop counting a service provider that had the given skills.
+
+        Args:
+            skills (Iterable[str]): The skills of the service provider.
+
+        Returns:
+            None
+        """
+
+        self._update(Counter({skill: -1 for skill in set(skills)}))
+
+    def suggest(self, prefix: str, limit: int) -> list[tuple[str, int]]:
+        """Suggest the skills that start with a prefix, ignoring case.
+
+        Args:
+            prefix (str): The start of the skill.
+            limit (int): The most suggestions to return.
+
+        Returns:
+            list[tuple[str, int]]: The skills and the number of service
+                providers with them, most common first.
+        """
+
+        key = prefix.casefold()
+        with self._lock:
+            matches = []
+            for index in range(bisect_left(self._keys, (key,)), len(self._keys)):
+                folded, skill = self._keys[index]
+                if not folded.startswith(key):
+                    break
+                matches.append((skill, self._counts[skill]))
+
+        return heapq.nsmallest(limit, matches, key=lambda match: (-match[1], match[0]))
+
+    def _background_reload(self) -> None:
+        with self._load_lock:
+            with self._lock:
+                self._reload_queued = False
+            try:
+                self._load(self.loader)
+            except Exception as e:
+                log.error("Failed to reload the skill index", error=e)
+
+    def _load(self, loader: Callable[[], Optional[dict[str, int]]]) -> bool:
+        # must hold the load lock. The changes made while loading are
+        # recorded & reapplied, as the load may not include them. One it
+        # does include is counted twice until the next reload, rather than
+        # lost
+        with self._lock:
+            self._pending = Counter()
+        try:
+            counts = loader()
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            pending, self._pending = self._pending, None
+            if counts is None:
+                return False
+            counts = Counter(counts)
+            counts.update(pending)
+            counts = {skill: count for skill, count in counts.items() if count > 0}
+            self._keys = sorted((skill.casefold(), skill) for skill in counts)
+            self._counts = counts
+            self._loaded = self._started = True
+            return True
+
+    def _update(self, changes: Counter) -> None:
+        with self._lock:
+            if self._pending is not None:
+                self._pending.update(changes)
+            if not self._loaded:
+                # the changes will be included when the index is loaded
+                return
+            for skill, change in changes.items():
+                count = self._counts.get(skill, 0) + change
+                if count > 0:
+                    if skill not in self._counts:
+                        insort(self._keys, (skill.casefold(), skill))
+                    self._counts[skill] = count
+                elif skill in self._counts:
+                    del self._counts[skill]
+                    self._keys.pop(bisect_left(self._keys, (skill.casefold(), skill)))
+
+
+def count_skills() -> dict[str, int]:
+    """Count the service providers with each skill.
+
+    Returns:
+        dict[str, int]: The number of service providers with each skill.
+    """
+
+    db = SessionLocal()
+    try:
+        return dict(
+            db.query(
+                models.Skills.skill,
+                func.count(distinct(models.Skills.service_provider_id)),
+            )
+            .group_by(models.Skills.skill)
+            .all()
+        )
+    finally:
+        db.close()
+
+
+def snapshot_skill_counts() -> Optional[dict[str, int]]:
+    """Count the service providers with each skill from the catalogue snapshot.
+
+    Returns:
+        Optional[dict[str, int]]: The number of service providers with each
+            skill, or None if there isn't a recent snapshot.
+    """
+
+    snapshot = catalogue_snapshot.fresh_snapshot()
+    if snapshot is None:
+        return None
+    return snapshot.skill_counts()
+
+
+skill_index = SkillIndex(count_skills, snapshot_skill_counts)
+_refresher: Optional[PeriodicTask] = None
+
+
+def _apply_change(event: invalidation.ChangeEvent) -> None:
+    # another worker created, updated or deleted a service provider
+    if event.kind == invalidation.SERVICE_PROVIDER_CHANGED:
+        skill_index.remove(event.data.get("removed_skills", []))
+        skill_index.add(event.data.get("added_skills", []))
+
+
+# if changes were missed, load the index again the next time it's used
+invalidation.subscribe(_apply_change, skill_index.invalidate)
+
+
+def start_refresher(interval: float) -> PeriodicTask:
+    """Start reloading the skill index periodically.
+
+    Args:
+        interval (float): The number of seconds between reloads.
+
+    Returns:
+        PeriodicTask: The running refresher.
+    """
+
+    global _refresher
+    _refresher = PeriodicTask("skill-index-refresher", interval, skill_index.reload)
+    _refresher.start()
+    return _refresher
+
+
+def stop_refresher() -> None:
+    """Stop reloading the skill index.
+
+    Returns:
+        None
+    """
+
+    global _refresher
+    if _refresher is not None:
+        _refresher.stop()
+        _refresher = None
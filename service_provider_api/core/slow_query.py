@@ -0,0 +1,226 @@
+"""Module used to record slow SQL statements.
+
+When enabled, every statement that takes longer than the configured
+threshold is logged with its normalized SQL and the shape of its bound
+parameters. A sampled subset of slow `SELECT` statements is re-run with
+`EXPLAIN (ANALYZE, BUFFERS)` on a separate connection, off the request
+thread, and the plan is appended to a local JSONL file.
+"""
+
+import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Any
+
+import orjson
+import structlog
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+
+log = structlog.get_logger()
+
+_WHITESPACE = re.compile(r"\s+")
+# expanded IN lists, e.g. IN (%(id_1_1)s, %(id_1_2)s)
+_EXPANDED_IN = re.compile(r"\(%\((\w+?)_\d+\)s(?:, %\(\1_\d+\)s)*\)")
+_EXPANDED_PARAMETER = re.compile(r"^(\w+?_\d+)_\d+$")
+
+
+def normalize_sql(statement: str) -> str:
+    """Normalize a SQL statement so that similar statements group together.
+
+    Whitespace is collapsed and expanded `IN` lists are replaced with a
+    single placeholder, so the same query with a different number of IDs
+    normalizes to the same string.
+
+    Args:
+        statement (str): The SQL statement.
+
+    Returns:
+        str: The normalized statement.
+    """
+
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    return _EXPANDED_IN.sub(r"(%(\1_*)s)", statement)
+
+
+def parameter_shape(parameters: Any) -> dict:
+    """Describe the bound parameters of a statement without their values.
+
+    Args:
+        parameters (Any): The parameters passed to the DBAPI cursor.
+
+    Returns:
+        dict: A mapping of parameter name to type name. Parameters from an
+            expanded `IN` list are grouped, e.g. `{"id_1_*": "UUID[50]"}`.
+    """
+
+    if isinstance(parameters, (list, tuple)):
+        # executemany, describe the first row
+        if not parameters:
+            return {}
+        return {"rows": len(parameters), **parameter_shape(parameters[0])}
+    if not isinstance(parameters, dict):
+        return {}
+
+    shape, expanded = {}, {}
+    for name, value in parameters.items():
+        match = _EXPANDED_PARAMETER.match(name)
+        if match:
+            key = f"{match.group(1)}_*"
+            type_name, count = expanded.get(key, (type(value).__name__, 0))
+            expanded[key] = (type_name, count + 1)
+        else:
+            shape[name] = type(value).__name__
+
+    for key, (type_name, count) in expanded.items():
+        shape[key] = f"{type_name}[{count}]"
+    return shape
+
+
+class SlowQueryRecorder:
+    """Records statements that take longer than a threshold.
+
+    Args:
+        threshold_ms (float): Statements slower than this are recorded.
+        explain_sample_rate (float): The fraction of slow `SELECT`
+            statements to capture a plan for.
+        explain_path (str): The JSONL file plans are appended to.
+    """
+
+    # don't let plan capture queue up behind a burst of slow queries
+    MAX_PENDING_EXPLAINS = 2
+
+    def __init__(
+        self, threshold_ms: float, explain_sample_rate: float, explain_path: str
+    ) -> None:
+        self.threshold = threshold_ms / 1000
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_path = explain_path
+        self._engine = None
+        self._explain_engine = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="slow-query-explain"
+        )
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def attach(self, engine: Engine) -> None:
+        """Start recording the slow statements run on an engine.
+
+        Plans are captured on a separate, unpooled engine so that they
+        don't take connections away from requests or record themselves.
+
+        Args:
+            engine (Engine): The engine to record.
+
+        Returns:
+            None
+        """
+
+        self._engine = engine
+        self._explain_engine = create_engine(engine.url, poolclass=NullPool)
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def detach(self) -> None:
+        """Stop recording, and wait for any pending plans to be written.
+
+        Returns:
+            None
+        """
+
+        event.remove(self._engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(self._engine, "after_cursor_execute", self._after_cursor_execute)
+        event.remove(self._engine, "handle_error", self._handle_error)
+        self._executor.shutdown(wait=True)
+        self._explain_engine.dispose()
+
+    def _before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        conn.info.setdefault("slow_query_start_time", []).append(perf_counter())
+
+    def _after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        duration = perf_counter() - conn.info["slow_query_start_time"].pop()
+        if duration < self.threshold:
+            return
+
+        normalized = normalize_sql(statement)
+        shape = parameter_shape(parameters)
+        log.warning(
+            "slow query",
+            sql=normalized,
+            parameters=shape,
+            duration_ms=round(duration * 1000, 2),
+        )
+
+        if (
+            not executemany
+            and statement.lstrip()[:6].upper() == "SELECT"
+            and random.random() < self.explain_sample_rate
+        ):
+            self._submit_explain(statement, parameters, normalized, shape, duration)
+
+    def _handle_error(self, context) -> None:
+        # after_cursor_execute isn't called for failed statements
+        if context.connection is not None and context.connection.info.get(
+            "slow_query_start_time"
+        ):
+            context.connection.info["slow_query_start_time"].pop()
+
+    def _submit_explain(
+        self,
+        statement: str,
+        parameters: dict,
+        normalized: str,
+        shape: dict,
+        duration: float,
+    ) -> None:
+        with self._lock:
+            if self._pending >= self.MAX_PENDING_EXPLAINS:
+                return
+            self._pending += 1
+
+        self._executor.submit(
+            self._explain, statement, parameters, normalized, shape, duration
+        )
+
+    def _explain(
+        self,
+        statement: str,
+        parameters: dict,
+        normalized: str,
+        shape: dict,
+        duration: float,
+    ) -> None:
+        try:
+            with self._explain_engine.connect() as conn:
+                # EXPLAIN ANALYZE runs the statement, so never commit it
+                with conn.begin() as transaction:
+                    plan = conn.exec_driver_sql(
+                        "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement,
+                        parameters,
+                    ).scalar()
+                    transaction.rollback()
+
+            record = {
+                "recorded_at": datetime.now(timezone.utc),
+                "sql": normalized,
+                "parameters": shape,
+                "duration_ms": round(duration * 1000, 2),
+                "plan": plan,
+            }
+            with open(self.explain_path, "ab") as plans:
+                plans.write(orjson.dumps(record) + b"\n")
+        except Exception as e:
+            log.error("Failed to capture slow query plan", sql=normalized, error=e)
+        finally:
+            with self._lock:
+                self._pending -= 1
@@ -22,3 +22,17 @@ def list_pairs(sequence: list) -> Iterator[tuple[date, date]]:
         return []
     it = iter(sequence)
     return zip(it, it)
+
+
+def escape_like(value: str) -> str:
+    """Escape a value so a LIKE pattern matches it literally.
+
+    The pattern must be used with `escape="\\"`.
+
+    Args:
+        value: The value to match.
+
+    Returns:
+        The value with its wildcards & escape characters escaped.
+    """
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -0,0 +1,72 @@
+"""Module used to warm the application up before it serves traffic.
+
+Without a warmup the first requests served by each worker open their own
+database connections, configure the ORM mappers and compile their SQL,
+so they're far slower than the rest. Warming up does that work at startup
+instead.
+"""
+
+from contextlib import ExitStack
+from time import perf_counter
+from uuid import UUID
+
+import structlog
+from sqlalchemy.orm import configure_mappers
+
+from service_provider_api.api import schemas
+from service_provider_api.core.repositories.service_provider import (
+    ServiceProviderNotFound,
+    ServiceProviderRepository,
+)
+from service_provider_api.core.skill_index import skill_index
+from service_provider_api.database.database import SessionLocal, get_engine
+
+log = structlog.get_logger()
+
+# the hot statements are compiled by running them for an ID that can't exist
+_MISSING_ID = UUID(int=0)
+
+
+def _open_pool_connections(count: int) -> None:
+    # check out several connections at once, so the pool has to open them all
+    with ExitStack() as stack:
+        for _ in range(count):
+            stack.enter_context(get_engine().connect())
+
+
+def _compile_hot_statements() -> None:
+    db = SessionLocal()
+    try:
+        try:
+            ServiceProviderRepository.get(_MISSING_ID, db)
+        except ServiceProviderNotFound:
+            pass
+        ServiceProviderRepository.get_many([_MISSING_ID], db)
+        for service_provider in ServiceProviderRepository.list(
+            db, schemas.ServiceProviderListFilterParams(), 1, 10
+        ):
+            schemas.ServiceProviderSchema(**service_provider.as_dict()).json()
+    finally:
+        db.close()
+
+
+def warm_up(pool_connections: int) -> None:
+    """Warm the application up.
+
+    Opens the pool's connections, configures the ORM mappers, runs the
+    hot statements once so that their compiled SQL is cached, and loads the
+    skill index.
+
+    Args:
+        pool_connections (int): The number of database connections to open.
+
+    Returns:
+        None
+    """
+
+    start = perf_counter()
+    configure_mappers()
+    _open_pool_connections(pool_connections)
+    _compile_hot_statements()
+    skill_index.ensure_loaded()
+    log.info("warmed up", duration_ms=round((perf_counter() - start) * 1000, 2))
@@ -1,17 +1,193 @@
-"""Module to hold all of the database setup logic."""
+"""Module to hold all of the database setup logic.
+
+The engine is created lazily, the first time it's needed, so importing the
+application doesn't configure a connection pool or touch the database.
+Worker processes, tests and CLIs that never query the database don't pay
+for it.
+"""
+
+import functools
+import threading
+from typing import Callable, Optional
 
 import psycopg2.extras
-from sqlalchemy import create_engine
+import structlog
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
+from service_provider_api.core import query_guard
 from service_provider_api.core.config import settings
+from service_provider_api.core.instrumentation import (
+    InstrumentedQueuePool,
+    instrument_engine,
+)
+from service_provider_api.core.slow_query import SlowQueryRecorder
 
 # need to call this
 # before working with UUID objects in PostgreSQL
 psycopg2.extras.register_uuid()
 
-# Configure some constants for the database
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+log = structlog.get_logger()
+
+_engine: Optional[Engine] = None
+_low_priority_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+# fuzzy name search, only created where pg_trgm can be installed
+TRIGRAM_INDEX = (
+    "CREATE INDEX IF NOT EXISTS ix_service_providers_name_trgm "
+    "ON service_providers USING gin (name gin_trgm_ops)"
+)
+
+
+def _create_engine(**pool_kw) -> Engine:
+    engine = create_engine(
+        settings.DATABASE_URL, poolclass=InstrumentedQueuePool, **pool_kw
+    )
+    instrument_engine(engine)
+    query_guard.attach(engine)
+    if settings.SLOW_QUERY_THRESHOLD_MS is not None:
+        SlowQueryRecorder(
+            settings.SLOW_QUERY_THRESHOLD_MS,
+            settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+            settings.SLOW_QUERY_EXPLAIN_PATH,
+        ).attach(engine)
+    return engine
+
+
+def get_engine() -> Engine:
+    """Get the database engine, creating it on first use.
+
+    Returns:
+        Engine: The database engine.
+    """
+
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = _create_engine()
+    return _engine
+
+
+def get_low_priority_engine() -> Engine:
+    """Get the engine used for expensive searches, creating it on first use.
+
+    It has its own small pool, without overflow, so expensive searches queue
+    for one of its few connections instead of taking the connections that
+    every other request needs.
+
+    Returns:
+        Engine: The low priority database engine.
+    """
+
+    global _low_priority_engine
+    if _low_priority_engine is None:
+        with _engine_lock:
+            if _low_priority_engine is None:
+                _low_priority_engine = _create_engine(
+                    pool_size=settings.SEARCH_LOW_PRIORITY_POOL_SIZE,
+                    max_overflow=0,
+                    pool_timeout=settings.SEARCH_LOW_PRIORITY_POOL_TIMEOUT_S,
+                )
+    return _low_priority_engine
+
+
+def dispose_engine(close: bool = True) -> None:
+    """Discard the engines' pooled connections, if they have been created.
+
+    Args:
+        close (bool, optional): Close the connections. A process that was
+            forked must pass False, so that it doesn't close connections
+            that still belong to its parent.
+
+    Returns:
+        None
+    """
+
+    for engine in (_engine, _low_priority_engine):
+        if engine is not None:
+            engine.dispose(close=close)
+
+
+def create_schema() -> None:
+    """Create any of the application's tables & indexes that don't exist.
+
+    Returns:
+        None
+    """
+
+    # the models register themselves on `Base` when they're imported
+    from service_provider_api.database import models  # noqa: F401
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+
+    with engine.connect() as connection:
+        available = connection.execute(
+            text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        ).scalar()
+    if available:
+        try:
+            with engine.begin() as connection:
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                connection.execute(text(TRIGRAM_INDEX))
+        except exc.DBAPIError as e:
+            log.warning("Failed to create the trigram index", error=e)
+    has_extension.cache_clear()
+
+
+@functools.lru_cache
+def has_extension(name: str) -> bool:
+    """Check whether a Postgres extension is installed in the database.
+
+    The result is cached, the extensions are only expected to change when
+    the schema is created.
+
+    Args:
+        name (str): The name of the extension, e.g. "pg_trgm".
+
+    Returns:
+        bool: True if the extension is installed.
+    """
+
+    with get_engine().connect() as connection:
+        return bool(
+            connection.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = :name"),
+                {"name": name},
+            ).scalar()
+        )
+
+
+class _LazySessionmaker(sessionmaker):
+    """A sessionmaker that binds its sessions to the engine when they're made.
+
+    Args:
+        get_bind (Callable[[], Engine], optional): Gets the engine. Defaults
+            to `get_engine`.
+    """
+
+    def __init__(self, get_bind: Callable[[], Engine] = get_engine, **kw) -> None:
+        super().__init__(**kw)
+        self._get_bind = get_bind
+
+    def __call__(self, **local_kw) -> Session:
+        local_kw.setdefault("bind", self._get_bind())
+        return super().__call__(**local_kw)
+
+
+def __getattr__(name: str):
+    # keeps `from service_provider_api.database.database import engine` working
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+SessionLocal = _LazySessionmaker(autocommit=False, autoflush=False)
+LowPrioritySessionLocal = _LazySessionmaker(
+    get_low_priority_engine, autocommit=False, autoflush=False
+)
 Base = declarative_base()
@@ -5,8 +5,20 @@ These models also act as the data models for the application.
 
 from uuid import uuid4
 
-from sqlalchemy import Column, Float, ForeignKey, Integer, String
-from sqlalchemy.dialects.postgresql import DATERANGE, UUID
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    case,
+    func,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, DATERANGE, UUID
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
 from service_provider_api.database.database import Base
@@ -26,6 +38,10 @@ class ServiceProvider(Base):
         skills (List[ServiceProviderSkill]): The skills of the service provider.
         availability (List[ServiceProviderAvailability]): The availability of the
             service provider.
+        review_count (int): The number of reviews of the service provider.
+        review_rating_sum (float): The sum of the ratings of those reviews.
+        review_rating_shards (int): The number of counter shards new reviews
+            are spread across. See `ReviewRatingShard`.
         review_rating (List[ServiceProviderReviewRating]): The review ratings of the
             service provider.
     """
@@ -36,6 +52,18 @@ class ServiceProvider(Base):
     user_id = Column("user_id", UUID(as_uuid=True), nullable=False)
     name = Column("name", String)
     cost_in_pence = Column("cost_in_pence", Integer)
+    # maintained as reviews are added, so the average rating can be read and
+    # filtered on without aggregating every review
+    review_count = Column(
+        "review_count", Integer, nullable=False, default=0, server_default="0"
+    )
+    review_rating_sum = Column(
+        "review_rating_sum", Float, nullable=False, default=0.0, server_default="0"
+    )
+    # providers with more than one shard count new reviews in their shards
+    review_rating_shards = Column(
+        "review_rating_shards", Integer, nullable=False, default=1, server_default="1"
+    )
 
     skills = relationship(
         "Skills", backref="service_provider", cascade="all, delete-orphan"
@@ -43,32 +71,50 @@ class ServiceProvider(Base):
     availability = relationship(
         "Availability", backref="service_provider", cascade="all, delete-orphan"
     )
-    review_rating = relationship("Reviews", backref="service_provider")
+    # reviews outlive a PUT, which deletes & re-inserts the service provider, so
+    # don't let the ORM null out their foreign keys when the provider is deleted
+    review_rating = relationship(
+        "Reviews", backref="service_provider", passive_deletes="all"
+    )
+    # only loaded for providers with more than one shard
+    rating_shards = relationship("ReviewRatingShard", viewonly=True)
 
-    def _calculate_review_rating(self) -> float:
-        """Calculate the average review rating for the service provider.
+    @hybrid_property
+    def average_review_rating(self) -> float:
+        """The average review rating for the service provider.
 
-        Args:
-            None
+        Includes the reviews counted in the provider's shards, which haven't
+        been compacted into the provider yet. In queries only the compacted
+        aggregates are used, so the average a sharded provider is filtered
+        & sorted by can lag behind by up to the compaction interval.
 
         Returns:
-            float: The average review rating for the service provider.
+            float: The average rating, or 0 if there are no reviews.
         """
 
-        if len(self.review_rating):
-            return sum(r.rating for r in self.review_rating) / len(self.review_rating)
+        review_count, review_rating_sum = self.review_count, self.review_rating_sum
+        if self.review_rating_shards > 1:
+            for shard in self.rating_shards:
+                review_count += shard.review_count
+                review_rating_sum += shard.review_rating_sum
+
+        if review_count:
+            return review_rating_sum / review_count
         return 0.0
 
+    @average_review_rating.expression
+    def average_review_rating(cls):
+        return case(
+            (cls.review_count > 0, cls.review_rating_sum / cls.review_count),
+            else_=0.0,
+        )
+
     def as_dict(self) -> dict:
         """Return the service provider as a dictionary.
 
         This representation is used for logging, and for passing
         the model into the API response. It transforms the SQLAlchemy
-        model into a dictionary and does some calculations to get
-        the average review rating.
-
-        Args:
-            None
+        model into a dictionary.
 
         Returns:
             dict: The service provider as a dictionary.
@@ -83,7 +129,7 @@ class ServiceProvider(Base):
             "availability": [
                 availability.as_dict() for availability in self.availability
             ],
-            "review_rating": self._calculate_review_rating(),
+            "review_rating": self.average_review_rating,
         }
 
 
@@ -102,11 +148,107 @@ class Reviews(Base):
     id = Column("id", UUID(as_uuid=True), primary_key=True, default=uuid4)
     user_id = Column("user_id", UUID(as_uuid=True), nullable=False)
     service_provider_id = Column(
-        "service_provider_id", UUID(as_uuid=True), ForeignKey("service_providers.id")
+        "service_provider_id",
+        UUID(as_uuid=True),
+        ForeignKey("service_providers.id"),
+        index=True,
     )
     rating = Column("rating", Float)
 
 
+class ReviewRatingShard(Base):
+    """Model to hold one shard of a service provider's rating aggregates.
+
+    Every review of a service provider updates its aggregates, so reviews of
+    a popular provider would all queue on the lock of its row. Providers with
+    more than one shard instead add each review to a random one of their
+    shards, and the shards are periodically compacted into the provider.
+
+    Attributes:
+        service_provider_id (UUID): The ID of the service provider.
+        shard (int): The number of the shard.
+        review_count (int): The number of reviews counted in the shard.
+        review_rating_sum (float): The sum of the ratings of those reviews.
+    """
+
+    __tablename__ = "review_rating_shards"
+
+    service_provider_id = Column(
+        "service_provider_id",
+        UUID(as_uuid=True),
+        ForeignKey("service_providers.id"),
+        primary_key=True,
+    )
+    shard = Column("shard", Integer, primary_key=True)
+    review_count = Column("review_count", Integer, nullable=False, default=0)
+    review_rating_sum = Column("review_rating_sum", Float, nullable=False, default=0.0)
+
+
+class ServiceProviderSearch(Base):
+    """Model to hold the denormalized search row of a service provider.
+
+    Searching the normalized tables joins the skills & availability of every
+    candidate provider and groups them back together. This table holds the
+    same data pre-joined, one row per provider, so a search only has to
+    filter & sort one table. It's derived from the other tables, and is kept
+    up to date from `ServiceProviderSearchQueue` by a background refresher,
+    so it can lag behind them.
+
+    Attributes:
+        service_provider_id (UUID): The ID of the service provider.
+        cost_in_pence (int): The cost of the service provider in pence.
+        review_rating (float): The average review rating of the service provider.
+        review_count (int): The number of reviews of the service provider.
+        skills (list[str]): The skills of the service provider.
+        availability (list[DateRange]): The availability of the service provider.
+    """
+
+    __tablename__ = "service_provider_search"
+
+    # no foreign key, the row outlives its provider until it's refreshed
+    service_provider_id = Column(
+        "service_provider_id", UUID(as_uuid=True), primary_key=True
+    )
+    cost_in_pence = Column("cost_in_pence", Integer)
+    review_rating = Column("review_rating", Float, nullable=False)
+    review_count = Column("review_count", Integer, nullable=False)
+    skills = Column("skills", ARRAY(Text), nullable=False)
+    availability = Column("availability", ARRAY(DATERANGE), nullable=False)
+
+    __table_args__ = (
+        Index("ix_service_provider_search_skills", skills, postgresql_using="gin"),
+        # the order searches are returned in, so a page can be read in order
+        Index(
+            "ix_service_provider_search_ordering",
+            cost_in_pence.desc(),
+            review_rating.desc(),
+        ),
+    )
+
+
+class ServiceProviderSearchQueue(Base):
+    """Model to hold the service providers whose search rows are out of date.
+
+    Attributes:
+        service_provider_id (UUID): The ID of the service provider.
+        queued_at (datetime): When the oldest change not yet in the service
+            provider's search row was made.
+    """
+
+    __tablename__ = "service_provider_search_queue"
+
+    service_provider_id = Column(
+        "service_provider_id", UUID(as_uuid=True), primary_key=True
+    )
+    queued_at = Column(
+        "queued_at",
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        index=True,
+    )
+
+
 class Skills(Base):
     """Model to hold a skill for a service provider.
 
@@ -120,7 +262,10 @@ class Skills(Base):
 
     id = Column("id", UUID(as_uuid=True), primary_key=True, default=uuid4)
     service_provider_id = Column(
-        "service_provider_id", UUID(as_uuid=True), ForeignKey("service_providers.id")
+        "service_provider_id",
+        UUID(as_uuid=True),
+        ForeignKey("service_providers.id"),
+        index=True,
     )
     skill = Column("skill", String)
 
@@ -138,7 +283,10 @@ class Availability(Base):
 
     id = Column("id", UUID(as_uuid=True), primary_key=True, default=uuid4)
     service_provider_id = Column(
-        "service_provider_id", UUID(as_uuid=True), ForeignKey("service_providers.id")
+        "service_provider_id",
+        UUID(as_uuid=True),
+        ForeignKey("service_providers.id"),
+        index=True,
     )
     availability = Column("availability", DATERANGE)
 
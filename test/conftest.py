@@ -12,9 +12,12 @@ from service_provider_api.core.repositories.service_provider import (
 from service_provider_api.core.repositories.service_provider_review import (
     ServiceProviderReviewRepository,
 )
+from service_provider_api.core import provider_misses
+from service_provider_api.core.skill_index import skill_index
 from service_provider_api.database.database import Base, engine, SessionLocal
 from service_provider_api.api import schemas
 from service_provider_api.api.app import app
+from service_provider_api.core.config import settings
 
 
 @pytest.fixture
@@ -43,8 +46,29 @@ def clean_database(db_connection: Session):
         None
     """
 
-    db_connection.execute("TRUNCATE TABLE service_providers CASCADE")
+    # the search tables are derived, so they've no foreign keys to cascade along
+    db_connection.execute(
+        "TRUNCATE TABLE service_providers, service_provider_search, "
+        "service_provider_search_queue CASCADE"
+    )
     db_connection.commit()
+    # the skills & providers were removed behind the in-memory caches' backs
+    skill_index.reload()
+    provider_misses.misses.clear()
+
+
+@pytest.fixture
+def read_your_writes(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Only search the search table while it's up to date.
+
+    The tests search for what they've just written, which a table allowed
+    to lag behind by default may not have yet.
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): Used to set the staleness bound.
+    """
+
+    monkeypatch.setattr(settings, "SEARCH_TABLE_MAX_STALENESS_S", 0.0)
 
 
 @pytest.fixture
@@ -0,0 +1,138 @@
+"""Module to hold the tests for admission control & load shedding."""
+
+from http import HTTPStatus
+
+import pytest
+from fastapi.testclient import TestClient
+
+from service_provider_api.api import app as app_module
+from service_provider_api.api.middleware import _route_class
+from service_provider_api.core import admission
+from service_provider_api.database import models
+
+
+@pytest.fixture
+def controller() -> admission.AdmissionController:
+    """An admission controller with a 100ms target & a limit of 4 for every class.
+
+    Returns:
+        AdmissionController: The controller.
+    """
+
+    return admission.AdmissionController(
+        {route_class: 0.1 for route_class in admission.ROUTE_CLASSES},
+        {route_class: 4 for route_class in admission.ROUTE_CLASSES},
+        pool_wait_target=0.01,
+    )
+
+
+@pytest.mark.parametrize(
+    "method, path, route_class",
+    [
+        ("GET", "/v1_0/service-provider/1d6d0fc4", admission.READ),
+        ("GET", "/v1_0/skills/suggest", admission.READ),
+        ("POST", "/v1_0/service-providers/batch-get", admission.READ),
+        ("POST", "/v1_0/service-provider", admission.WRITE),
+        ("POST", "/v1_0/service-provider/1d6d0fc4/review", admission.WRITE),
+        ("DELETE", "/v1_0/service-provider/1d6d0fc4", admission.WRITE),
+        ("POST", "/v1_0/service-providers/", admission.SEARCH),
+        ("POST", "/v1_0/service-providers/recommend", admission.RECOMMEND),
+        ("GET", "/v1_0/health", None),
+        ("GET", "/metrics", None),
+    ],
+)
+def test_routes_are_classed(method: str, path: str, route_class: str) -> None:
+    """Test that requests are classed by their route.
+
+    Args:
+        method (str): The method of the request.
+        path (str): The path of the request.
+        route_class (str): The expected route class, None if it's never shed.
+    """
+
+    if _route_class(method, path) != route_class:
+        pytest.fail(f"{method} {path} wasn't classed as {route_class}")
+
+
+def test_limits_adapt_to_latency(controller: admission.AdmissionController) -> None:
+    """Test that limits grow while requests are fast & are cut when they're slow.
+
+    Args:
+        controller (AdmissionController): The admission controller.
+    """
+
+    limit = controller.limits[admission.SEARCH]
+    admitted = [controller.try_acquire(admission.SEARCH) for _ in range(5)]
+    if admitted != [True, True, True, True, False]:
+        pytest.fail("Requests over the limit were admitted")
+
+    controller.release(admission.SEARCH, latency=0.5, pool_wait=0.0)
+    controller.release(admission.SEARCH, latency=0.5, pool_wait=0.0)
+    if limit.limit != int(4 * admission.BACKOFF):
+        pytest.fail("The limit wasn't cut exactly once by a burst of slow requests")
+
+    # a limit's worth of fast requests, while the limit is being used
+    for _ in range(int(4 * admission.BACKOFF)):
+        controller.try_acquire(admission.SEARCH)
+        controller.release(admission.SEARCH, latency=0.01, pool_wait=0.0)
+    if limit.limit != 4:
+        pytest.fail("The limit didn't grow back while requests were fast")
+
+    controller.try_acquire(admission.SEARCH)
+    controller.release(admission.SEARCH, latency=0.01, pool_wait=0.0)
+    if limit.limit != 4:
+        pytest.fail("The limit grew past its max")
+
+
+def test_pool_congestion_sheds_the_lowest_priority_first(
+    controller: admission.AdmissionController,
+) -> None:
+    """Test that waiting for a connection cuts the lowest priority class in flight.
+
+    Args:
+        controller (AdmissionController): The admission controller.
+    """
+
+    controller.try_acquire(admission.RECOMMEND)
+    controller.try_acquire(admission.READ)
+    controller.release(admission.READ, latency=0.01, pool_wait=0.05)
+
+    if controller.limits[admission.RECOMMEND].limit >= 4:
+        pytest.fail("The recommendations weren't shed for the congestion")
+    if controller.limits[admission.READ].limit != 4:
+        pytest.fail("The fast read's limit changed while the pool was congested")
+
+
+def test_requests_over_the_limit_are_rejected(
+    test_client: TestClient,
+    create_service_provider_in_db: models.ServiceProvider,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that requests over their class's limit get a 503, and others don't.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        create_service_provider_in_db (ServiceProvider): The service provider
+            to get.
+        monkeypatch (pytest.MonkeyPatch): Used to fill the reads' limit.
+    """
+
+    reads = app_module.admission_controller.limits[admission.READ]
+    monkeypatch.setattr(reads, "in_flight", reads.limit)
+
+    response = test_client.get(
+        f"/v1_0/service-provider/{create_service_provider_in_db.id}"
+    )
+    if response.status_code != HTTPStatus.SERVICE_UNAVAILABLE:
+        pytest.fail("A read over the limit wasn't rejected")
+    if response.headers.get("Retry-After") != "1":
+        pytest.fail("The rejection didn't say when to retry")
+
+    if test_client.post("/v1_0/service-providers", json={}).status_code != 200:
+        pytest.fail("A search was rejected for the reads' limit")
+    if test_client.get("/v1_0/health").status_code != HTTPStatus.OK:
+        pytest.fail("The health check was shed")
+    if 'admission_rejected_total{route_class="read"}' not in (
+        test_client.get("/metrics").text
+    ):
+        pytest.fail("The rejection wasn't counted")
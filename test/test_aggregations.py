@@ -8,6 +8,10 @@ import pytest
 from fastapi.testclient import TestClient
 
 from service_provider_api.database import models
+from service_provider_api.database.database import has_extension
+
+# the searches are for the providers the fixtures have just written
+pytestmark = pytest.mark.usefixtures("read_your_writes")
 
 
 @pytest.mark.parametrize(
@@ -354,3 +358,194 @@ def test_pagintation(
         pytest.fail(
             "Did not get the expected number of service providers for the second page."
         )
+
+
+@pytest.mark.parametrize(
+    "name_query,expected_providers",
+    [
+        ("john", ["John Smith"]),
+        ("SMI", ["John Smith"]),
+        ("een", ["Dean Greene"]),
+        ("n", ["Dean Greene", "John Smith"]),
+        ("%", []),
+    ],
+)
+def test_list_service_providers_name_query(
+    test_client: TestClient,
+    create_multiple_service_providers_in_db: models.ServiceProvider,
+    name_query: str,
+    expected_providers: list[str],
+):
+    """Test that the API searches service providers by part of their name.
+
+    Args:
+        test_client (TestClient): The test client fixture.
+        create_multiple_service_providers_in_db (models.ServiceProvider): The service
+            provider fixture.
+        name_query (str): The partial name to search for.
+        expected_providers (list[str]): The expected provider names, in order.
+    """
+
+    response = test_client.post(
+        "/v1_0/service-providers", json={"name_query": name_query}
+    )
+
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail("API returned a status code other than 200")
+
+    names = [
+        service_provider["name"]
+        for service_provider in response.json()["service_providers"]
+    ]
+    if names != expected_providers:
+        pytest.fail(f"Expected {expected_providers} but got {names}")
+
+
+def test_list_service_providers_name_query_tolerates_typos(
+    test_client: TestClient,
+    create_multiple_service_providers_in_db: models.ServiceProvider,
+):
+    """Test that a misspelt name query still finds the service provider.
+
+    Args:
+        test_client (TestClient): The test client fixture.
+        create_multiple_service_providers_in_db (models.ServiceProvider): The service
+            provider fixture.
+    """
+
+    if not has_extension("pg_trgm"):
+        pytest.skip("pg_trgm isn't installed in the test database")
+
+    response = test_client.post(
+        "/v1_0/service-providers", json={"name_query": "Greane"}
+    )
+
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail("API returned a status code other than 200")
+
+    names = [
+        service_provider["name"]
+        for service_provider in response.json()["service_providers"]
+    ]
+    if names[:1] != ["Dean Greene"]:
+        pytest.fail("A misspelt name didn't match the service provider")
+
+
+def test_list_service_providers_facets(
+    test_client: TestClient,
+    create_multiple_service_provider_reviews_in_db: list[models.Reviews],
+):
+    """Test that the facets count every matching provider, not just the page.
+
+    Args:
+        test_client (TestClient): The test client fixture.
+        create_multiple_service_provider_reviews_in_db (list[models.Reviews]): The
+            reviews of the service providers, rated 5 & 2.
+    """
+
+    response = test_client.post(
+        "/v1_0/service-providers",
+        params={"facets": True, "page_size": 1},
+        json={"skills": ["plumbing", "SEO"]},
+    )
+
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail("API returned a status code other than 200")
+
+    json_response = response.json()
+    if len(json_response["service_providers"]) != 1:
+        pytest.fail("The facets changed the page of service providers")
+
+    facets = json_response["facets"]
+    skills = {facet["skill"]: facet["count"] for facet in facets["skills"]}
+    if skills != {"plumbing": 1, "electrical": 1, "IT Services": 1, "SEO": 1}:
+        pytest.fail("Every skill of the matching providers wasn't counted")
+    if facets["cost_in_pence"] != [{"gte": 0, "lt": 5000, "count": 2}]:
+        pytest.fail("The matching providers weren't counted by cost")
+    if facets["review_rating"] != [
+        {"gte": 2, "lt": 3, "count": 1},
+        {"gte": 5, "lt": None, "count": 1},
+    ]:
+        pytest.fail("The matching providers weren't counted by rating")
+
+
+def test_list_service_providers_without_facets(
+    test_client: TestClient,
+    create_multiple_service_providers_in_db: models.ServiceProvider,
+):
+    """Test that facets are only computed when they're asked for.
+
+    Args:
+        test_client (TestClient): The test client fixture.
+        create_multiple_service_providers_in_db (models.ServiceProvider): The service
+            provider fixture.
+    """
+
+    response = test_client.post("/v1_0/service-providers", json={})
+
+    if "facets" in response.json():
+        pytest.fail("Facets were returned without being asked for")
+
+
+@pytest.mark.parametrize("page,expected_length", [(1, 1), (2, 1), (3, 0)])
+def test_list_service_providers_exact_total(
+    test_client: TestClient,
+    create_multiple_service_providers_in_db: models.ServiceProvider,
+    page: int,
+    expected_length: int,
+):
+    """Test that the exact total counts every matching provider, on any page.
+
+    Args:
+        test_client (TestClient): The test client fixture.
+        create_multiple_service_providers_in_db (models.ServiceProvider): The service
+            provider fixture.
+        page (int): The page to get.
+        expected_length (int): The number of service providers on the page.
+    """
+
+    response = test_client.post(
+        "/v1_0/service-providers",
+        params={"count_mode": "exact", "page": page, "page_size": 1},
+        json={},
+    )
+
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail("API returned a status code other than 200")
+
+    json_response = response.json()
+    if len(json_response["service_providers"]) != expected_length:
+        pytest.fail("The total changed the page of service providers")
+    if json_response["total"] != 2:
+        pytest.fail("The total didn't count every matching service provider")
+
+
+@pytest.mark.parametrize("count_mode", ["estimated", "none"])
+def test_list_service_providers_inexact_total(
+    test_client: TestClient,
+    create_multiple_service_providers_in_db: models.ServiceProvider,
+    count_mode: str,
+):
+    """Test that a total is only estimated when asked, and isn't counted otherwise.
+
+    Args:
+        test_client (TestClient): The test client fixture.
+        create_multiple_service_providers_in_db (models.ServiceProvider): The service
+            provider fixture.
+        count_mode (str): How to count the total.
+    """
+
+    response = test_client.post(
+        "/v1_0/service-providers",
+        params={"count_mode": count_mode},
+        json={"skills": ["plumbing"], "name_query": "smith"},
+    )
+
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail("API returned a status code other than 200")
+
+    total = response.json()["total"]
+    if count_mode == "none" and total is not None:
+        pytest.fail("A total was counted without being asked for")
+    if count_mode == "estimated" and (not isinstance(total, int) or total < 0):
+        pytest.fail("The planner's estimate wasn't returned as the total")
@@ -0,0 +1,124 @@
+"""Module to hold all of the unit tests for the batch get endpoint."""
+
+from http import HTTPStatus
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from service_provider_api.database import models
+from service_provider_api.database.database import engine
+
+
+def test_batch_get_returns_service_providers_keyed_by_id(
+    test_client: TestClient,
+    create_multiple_service_provider_reviews_in_db: list[models.Reviews],
+) -> None:
+    """Test that the API returns every requested service provider keyed by its ID.
+
+    Args:
+        test_client (TestClient): The FastAPI test client.
+        create_multiple_service_provider_reviews_in_db (list[models.Reviews]): The
+            reviews, and the service providers they belong to, in the database.
+    """
+
+    expected_ratings = {
+        str(review.service_provider_id): review.rating
+        for review in create_multiple_service_provider_reviews_in_db
+    }
+
+    response = test_client.post(
+        "/v1_0/service-providers/batch-get", json={"ids": list(expected_ratings)}
+    )
+
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail("API returned a status code other than 200")
+
+    service_providers = response.json()["service_providers"]
+    if set(service_providers) != set(expected_ratings):
+        pytest.fail("Did not get back the requested service providers")
+
+    for service_provider_id, service_provider in service_providers.items():
+        if service_provider["review_rating"] != expected_ratings[service_provider_id]:
+            pytest.fail("Review rating is not correct")
+        if not service_provider["skills"] or not service_provider["availability"]:
+            pytest.fail("Service provider children were not returned")
+
+
+def test_batch_get_returns_null_for_unknown_ids(
+    test_client: TestClient,
+    create_service_provider_in_db: models.ServiceProvider,
+) -> None:
+    """Test that IDs which can't be found are returned as explicit null entries.
+
+    Args:
+        test_client (TestClient): The FastAPI test client.
+        create_service_provider_in_db (models.ServiceProvider): The service provider
+            in the database.
+    """
+
+    unknown_id = str(uuid4())
+    response = test_client.post(
+        "/v1_0/service-providers/batch-get",
+        json={"ids": [str(create_service_provider_in_db.id), unknown_id]},
+    )
+
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail("API returned a status code other than 200")
+
+    service_providers = response.json()["service_providers"]
+    if service_providers[unknown_id] is not None:
+        pytest.fail("Unknown service provider was not returned as null")
+    if service_providers[str(create_service_provider_in_db.id)]["name"] != "John Smith":
+        pytest.fail("Did not get back the expected service provider")
+
+
+def test_batch_get_uses_a_constant_number_of_queries(
+    test_client: TestClient,
+    create_multiple_service_provider_reviews_in_db: list[models.Reviews],
+) -> None:
+    """Test that the number of queries doesn't grow with the number of IDs.
+
+    Args:
+        test_client (TestClient): The FastAPI test client.
+        create_multiple_service_provider_reviews_in_db (list[models.Reviews]): The
+            reviews, and the service providers they belong to, in the database.
+    """
+
+    statements = []
+
+    def count_statement(*args) -> None:
+        statements.append(args)
+
+    def count_queries(ids: list[str]) -> int:
+        statements.clear()
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            test_client.post("/v1_0/service-providers/batch-get", json={"ids": ids})
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+        return len(statements)
+
+    ids = [
+        str(review.service_provider_id)
+        for review in create_multiple_service_provider_reviews_in_db
+    ]
+    if count_queries(ids[:1]) != count_queries(ids):
+        pytest.fail("The number of queries grew with the number of IDs")
+
+
+def test_batch_get_rejects_too_many_ids(test_client: TestClient) -> None:
+    """Test that the API rejects requests for more IDs than it allows.
+
+    Args:
+        test_client (TestClient): The FastAPI test client.
+    """
+
+    response = test_client.post(
+        "/v1_0/service-providers/batch-get",
+        json={"ids": [str(uuid4()) for _ in range(501)]},
+    )
+
+    if response.status_code != HTTPStatus.UNPROCESSABLE_ENTITY:
+        pytest.fail("API returned a status code other than 422")
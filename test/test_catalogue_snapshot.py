@@ -0,0 +1,171 @@
+"""Module to hold the tests for the catalogue snapshot."""
+
+import os
+from pathlib import Path
+from uuid import UUID
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from service_provider_api.api import schemas
+from service_provider_api.core.catalogue_snapshot import (
+    CatalogueSnapshot,
+    InvalidSnapshot,
+    fresh_snapshot,
+    write_snapshot,
+)
+from service_provider_api.core.config import settings
+from service_provider_api.core.skill_index import (
+    SkillIndex,
+    count_skills,
+    snapshot_skill_counts,
+)
+from service_provider_api.database import models
+
+
+def test_snapshot_counts_the_skills(
+    create_multiple_service_provider_reviews_in_db: list[models.Reviews],
+    db_connection: Session,
+    tmp_path: Path,
+) -> None:
+    """Test that a snapshot counts the providers with each skill.
+
+    Args:
+        create_multiple_service_provider_reviews_in_db (list[models.Reviews]): The
+            reviews of the service providers, rated 5 & 2.
+        db_connection (Session): The database connection.
+        tmp_path (Path): A directory to write the snapshot to.
+    """
+
+    path = str(tmp_path / "catalogue.bin")
+    if write_snapshot(path, db_connection) != 2:
+        pytest.fail("The snapshot didn't count every provider")
+
+    snapshot = CatalogueSnapshot(path)
+    if len(snapshot) != 2:
+        pytest.fail("The snapshot didn't count every provider")
+    if snapshot.skill_counts() != {
+        "electrical": 1,
+        "IT Services": 1,
+        "plumbing": 1,
+        "SEO": 1,
+    }:
+        pytest.fail("The snapshot didn't count the providers with each skill")
+
+
+def test_new_generations_replace_the_snapshot(
+    test_client: TestClient,
+    create_service_provider_in_db: models.ServiceProvider,
+    service_provider: schemas.NewServiceProviderInSchema,
+    db_connection: Session,
+    user_id: UUID,
+    tmp_path: Path,
+) -> None:
+    """Test that a new generation replaces the snapshot without disturbing readers.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        create_service_provider_in_db (ServiceProvider): A service provider
+            in the first generation.
+        service_provider (schemas.NewServiceProviderInSchema): A service
+            provider created after the first generation is written.
+        db_connection (Session): The database connection.
+        user_id (UUID): The user id to use to make the request.
+        tmp_path (Path): A directory to write the snapshot to.
+    """
+
+    path = str(tmp_path / "catalogue.bin")
+    write_snapshot(path, db_connection)
+    first = CatalogueSnapshot(path)
+
+    service_provider.skills = ["roofing"]
+    test_client.post(
+        "/v1_0/service-provider",
+        json=jsonable_encoder(service_provider),
+        headers={"user-id": str(user_id)},
+    )
+    write_snapshot(path, db_connection)
+
+    second = CatalogueSnapshot(path)
+    if second.generation != first.generation + 1:
+        pytest.fail("The new snapshot wasn't the next generation")
+    if second.skill_counts().get("roofing") != 1:
+        pytest.fail("The new generation didn't count the new provider's skills")
+    # the first generation is still mapped, although its file was replaced
+    if len(first) != 1 or "roofing" in first.skill_counts():
+        pytest.fail("The old generation changed under its reader")
+    if [name for name in os.listdir(tmp_path)] != ["catalogue.bin"]:
+        pytest.fail("A temporary file was left behind")
+
+
+def test_skill_index_loads_from_a_fresh_snapshot(
+    create_service_provider_in_db: models.ServiceProvider,
+    db_connection: Session,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that only the first load of the skill index is from a fresh snapshot.
+
+    Args:
+        create_service_provider_in_db (ServiceProvider): A service provider
+            in the snapshot.
+        db_connection (Session): The database connection.
+        tmp_path (Path): A directory to write the snapshot to.
+        monkeypatch (pytest.MonkeyPatch): Used to configure the snapshot.
+    """
+
+    path = str(tmp_path / "catalogue.bin")
+    write_snapshot(path, db_connection)
+    monkeypatch.setattr(settings, "CATALOGUE_SNAPSHOT_PATH", path)
+
+    # a skill added behind the snapshot's back
+    db_connection.add(
+        models.Skills(
+            service_provider_id=create_service_provider_in_db.id, skill="roofing"
+        )
+    )
+    db_connection.commit()
+
+    index = SkillIndex(count_skills, snapshot_skill_counts)
+    index.ensure_loaded()
+    if index.suggest("roof", 10):
+        pytest.fail("The skill index wasn't loaded from the snapshot")
+    if index.suggest("plumb", 10) != [("plumbing", 1)]:
+        pytest.fail("The skill index didn't hold the snapshot's skills")
+
+    # later loads replace an index kept current, so don't go back in time
+    index.reload()
+    if index.suggest("roof", 10) != [("roofing", 1)]:
+        pytest.fail("The skill index was loaded from the snapshot again")
+
+    monkeypatch.setattr(settings, "CATALOGUE_SNAPSHOT_MAX_AGE_S", -1)
+    index = SkillIndex(count_skills, snapshot_skill_counts)
+    index.ensure_loaded()
+    if index.suggest("roof", 10) != [("roofing", 1)]:
+        pytest.fail("The skill index was loaded from a stale snapshot")
+
+
+@pytest.mark.parametrize(
+    "contents", [b"", b"not a snapshot", b"SPCATLG\x00" + bytes(200)]
+)
+def test_invalid_snapshots_are_rejected(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, contents: bytes
+) -> None:
+    """Test that files that aren't snapshots aren't read as one.
+
+    Args:
+        tmp_path (Path): A directory to write the file to.
+        monkeypatch (pytest.MonkeyPatch): Used to configure the snapshot.
+        contents (bytes): The contents of the file.
+    """
+
+    path = tmp_path / "catalogue.bin"
+    path.write_bytes(contents)
+    monkeypatch.setattr(settings, "CATALOGUE_SNAPSHOT_PATH", str(path))
+
+    with pytest.raises(InvalidSnapshot):
+        CatalogueSnapshot(str(path))
+    if fresh_snapshot() is not None:
+        pytest.fail("An invalid snapshot was opened")
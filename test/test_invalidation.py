@@ -0,0 +1,198 @@
+"""Module to hold the tests for the cross-worker cache invalidation bus."""
+
+import queue
+import time
+from http import HTTPStatus
+from uuid import UUID, uuid4
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from service_provider_api.api import schemas
+from service_provider_api.core import invalidation
+from service_provider_api.core.skill_index import skill_index
+from service_provider_api.database import models
+
+
+@pytest.fixture
+def listener() -> invalidation.InvalidationListener:
+    """Listen for changes as if this process were another worker.
+
+    Yields:
+        InvalidationListener: The running listener.
+    """
+
+    listener = invalidation.InvalidationListener(ignore_origin="another-worker")
+    listener.start()
+    if not listener.wait_until_listening(5):
+        pytest.fail("The listener didn't start listening")
+    yield listener
+    listener.stop()
+
+
+@pytest.fixture
+def events(listener: invalidation.InvalidationListener) -> queue.Queue:
+    """Collect the changes the listener receives.
+
+    Args:
+        listener (InvalidationListener): The running listener.
+
+    Yields:
+        queue.Queue: The change events received, and "resync" when the
+            subscribers are asked to resync.
+    """
+
+    received = queue.Queue()
+    invalidation.subscribe(received.put, lambda: received.put("resync"))
+    yield received
+    invalidation.unsubscribe(received.put)
+
+
+def test_changes_are_published_to_other_workers(
+    test_client: TestClient,
+    events: queue.Queue,
+    service_provider: schemas.NewServiceProviderInSchema,
+    user_id: UUID,
+) -> None:
+    """Test that creating a provider publishes a change, and reviewing it doesn't.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        events (queue.Queue): The change events received.
+        service_provider (schemas.NewServiceProviderInSchema): The service
+            provider to create.
+        user_id (UUID): The user id to use to make the request.
+    """
+
+    response = test_client.post(
+        "/v1_0/service-provider",
+        json=jsonable_encoder(service_provider),
+        headers={"user-id": str(user_id)},
+    )
+    service_provider_id = UUID(response.json()["id"])
+
+    event = events.get(timeout=5)
+    if event.kind != invalidation.SERVICE_PROVIDER_CHANGED:
+        pytest.fail("Creating a provider didn't publish a change")
+    if event.service_provider_ids != [service_provider_id]:
+        pytest.fail("The change wasn't about the created provider")
+    if event.data["added_skills"] != service_provider.skills:
+        pytest.fail("The change didn't include the provider's skills")
+
+    test_client.post(
+        f"/v1_0/service-provider/{service_provider_id}/review",
+        json={"rating": 4},
+        headers={"user-id": str(user_id)},
+    )
+
+    # no cache depends on the reviews, so they aren't worth a notification
+    try:
+        event = events.get(timeout=1)
+        pytest.fail(f"Reviewing a provider published a {event.kind} change")
+    except queue.Empty:
+        pass
+
+
+def test_rolled_back_changes_are_not_published(
+    events: queue.Queue,
+    db_connection: Session,
+) -> None:
+    """Test that a change is only published if its transaction commits.
+
+    Args:
+        events (queue.Queue): The change events received.
+        db_connection (Session): The database connection.
+    """
+
+    invalidation.publish(
+        db_connection, invalidation.SERVICE_PROVIDER_CHANGED, [uuid4()]
+    )
+    db_connection.rollback()
+    service_provider_id = uuid4()
+    invalidation.publish(
+        db_connection, invalidation.SERVICE_PROVIDER_CHANGED, [service_provider_id]
+    )
+    db_connection.commit()
+
+    if events.get(timeout=5).service_provider_ids != [service_provider_id]:
+        pytest.fail("A rolled back change was published")
+
+
+def test_listener_resyncs_after_reconnecting(
+    listener: invalidation.InvalidationListener,
+    events: queue.Queue,
+    db_connection: Session,
+) -> None:
+    """Test that the subscribers resync when the listener's connection is lost.
+
+    Args:
+        listener (InvalidationListener): The running listener.
+        events (queue.Queue): The change events received.
+        db_connection (Session): The database connection.
+    """
+
+    db_connection.execute(
+        "SELECT pg_terminate_backend(:pid)", {"pid": listener.backend_pid}
+    )
+
+    if events.get(timeout=5) != "resync":
+        pytest.fail("The subscribers weren't resynced after reconnecting")
+    if not listener.wait_until_listening(5):
+        pytest.fail("The listener didn't reconnect")
+
+
+def test_listener_resyncs_once_it_starts_listening() -> None:
+    """Test that the subscribers resync when the listener first connects.
+
+    The caches may have been loaded before it was listening, and missed
+    the changes published in between.
+    """
+
+    received = queue.Queue()
+    invalidation.subscribe(received.put, lambda: received.put("resync"))
+    listener = invalidation.InvalidationListener(ignore_origin="another-worker")
+    listener.start()
+    try:
+        if not listener.wait_until_listening(5):
+            pytest.fail("The listener didn't start listening")
+        if received.get_nowait() != "resync":
+            pytest.fail("The subscribers weren't resynced before it was listening")
+    except queue.Empty:
+        pytest.fail("The subscribers weren't resynced when it started listening")
+    finally:
+        listener.stop()
+        invalidation.unsubscribe(received.put)
+
+
+def test_skill_index_follows_other_workers(
+    test_client: TestClient,
+    create_service_provider_in_db: models.ServiceProvider,
+) -> None:
+    """Test that the skill index applies the changes other workers publish.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        create_service_provider_in_db (ServiceProvider): A service provider
+            whose skills are loaded into the index.
+    """
+
+    skill_index.ensure_loaded()
+    invalidation.dispatch(
+        invalidation.ChangeEvent(
+            kind=invalidation.SERVICE_PROVIDER_CHANGED,
+            service_provider_ids=[uuid4()],
+            origin="another-worker",
+            sent_at=time.time(),
+            data={"added_skills": ["Roofing"], "removed_skills": ["plumbing"]},
+        )
+    )
+
+    response = test_client.get("/v1_0/skills/suggest", params={"prefix": "r"})
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail("API returned a status code other than 200")
+    if [s["skill"] for s in response.json()["suggestions"]] != ["Roofing"]:
+        pytest.fail("A skill another worker added wasn't suggested")
+    if skill_index.suggest("plumb", 10):
+        pytest.fail("A skill another worker removed was still suggested")
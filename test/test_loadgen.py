@@ -0,0 +1,66 @@
+"""Module to hold the unit tests for the load generator."""
+
+import asyncio
+import random
+
+import httpx
+import pytest
+
+from benchmarks.loadgen import build_request, parse_mix, run_stage
+from benchmarks.payloads import Payloads
+from service_provider_api.api.app import app
+from service_provider_api.database import models
+
+
+def test_parse_mix_rejects_unknown_operations() -> None:
+    """Test that a typo in the mix is an error, not silently ignored."""
+
+    if parse_mix("get=80, search=20") != {"get": 80.0, "search": 20.0}:
+        pytest.fail("Mix was not parsed correctly")
+
+    with pytest.raises(ValueError):
+        parse_mix("get=80,serch=20")
+
+
+def test_put_requests_are_sent_as_the_owner(
+    create_multiple_service_providers_in_db: list[models.ServiceProvider],
+) -> None:
+    """Test that updates use the owner's user ID, so they aren't rejected."""
+
+    provider = create_multiple_service_providers_in_db[0]
+    payloads = Payloads(providers=[provider], rng=random.Random(0))
+
+    request = build_request("put", payloads)
+
+    if request.headers != {"user-id": str(provider.user_id)}:
+        pytest.fail("Update was not sent as the owner of the provider")
+    if request.json["name"] != provider.name:
+        pytest.fail("Update changed the name of the provider")
+
+
+def test_run_stage_records_latencies(
+    create_multiple_service_providers_in_db: list[models.ServiceProvider],
+) -> None:
+    """Test that a stage sends the requests & records their outcome."""
+
+    payloads = Payloads(
+        providers=create_multiple_service_providers_in_db, rng=random.Random(0)
+    )
+
+    async def run():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            return await run_stage(
+                client,
+                payloads,
+                {"get": 1, "search": 1},
+                rate=100,
+                duration=0.2,
+                max_in_flight=100,
+            )
+
+    report = asyncio.run(run()).report()
+
+    if report["all"]["count"] == 0 or report["all"]["error_rate"] != 0:
+        pytest.fail(f"Stage did not complete cleanly: {report['all']}")
+    if sum(report["all"]["histogram"].values()) != report["all"]["count"]:
+        pytest.fail("Histogram does not include every request")
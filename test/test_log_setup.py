@@ -0,0 +1,64 @@
+"""Module to hold the unit tests for the logging pipeline."""
+
+from uuid import UUID
+
+import orjson
+import pytest
+import structlog
+
+from service_provider_api.api import schemas
+from service_provider_api.core.log_setup import EventSampler, Lazy, _render
+
+
+def test_lazy_fields_are_only_computed_for_emitted_events() -> None:
+    """Test that a lazy field isn't computed for an event below the log level."""
+
+    calls = []
+    log = structlog.get_logger()
+
+    log.debug("filtered", field=Lazy(calls.append, "debug"))
+    log.info("emitted", field=Lazy(calls.append, "info"))
+
+    if calls != ["info"]:
+        pytest.fail(f"Lazy fields were computed for {calls}")
+
+
+def test_event_sampler_rate_limits_events() -> None:
+    """Test that rate limited events are dropped once the limit is reached,
+    and that other events aren't affected."""
+
+    sampler = EventSampler(
+        sample_rates={"never": 0.0}, rate_limits={"limited": 2, "never": 100}
+    )
+
+    def kept(event: str) -> bool:
+        try:
+            sampler(None, "info", {"event": event})
+            return True
+        except structlog.DropEvent:
+            return False
+
+    outcomes = [kept("limited") for _ in range(3)]
+    if outcomes != [True, True, False]:
+        pytest.fail(f"Rate limit was not applied: {outcomes}")
+    if kept("never") or not kept("other"):
+        pytest.fail("Sample rates were not applied by event")
+
+
+def test_render_serializes_models() -> None:
+    """Test that pydantic models and UUIDs are rendered as JSON."""
+
+    rendered = _render(
+        {
+            "event": "test",
+            "id": UUID(int=1),
+            "params": schemas.NewServiceProviderReview(rating=5),
+        }
+    )
+
+    if orjson.loads(rendered) != {
+        "event": "test",
+        "id": str(UUID(int=1)),
+        "params": {"rating": 5},
+    }:
+        pytest.fail(f"Event was not rendered correctly: {rendered}")
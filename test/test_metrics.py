@@ -0,0 +1,100 @@
+"""Module to hold the unit tests for the Prometheus metrics endpoint."""
+
+from http import HTTPStatus
+from pathlib import Path
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+from service_provider_api.core import metrics
+from service_provider_api.core.config import settings
+from service_provider_api.database import models
+
+
+def test_metrics_are_labelled_by_route_and_version(
+    test_client: TestClient,
+    create_service_provider_in_db: models.ServiceProvider,
+) -> None:
+    """Test that request metrics use the route template and API version as labels.
+
+    Args:
+        test_client (TestClient): The FastAPI test client.
+        create_service_provider_in_db (models.ServiceProvider): The service provider
+            in the database.
+    """
+
+    test_client.get(f"/v1_0/service-provider/{create_service_provider_in_db.id}")
+    response = test_client.get("/metrics")
+
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail("API returned a status code other than 200")
+
+    expected_series = (
+        'http_requests_total{method="GET",route="/service-provider/'
+        '{service_provider_id}",version="v1_0",status="200"}'
+    )
+    if expected_series not in response.text:
+        pytest.fail("Request was not recorded against its route template")
+    if str(create_service_provider_in_db.id) in response.text:
+        pytest.fail("Metrics were labelled with the request path")
+
+
+def test_metrics_include_pool_and_threadpool_stats(test_client: TestClient) -> None:
+    """Test that the metrics endpoint reports the pool and threadpool stats.
+
+    Args:
+        test_client (TestClient): The FastAPI test client.
+    """
+
+    response = test_client.get("/metrics")
+
+    for series in (
+        'db_pool_connections{state="size"}',
+        'threadpool_threads{state="max"}',
+    ):
+        if series not in response.text:
+            pytest.fail(f"{series} is missing from the metrics")
+
+
+def test_metrics_are_merged_across_workers(
+    test_client: TestClient, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that a scrape merges the metrics the other workers exported.
+
+    Args:
+        test_client (TestClient): The FastAPI test client.
+        tmp_path (Path): The directory the workers export to.
+        monkeypatch (pytest.MonkeyPatch): Used to set the directory.
+    """
+
+    monkeypatch.setattr(settings, "METRICS_MULTIPROCESS_DIR", str(tmp_path))
+    test_client.get("/v1_0/health")
+    labels = ("GET", "/health", "v1_0", "200")
+    served = metrics.REQUESTS._samples()[labels]
+    # another worker, which has served 3 requests & has 2 in flight
+    (tmp_path / "1.json").write_bytes(
+        orjson.dumps(
+            {
+                "pid": 1,
+                "metrics": {
+                    "http_requests_total": [[list(labels), 3.0]],
+                    "http_requests_in_flight": [[[], 2.0]],
+                },
+            }
+        )
+    )
+    series = 'http_requests_total{method="GET",route="/health",version="v1_0",'
+
+    response = test_client.get("/metrics")
+    if f'{series}status="200"}} {served + 3}' not in response.text:
+        pytest.fail("The other worker's requests weren't counted")
+    if "http_requests_in_flight 3.0" not in response.text:
+        pytest.fail("The other worker's requests in flight weren't counted")
+
+    metrics.mark_process_dead(str(tmp_path), 1)
+    response = test_client.get("/metrics")
+    if f'{series}status="200"}} {served + 3}' not in response.text:
+        pytest.fail("The exited worker's requests stopped being counted")
+    if "http_requests_in_flight 1.0" not in response.text:
+        pytest.fail("The exited worker's requests in flight were still counted")
@@ -0,0 +1,79 @@
+"""Module to hold the unit tests for the per-request profiler."""
+
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from service_provider_api.api.app import app
+from service_provider_api.api.middleware import ProfilingMiddleware
+from service_provider_api.database import models
+
+
+@pytest.fixture
+def profiled_client(tmp_path: Path) -> TestClient:
+    """A test client for the API with profiling enabled by an admin token.
+
+    Args:
+        tmp_path (Path): A temporary directory to write the profiles to.
+
+    Returns:
+        TestClient: The test client.
+    """
+
+    profiled_app = ProfilingMiddleware(
+        app,
+        sample_rate=0,
+        admin_token="secret",
+        interval=0.0001,
+        output_dir=str(tmp_path),
+    )
+    return TestClient(profiled_app)
+
+
+def test_requests_with_admin_token_are_profiled(
+    tmp_path: Path,
+    profiled_client: TestClient,
+    create_multiple_service_providers_in_db: list[models.ServiceProvider],
+) -> None:
+    """Test that a request with the admin token writes a collapsed stack profile.
+
+    Args:
+        tmp_path (Path): The directory the profiles are written to.
+        profiled_client (TestClient): The test client with profiling enabled.
+        create_multiple_service_providers_in_db (list[ServiceProvider]): The service
+            providers in the database.
+    """
+
+    profiled_client.post(
+        "/v1_0/service-providers/",
+        json={"skills": ["plumbing"]},
+        headers={"x-profile": "secret"},
+    )
+
+    profiles = list(tmp_path.glob("*.collapsed"))
+    if len(profiles) != 1:
+        pytest.fail("Expected exactly one profile to be written")
+
+    for line in profiles[0].read_text().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        if not stack or not count.isdigit():
+            pytest.fail("Profile is not in the collapsed stack format")
+
+
+@pytest.mark.parametrize("headers", [{}, {"x-profile": "wrong"}])
+def test_requests_without_admin_token_are_not_profiled(
+    tmp_path: Path, profiled_client: TestClient, headers: dict
+) -> None:
+    """Test that requests without the correct admin token are not profiled.
+
+    Args:
+        tmp_path (Path): The directory the profiles are written to.
+        profiled_client (TestClient): The test client with profiling enabled.
+        headers (dict): The headers to send with the request.
+    """
+
+    profiled_client.get("/v1_0/health", headers=headers)
+
+    if list(tmp_path.glob("*.collapsed")):
+        pytest.fail("A request without the admin token was profiled")
@@ -0,0 +1,92 @@
+"""Module to hold the tests for answering unknown provider IDs from memory."""
+
+import time
+from contextlib import contextmanager
+from http import HTTPStatus
+from typing import Iterator
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from service_provider_api.core import metrics, provider_misses
+from service_provider_api.core.provider_misses import MissCache
+from service_provider_api.database.database import get_engine
+
+
+def _hits(cache: str) -> float:
+    return metrics.CACHE_REQUESTS._samples().get((cache, "hit"), 0.0)
+
+
+@contextmanager
+def _count_statements() -> Iterator[list]:
+    """Record the SQL statements run in the block.
+
+    Yields:
+        list: The statements, added to as they're run.
+    """
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(get_engine(), "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(get_engine(), "before_cursor_execute", record)
+
+
+def test_miss_cache_expires_and_evicts() -> None:
+    """Test that misses are forgotten after their TTL, and oldest first when full."""
+
+    misses = MissCache(ttl=0.05, max_size=2)
+    first, second, third = uuid4(), uuid4(), uuid4()
+    for item in (first, second, third):
+        misses.add(item)
+
+    if first in misses or second not in misses or third not in misses:
+        pytest.fail("The oldest miss wasn't evicted")
+    time.sleep(0.1)
+    if third in misses:
+        pytest.fail("A miss wasn't forgotten after its TTL")
+
+
+def test_unknown_providers_are_looked_up_once(test_client: TestClient) -> None:
+    """Test that an unknown provider is looked up the first time it's requested.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+    """
+
+    unknown = uuid4()
+    with _count_statements() as statements:
+        response = test_client.get(f"/v1_0/service-provider/{unknown}")
+    if response.status_code != HTTPStatus.NOT_FOUND:
+        pytest.fail("The unknown provider wasn't answered with a 404")
+    if not statements:
+        pytest.fail("The unknown provider wasn't looked up in the database")
+    if not provider_misses.known_missing(unknown):
+        pytest.fail("The confirmed miss wasn't cached")
+
+
+def test_confirmed_misses_are_cached(test_client: TestClient) -> None:
+    """Test that a provider found missing isn't looked up again.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+    """
+
+    unknown = uuid4()
+    if test_client.get(f"/v1_0/service-provider/{unknown}").status_code != 404:
+        pytest.fail("The unknown provider was found")
+
+    hits = _hits("provider_misses")
+    with _count_statements() as statements:
+        response = test_client.get(f"/v1_0/service-provider/{unknown}")
+    if response.status_code != HTTPStatus.NOT_FOUND or statements:
+        pytest.fail("The confirmed miss was looked up again")
+    if _hits("provider_misses") != hits + 1:
+        pytest.fail("The cached miss wasn't counted")
@@ -171,3 +171,33 @@ def test_can_update_skills(
     service_provider_skills = [s.skill for s in service_provider.skills]
     if service_provider_skills != skills:
         pytest.fail("Service provider skills not updated in the database.")
+
+
+def test_update_keeps_service_provider_reviews(
+    test_client: TestClient,
+    create_service_provider_reviews_in_db: models.Reviews,
+    service_provider: schemas.NewServiceProviderInSchema,
+    user_id: UUID,
+) -> None:
+    """Test that updating a reviewed service provider keeps its reviews.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        create_service_provider_reviews_in_db (models.Reviews): The review of
+            the service provider to update.
+        service_provider (schemas.NewServiceProviderInSchema): The new service provider data.
+        user_id (UUID): The user id to use to make the request.
+    """
+
+    service_provider.name = "New Name"
+    response = test_client.put(
+        f"/v1_0/service-provider/{create_service_provider_reviews_in_db.service_provider_id}",
+        json=jsonable_encoder(service_provider),
+        headers={"user-id": str(user_id)},
+    )
+
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail("Failed to update a reviewed service provider")
+
+    if response.json()["review_rating"] != create_service_provider_reviews_in_db.rating:
+        pytest.fail("Service provider lost its reviews when it was updated")
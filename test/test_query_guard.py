@@ -0,0 +1,212 @@
+"""Module to hold the tests for the query cost guard of searches."""
+
+import asyncio
+import time
+from http import HTTPStatus
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from service_provider_api.core import metrics, query_guard
+from service_provider_api.core.config import settings
+from service_provider_api.core.repositories.service_provider import (
+    ServiceProviderRepository,
+)
+from service_provider_api.database import models
+from service_provider_api.database.database import SessionLocal, get_engine
+
+
+def _actions(action: str) -> float:
+    return metrics.QUERY_GUARD_ACTIONS._samples().get((action,), 0.0)
+
+
+class _DisconnectingRequest:
+    """A request whose client disconnects after a delay, once its query runs."""
+
+    def __init__(self, delay: float) -> None:
+        self.disconnect_at = time.monotonic() + delay
+
+    async def is_disconnected(self) -> bool:
+        return time.monotonic() >= self.disconnect_at
+
+
+def test_page_size_is_capped(
+    test_client: TestClient,
+    create_multiple_service_provider_reviews_in_db: list[models.Reviews],
+    monkeypatch: pytest.MonkeyPatch,
+    read_your_writes: None,
+) -> None:
+    """Test that searches get at most the max page size, and are told so.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        create_multiple_service_provider_reviews_in_db (list[models.Reviews]): The
+            reviews of the two service providers.
+        monkeypatch (pytest.MonkeyPatch): Used to lower the max page size.
+        read_your_writes (None): Searches for what was just written.
+    """
+
+    monkeypatch.setattr(settings, "SEARCH_MAX_PAGE_SIZE", 1)
+
+    response = test_client.post("/v1_0/service-providers?page_size=100", json={})
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail(f"The search failed with {response.status_code}")
+    if len(response.json()["service_providers"]) != 1:
+        pytest.fail("The page size wasn't capped")
+    if response.headers.get("X-Page-Size") != "1":
+        pytest.fail("The search wasn't told its page size was capped")
+
+
+def test_too_many_availability_ranges_are_rejected(
+    test_client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that searches with too many availability ranges are rejected.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        monkeypatch (pytest.MonkeyPatch): Used to lower the max ranges.
+    """
+
+    monkeypatch.setattr(settings, "SEARCH_MAX_AVAILABILITY_RANGES", 1)
+    availability = [
+        {"from_date": "2030-01-01", "to_date": "2030-01-02"},
+        {"from_date": "2030-02-01", "to_date": "2030-02-02"},
+    ]
+
+    response = test_client.post(
+        "/v1_0/service-providers", json={"availability": availability}
+    )
+    if response.status_code != HTTPStatus.UNPROCESSABLE_ENTITY:
+        pytest.fail("The search with too many ranges wasn't rejected")
+
+
+def test_expensive_searches_are_rejected(
+    test_client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that searches estimated to cost more than the limit are rejected.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        monkeypatch (pytest.MonkeyPatch): Used to lower the cost limit.
+    """
+
+    monkeypatch.setattr(settings, "SEARCH_REJECT_COST", 0.0)
+    rejected = _actions("rejected")
+
+    for path in ("/v1_0/service-providers", "/v1_0/service-providers/recommend"):
+        response = test_client.post(
+            path,
+            json={
+                "skills": ["plumbing"],
+                "availability": [],
+                "job_budget_in_pence": 1000,
+                "expected_job_duration_in_days": 1,
+            },
+        )
+        if response.status_code != HTTPStatus.UNPROCESSABLE_ENTITY:
+            pytest.fail(f"The expensive search of {path} wasn't rejected")
+    if _actions("rejected") != rejected + 2:
+        pytest.fail("The rejections weren't counted")
+
+
+def test_expensive_searches_run_on_the_low_priority_pool(
+    test_client: TestClient,
+    create_service_provider_in_db: models.ServiceProvider,
+    monkeypatch: pytest.MonkeyPatch,
+    read_your_writes: None,
+) -> None:
+    """Test that expensive searches are run, on the low priority pool.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        create_service_provider_in_db (ServiceProvider): The service provider
+            to find.
+        monkeypatch (pytest.MonkeyPatch): Used to lower the cost threshold.
+        read_your_writes (None): Searches for what was just written.
+    """
+
+    list_with_total = ServiceProviderRepository.list_with_total
+    main_pool = get_engine().pool
+    checked_out = []
+
+    def search(db, filters, page, page_size, count_mode):
+        checked_out.append(main_pool.checkedout())
+        return list_with_total(db, filters, page, page_size, count_mode)
+
+    monkeypatch.setattr(ServiceProviderRepository, "list_with_total", search)
+    monkeypatch.setattr(settings, "SEARCH_LOW_PRIORITY_COST", 0.0)
+    low_priority = _actions("low_priority")
+    idle = main_pool.checkedout()
+
+    response = test_client.post("/v1_0/service-providers", json={})
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail(f"The expensive search failed with {response.status_code}")
+    if len(response.json()["service_providers"]) != 1:
+        pytest.fail("The expensive search didn't find the service provider")
+    if _actions("low_priority") != low_priority + 1:
+        pytest.fail("The search wasn't run on the low priority pool")
+    if checked_out != [idle]:
+        pytest.fail("The search held a main pool connection while it ran")
+
+
+def test_searches_time_out(
+    test_client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that a search's queries are cancelled after the statement timeout.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        monkeypatch (pytest.MonkeyPatch): Used to make the search slow.
+    """
+
+    def slow_search(db, filters, page, page_size, count_mode):
+        db.execute(text("SELECT pg_sleep(5)"))
+
+    monkeypatch.setattr(ServiceProviderRepository, "list_with_total", slow_search)
+    monkeypatch.setattr(settings, "SEARCH_STATEMENT_TIMEOUT_MS", 50.0)
+    timeouts = _actions("statement_timeout")
+
+    started = time.monotonic()
+    response = test_client.post("/v1_0/service-providers", json={})
+    if response.status_code != HTTPStatus.SERVICE_UNAVAILABLE:
+        pytest.fail(f"The slow search returned {response.status_code}")
+    if time.monotonic() - started > 2:
+        pytest.fail("The slow search wasn't cancelled at the timeout")
+    if _actions("statement_timeout") != timeouts + 1:
+        pytest.fail("The timeout wasn't counted")
+
+
+def test_queries_are_cancelled_when_the_client_disconnects() -> None:
+    """Test that the queries of a request whose client went away are cancelled."""
+
+    def slow_query() -> None:
+        db = SessionLocal()
+        try:
+            db.execute(text("SELECT pg_sleep(5)"))
+        finally:
+            db.close()
+
+    disconnects = _actions("client_disconnect")
+    started = time.monotonic()
+    try:
+        asyncio.run(query_guard.run_cancellable(_DisconnectingRequest(0.2), slow_query))
+        pytest.fail("The query wasn't cancelled")
+    except Exception as e:
+        if "canceling statement due to user request" not in str(e):
+            pytest.fail(f"The query failed for another reason: {e}")
+
+    if time.monotonic() - started > 2:
+        pytest.fail("The query ran after the client disconnected")
+    if _actions("client_disconnect") != disconnects + 1:
+        pytest.fail("The cancellation wasn't counted")
+
+
+def test_shared_queries_are_not_cancelled() -> None:
+    """Test that queries other requests are waiting on aren't cancelled."""
+
+    scope = query_guard.CancelScope()
+    scope.shared = True
+
+    if scope.cancel() or scope.cancelled:
+        pytest.fail("A shared query was cancelled")
@@ -0,0 +1,177 @@
+"""Module to hold the tests for the sharded rating counters."""
+
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from service_provider_api.api import schemas
+from service_provider_api.core.repositories.service_provider_review import (
+    ServiceProviderReviewRepository,
+)
+from service_provider_api.database import models
+from service_provider_api.database.database import SessionLocal, get_engine
+
+
+def _add_review(service_provider_id, rating: float) -> None:
+    db = SessionLocal()
+    try:
+        ServiceProviderReviewRepository.new(
+            service_provider_id,
+            schemas.NewServiceProviderReview(rating=rating),
+            uuid4(),
+            db,
+        )
+    finally:
+        db.close()
+
+
+def test_sharded_reviews_are_counted(
+    test_client: TestClient,
+    create_service_provider_in_db: models.ServiceProvider,
+    db_connection: Session,
+) -> None:
+    """Test that concurrent reviews of a sharded provider are all counted.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        create_service_provider_in_db (ServiceProvider): The service provider
+            to review.
+        db_connection (Session): The database connection.
+    """
+
+    service_provider_id = create_service_provider_in_db.id
+    ServiceProviderReviewRepository.set_rating_shards(
+        service_provider_id, 8, db_connection
+    )
+
+    ratings = [1, 2, 3, 4, 5] * 8
+    with ThreadPoolExecutor(8) as executor:
+        list(
+            executor.map(
+                lambda rating: _add_review(service_provider_id, rating), ratings
+            )
+        )
+
+    db_connection.expire_all()
+    service_provider = db_connection.get(models.ServiceProvider, service_provider_id)
+    if service_provider.review_count != 0:
+        pytest.fail("A sharded provider's reviews were counted on its row")
+
+    response = test_client.get(f"/v1_0/service-provider/{service_provider_id}")
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail("Failed to get the sharded service provider")
+    if response.json()["review_rating"] != pytest.approx(3.0):
+        pytest.fail("The reviews in the shards weren't included in the rating")
+
+
+def test_compaction_moves_shards_into_the_provider(
+    create_service_provider_in_db: models.ServiceProvider,
+    db_connection: Session,
+) -> None:
+    """Test that compacting folds every shard into the provider's aggregates.
+
+    Args:
+        create_service_provider_in_db (ServiceProvider): The service provider
+            to review.
+        db_connection (Session): The database connection.
+    """
+
+    service_provider_id = create_service_provider_in_db.id
+    ServiceProviderReviewRepository.set_rating_shards(
+        service_provider_id, 4, db_connection
+    )
+    for rating in (2, 4, 4, 5, 5):
+        _add_review(service_provider_id, rating)
+
+    if ServiceProviderReviewRepository.compact_rating_shards(db_connection) == 0:
+        pytest.fail("No shards were compacted")
+
+    db_connection.expire_all()
+    shards = db_connection.query(models.ReviewRatingShard).count()
+    service_provider = db_connection.get(models.ServiceProvider, service_provider_id)
+    if shards != 0:
+        pytest.fail("Compacted shards weren't removed")
+    if service_provider.review_count != 5 or service_provider.review_rating_sum != 20:
+        pytest.fail("The shards weren't added to the provider's aggregates")
+
+
+def test_going_back_to_one_shard_compacts(
+    create_service_provider_in_db: models.ServiceProvider,
+    db_connection: Session,
+) -> None:
+    """Test that a provider's shards are compacted when it's given one shard.
+
+    Args:
+        create_service_provider_in_db (ServiceProvider): The service provider
+            to review.
+        db_connection (Session): The database connection.
+    """
+
+    service_provider_id = create_service_provider_in_db.id
+    ServiceProviderReviewRepository.set_rating_shards(
+        service_provider_id, 4, db_connection
+    )
+    _add_review(service_provider_id, 3)
+    ServiceProviderReviewRepository.set_rating_shards(
+        service_provider_id, 1, db_connection
+    )
+
+    db_connection.expire_all()
+    service_provider = db_connection.get(models.ServiceProvider, service_provider_id)
+    if service_provider.rating_shards or service_provider.review_count != 1:
+        pytest.fail("The provider's shards weren't compacted")
+
+
+def test_listing_sharded_providers_loads_shards_in_one_query(
+    test_client: TestClient,
+    create_multiple_service_providers_in_db: list[models.ServiceProvider],
+    db_connection: Session,
+) -> None:
+    """Test that the number of queries doesn't grow with the sharded providers listed.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        create_multiple_service_providers_in_db (list[ServiceProvider]): The
+            service providers to shard & list.
+        db_connection (Session): The database connection.
+    """
+
+    ids = [str(provider.id) for provider in create_multiple_service_providers_in_db]
+    for service_provider_id in ids:
+        ServiceProviderReviewRepository.set_rating_shards(
+            service_provider_id, 4, db_connection
+        )
+        _add_review(service_provider_id, 4)
+
+    statements = []
+
+    def count_statement(*args) -> None:
+        statements.append(args)
+
+    def count_queries(method: str, path: str, body: dict) -> int:
+        statements.clear()
+        event.listen(get_engine(), "before_cursor_execute", count_statement)
+        try:
+            response = test_client.request(method, path, json=body)
+        finally:
+            event.remove(get_engine(), "before_cursor_execute", count_statement)
+        if response.status_code != HTTPStatus.OK:
+            pytest.fail(f"{path} failed with {response.status_code}")
+        return len(statements)
+
+    search = "/v1_0/service-providers?page_size={}"
+    if count_queries("POST", search.format(1), {}) != count_queries(
+        "POST", search.format(len(ids)), {}
+    ):
+        pytest.fail("The number of search queries grew with the sharded providers")
+
+    batch_get = "/v1_0/service-providers/batch-get"
+    if count_queries("POST", batch_get, {"ids": ids[:1]}) != count_queries(
+        "POST", batch_get, {"ids": ids}
+    ):
+        pytest.fail("The number of batch get queries grew with the sharded providers")
@@ -0,0 +1,224 @@
+"""Module to hold the tests for coalescing identical concurrent reads."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.orm import Session
+
+from service_provider_api.api import schemas
+from service_provider_api.core import metrics, query_guard
+from service_provider_api.core.repositories.service_provider import (
+    SearchCancelled,
+    ServiceProviderNotFound,
+    ServiceProviderRepository,
+)
+from service_provider_api.core.singleflight import SingleFlight
+from service_provider_api.database import models
+from service_provider_api.database.database import SessionLocal
+
+
+def _followers(operation: str) -> float:
+    return metrics.COALESCED_READS._samples().get((operation, "follower"), 0.0)
+
+
+def _read_concurrently(
+    operation: str,
+    reads: list[Callable[[Session], object]],
+    followers: int,
+    gate: threading.Event,
+) -> list:
+    """Run reads at once, each with its own session, holding the first in flight.
+
+    Args:
+        operation (str): The operation the reads are coalesced under.
+        reads (list[Callable[[Session], object]]): The reads, the first is
+            started before the rest.
+        followers (int): The number of reads expected to wait for another.
+        gate (threading.Event): Set to let the calls in flight finish.
+
+    Returns:
+        list: The result, or exception, of each read.
+    """
+
+    def read(func: Callable[[Session], object]) -> object:
+        db = SessionLocal()
+        try:
+            return func(db)
+        except Exception as e:
+            return e
+        finally:
+            db.close()
+
+    expected = _followers(operation) + followers
+    with ThreadPoolExecutor(len(reads)) as pool:
+        futures = [pool.submit(read, func) for func in reads]
+        deadline = time.monotonic() + 5
+        while _followers(operation) < expected and time.monotonic() < deadline:
+            time.sleep(0.01)
+        gate.set()
+        return [future.result(timeout=5) for future in futures]
+
+
+@pytest.fixture
+def gated_get(monkeypatch: pytest.MonkeyPatch) -> tuple[threading.Event, list]:
+    """Hold every get in flight until the gate is set.
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): Used to wrap the repository's get.
+
+    Yields:
+        tuple[threading.Event, list]: The gate, and the IDs of the service
+            providers that were queried.
+    """
+
+    gate, queried = threading.Event(), []
+    get = ServiceProviderRepository.get
+
+    def gated(service_provider_id, db, user_id=None):
+        queried.append(service_provider_id)
+        gate.wait(5)
+        return get(service_provider_id, db, user_id)
+
+    monkeypatch.setattr(ServiceProviderRepository, "get", gated)
+    yield gate, queried
+
+
+def test_concurrent_gets_share_one_query(
+    create_service_provider_in_db: models.ServiceProvider,
+    gated_get: tuple[threading.Event, list],
+) -> None:
+    """Test that concurrent gets of the same provider share one query & result.
+
+    Args:
+        create_service_provider_in_db (ServiceProvider): The service provider
+            to get.
+        gated_get (tuple[threading.Event, list]): Holds the gets in flight.
+    """
+
+    gate, queried = gated_get
+    service_provider_id = create_service_provider_in_db.id
+
+    results = _read_concurrently(
+        "get",
+        [
+            lambda db: ServiceProviderRepository.get_as_dict(service_provider_id, db)
+            for _ in range(5)
+        ],
+        4,
+        gate,
+    )
+
+    if queried != [service_provider_id]:
+        pytest.fail("The concurrent gets weren't coalesced into one query")
+    if any(result != create_service_provider_in_db.as_dict() for result in results):
+        pytest.fail("A coalesced get didn't return the service provider")
+
+
+def test_coalesced_gets_share_errors(gated_get: tuple[threading.Event, list]) -> None:
+    """Test that every coalesced get raises the error of the shared query.
+
+    Args:
+        gated_get (tuple[threading.Event, list]): Holds the gets in flight.
+    """
+
+    gate, queried = gated_get
+    service_provider_id = uuid4()
+
+    results = _read_concurrently(
+        "get",
+        [
+            lambda db: ServiceProviderRepository.get_as_dict(service_provider_id, db)
+            for _ in range(3)
+        ],
+        2,
+        gate,
+    )
+
+    if len(queried) != 1:
+        pytest.fail("The concurrent gets weren't coalesced into one query")
+    if not all(isinstance(result, ServiceProviderNotFound) for result in results):
+        pytest.fail("A coalesced get didn't raise the shared error")
+
+
+def test_equivalent_searches_are_coalesced(
+    create_multiple_service_provider_reviews_in_db: list[models.Reviews],
+    monkeypatch: pytest.MonkeyPatch,
+    read_your_writes: None,
+) -> None:
+    """Test that searches are coalesced with searches whose filters are equivalent.
+
+    Args:
+        create_multiple_service_provider_reviews_in_db (list[models.Reviews]): The
+            reviews of the service providers, rated 5 & 2.
+        monkeypatch (pytest.MonkeyPatch): Used to wrap the repository's search.
+        read_your_writes (None): Searches for what was just written.
+    """
+
+    gate, searched = threading.Event(), []
+    list_with_total = ServiceProviderRepository.list_with_total
+
+    def gated(db, filters, page, page_size, count_mode):
+        searched.append(page)
+        gate.wait(5)
+        return list_with_total(db, filters, page, page_size, count_mode)
+
+    monkeypatch.setattr(ServiceProviderRepository, "list_with_total", gated)
+
+    def search(skills: list[str], page: int = 1) -> Callable[[Session], object]:
+        filters = schemas.ServiceProviderListFilterParams(skills=skills)
+        return lambda db: ServiceProviderRepository.list_as_dicts(db, filters, page, 10)
+
+    results = _read_concurrently(
+        "search",
+        [
+            search(["plumbing", "SEO"]),
+            search(["SEO", "plumbing"]),
+            search(["SEO", "plumbing", "SEO"]),
+            search(["plumbing", "SEO"], page=2),
+        ],
+        2,
+        gate,
+    )
+
+    # one search per page, whichever of the equivalent filters ran it
+    if sorted(searched) != [1, 2]:
+        pytest.fail("Equivalent searches weren't coalesced, or other pages were")
+    names = [[provider["name"] for provider in result[0]] for result in results]
+    if names[:3] != [["Dean Greene", "John Smith"]] * 3 or names[3] != []:
+        pytest.fail("A coalesced search didn't return its results")
+
+
+def test_cancelled_calls_are_not_joined() -> None:
+    """Test that a read doesn't share a call whose client has disconnected."""
+
+    flight = SingleFlight()
+    scope = query_guard.CancelScope()
+    started, gate = threading.Event(), threading.Event()
+
+    def leader() -> str:
+        query_guard._current_scope.set(scope)
+
+        def cancelled_read() -> str:
+            started.set()
+            gate.wait(5)
+            raise SearchCancelled("canceling statement due to user request")
+
+        return flight.do("search", "key", cancelled_read)
+
+    with ThreadPoolExecutor(1) as pool:
+        cancelled = pool.submit(leader)
+        started.wait(5)
+        scope.cancel()
+        try:
+            result = flight.do("search", "key", lambda: "own result")
+        finally:
+            gate.set()
+        if not isinstance(cancelled.exception(timeout=5), SearchCancelled):
+            pytest.fail("The disconnected leader's call wasn't cancelled")
+
+    if result != "own result":
+        pytest.fail("A read joined a call that had been cancelled")
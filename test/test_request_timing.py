@@ -0,0 +1,38 @@
+"""Module to hold the unit tests for the request timing middleware."""
+
+from http import HTTPStatus
+
+import pytest
+from fastapi.testclient import TestClient
+
+from service_provider_api.database import models
+
+
+def test_server_timing_header_is_returned(
+    test_client: TestClient,
+    create_service_provider_in_db: models.ServiceProvider,
+) -> None:
+    """Test that the API returns the request timings in a Server-Timing header.
+
+    Args:
+        test_client (TestClient): The FastAPI test client.
+        create_service_provider_in_db (models.ServiceProvider): The service provider
+            in the database.
+    """
+
+    response = test_client.get(
+        f"/v1_0/service-provider/{create_service_provider_in_db.id}"
+    )
+
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail("API returned a status code other than 200")
+
+    server_timing = response.headers.get("server-timing", "")
+    metrics = {metric.split(";")[0].strip() for metric in server_timing.split(",")}
+    if metrics != {"total", "pool", "db", "serialize"}:
+        pytest.fail("Server-Timing header is missing metrics")
+
+    # the provider, its skills and its availability each need a query
+    db_metric = next(m for m in server_timing.split(",") if m.strip().startswith("db"))
+    if '"0 queries"' in db_metric:
+        pytest.fail("SQL statements were not counted")
@@ -0,0 +1,147 @@
+"""Module to hold the tests for writing reviews in batches."""
+
+from concurrent.futures import wait
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.orm import Session
+
+from service_provider_api.api import schemas
+from service_provider_api.core.repositories.service_provider import (
+    ServiceProviderNotFound,
+)
+from service_provider_api.core.config import settings
+from service_provider_api.core import provider_misses
+from service_provider_api.core.review_batcher import ReviewBatcher
+from service_provider_api.database import models
+
+
+def test_batched_reviews_update_the_rating_aggregates(
+    create_multiple_service_providers_in_db: list[models.ServiceProvider],
+    db_connection: Session,
+) -> None:
+    """Test that every queued review is written, and counted once.
+
+    Args:
+        create_multiple_service_providers_in_db (list[ServiceProvider]): The
+            service providers to review.
+        db_connection (Session): The database connection.
+    """
+
+    first, second = create_multiple_service_providers_in_db[:2]
+    ratings = {first.id: [1, 2, 3, 4, 5] * 10, second.id: [4, 5] * 10}
+
+    batcher = ReviewBatcher(max_batch_size=25, max_delay=0.05)
+    batcher.start()
+    futures = [
+        batcher.submit(
+            service_provider_id,
+            schemas.NewServiceProviderReview(rating=rating),
+            uuid4(),
+        )
+        for service_provider_id, provider_ratings in ratings.items()
+        for rating in provider_ratings
+    ]
+    batcher.stop()
+
+    if any(future.exception() for future in futures):
+        pytest.fail("A batched review wasn't created")
+
+    # the providers were loaded before the batches were written
+    db_connection.expire_all()
+
+    for service_provider_id, provider_ratings in ratings.items():
+        service_provider = db_connection.get(
+            models.ServiceProvider, service_provider_id
+        )
+        if service_provider.review_count != len(provider_ratings):
+            pytest.fail("The review count wasn't updated once per review")
+        if len(service_provider.review_rating) != len(provider_ratings):
+            pytest.fail("Not every batched review was written")
+        expected = sum(provider_ratings) / len(provider_ratings)
+        if service_provider.average_review_rating != pytest.approx(expected):
+            pytest.fail("The average review rating is wrong")
+
+
+def test_missing_service_provider_only_fails_its_own_review(
+    create_service_provider_in_db: models.ServiceProvider,
+    db_connection: Session,
+) -> None:
+    """Test that a review of a missing provider doesn't fail its batch.
+
+    Args:
+        create_service_provider_in_db (ServiceProvider): The service provider
+            to review.
+        db_connection (Session): The database connection.
+    """
+
+    review = schemas.NewServiceProviderReview(rating=4)
+    batcher = ReviewBatcher(max_batch_size=10, max_delay=1.0)
+    batcher.start()
+    good = batcher.submit(create_service_provider_in_db.id, review, uuid4())
+    missing = batcher.submit(uuid4(), review, uuid4())
+    batcher.stop()
+    wait([good, missing])
+
+    if not isinstance(missing.exception(), ServiceProviderNotFound):
+        pytest.fail("A review of a missing service provider was created")
+    if good.exception() is not None:
+        pytest.fail("A valid review failed because its batch had a bad review")
+
+    db_connection.refresh(create_service_provider_in_db)
+    if create_service_provider_in_db.review_count != 1:
+        pytest.fail("The valid review wasn't written")
+
+
+def test_cancelled_reviews_are_dropped(
+    create_service_provider_in_db: models.ServiceProvider,
+    db_connection: Session,
+) -> None:
+    """Test that a review cancelled while queued doesn't fail the rest of its batch.
+
+    Args:
+        create_service_provider_in_db (ServiceProvider): The service provider
+            to review.
+        db_connection (Session): The database connection.
+    """
+
+    review = schemas.NewServiceProviderReview(rating=4)
+    batcher = ReviewBatcher(max_batch_size=10, max_delay=1.0)
+    batcher.start()
+    cancelled = batcher.submit(create_service_provider_in_db.id, review, uuid4())
+    good = batcher.submit(create_service_provider_in_db.id, review, uuid4())
+    # as a request's future is when its client disconnects
+    if not cancelled.cancel():
+        pytest.fail("The queued review couldn't be cancelled")
+    batcher.stop()
+
+    if good.exception() is not None:
+        pytest.fail("A review failed because another in its batch was cancelled")
+
+    db_connection.refresh(create_service_provider_in_db)
+    if create_service_provider_in_db.review_count != 1:
+        pytest.fail("The cancelled review was written, or the other one wasn't")
+
+
+def test_missing_service_provider_is_remembered(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that a batched review of a missing provider caches the miss.
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): Used to turn on the miss cache.
+    """
+
+    monkeypatch.setattr(settings, "PROVIDER_MISS_CACHE", True)
+    missing_id = uuid4()
+    batcher = ReviewBatcher(max_batch_size=10, max_delay=0.01)
+    batcher.start()
+    missing = batcher.submit(
+        missing_id, schemas.NewServiceProviderReview(rating=4), uuid4()
+    )
+    batcher.stop()
+
+    if not isinstance(missing.exception(), ServiceProviderNotFound):
+        pytest.fail("A review of a missing service provider was created")
+    if not provider_misses.known_missing(missing_id):
+        pytest.fail("The missing service provider wasn't remembered")
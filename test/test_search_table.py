@@ -0,0 +1,262 @@
+"""Module to hold the tests for the denormalized search table."""
+
+from datetime import date
+from http import HTTPStatus
+from uuid import UUID
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from service_provider_api.api import schemas
+from service_provider_api.core.config import settings
+from service_provider_api.core.repositories.service_provider_search import (
+    ServiceProviderSearchRepository,
+)
+from service_provider_api.database import models
+from service_provider_api.database.database import engine
+
+
+def _search(test_client: TestClient, body: dict) -> list[str]:
+    response = test_client.post("/v1_0/service-providers", json=body)
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail("API returned a status code other than 200")
+    return [provider["name"] for provider in response.json()["service_providers"]]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {},
+        {"skills": ["plumbing", "SEO"]},
+        {"skills": ["electrical"], "cost_lt": 5000},
+        {"reviews_gt": 3},
+        {"name_query": "een"},
+        {
+            "availability": [
+                {
+                    "from_date": date(2020, 1, 1).isoformat(),
+                    "to_date": date(2021, 12, 28).isoformat(),
+                }
+            ]
+        },
+        {
+            "availability": [
+                {
+                    "from_date": date(2022, 1, 3).isoformat(),
+                    "to_date": date(2022, 1, 10).isoformat(),
+                }
+            ]
+        },
+    ],
+)
+def test_search_table_matches_the_live_search(
+    test_client: TestClient,
+    create_multiple_service_provider_reviews_in_db: list[models.Reviews],
+    db_connection: Session,
+    monkeypatch: pytest.MonkeyPatch,
+    body: dict,
+) -> None:
+    """Test that searching the search table finds what joining the tables does.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        create_multiple_service_provider_reviews_in_db (list[models.Reviews]): The
+            reviews of the service providers, rated 5 & 2.
+        db_connection (Session): The database connection.
+        monkeypatch (pytest.MonkeyPatch): Used to choose the tables searched.
+        body (dict): The search.
+    """
+
+    if ServiceProviderSearchRepository.refresh(db_connection) != 2:
+        pytest.fail("The created providers weren't queued")
+
+    monkeypatch.setattr(settings, "SEARCH_TABLE_MAX_STALENESS_S", None)
+    live = _search(test_client, body)
+    monkeypatch.setattr(settings, "SEARCH_TABLE_MAX_STALENESS_S", 0.0)
+    if ServiceProviderSearchRepository.is_fresh(0.0, db_connection) is not True:
+        pytest.fail("The search table wasn't fresh after it was refreshed")
+
+    if _search(test_client, body) != live:
+        pytest.fail("The search table didn't match the live tables")
+
+
+def test_stale_search_table_is_only_used_within_the_bound(
+    test_client: TestClient,
+    create_service_provider_in_db: models.ServiceProvider,
+    service_provider: schemas.NewServiceProviderInSchema,
+    db_connection: Session,
+    user_id: UUID,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test that searches only read a stale search table within the staleness bound.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        create_service_provider_in_db (ServiceProvider): A service provider
+            that's in the search table.
+        service_provider (schemas.NewServiceProviderInSchema): Another service
+            provider, created after the search table is refreshed.
+        db_connection (Session): The database connection.
+        user_id (UUID): The user id to use to make the request.
+        monkeypatch (pytest.MonkeyPatch): Used to set the staleness bound.
+    """
+
+    ServiceProviderSearchRepository.refresh(db_connection)
+    service_provider.name = "Jane Doe"
+    test_client.post(
+        "/v1_0/service-provider",
+        json=jsonable_encoder(service_provider),
+        headers={"user-id": str(user_id)},
+    )
+
+    monkeypatch.setattr(settings, "SEARCH_TABLE_MAX_STALENESS_S", 60.0)
+    if _search(test_client, {}) != ["John Smith"]:
+        pytest.fail("The search table wasn't searched within the staleness bound")
+
+    monkeypatch.setattr(settings, "SEARCH_TABLE_MAX_STALENESS_S", 0.0)
+    if sorted(_search(test_client, {})) != ["Jane Doe", "John Smith"]:
+        pytest.fail("A stale search table was searched")
+
+    # only the new provider is refreshed
+    if ServiceProviderSearchRepository.refresh(db_connection) != 1:
+        pytest.fail("Providers that hadn't changed were refreshed")
+    monkeypatch.setattr(settings, "SEARCH_TABLE_MAX_STALENESS_S", 60.0)
+    if sorted(_search(test_client, {})) != ["Jane Doe", "John Smith"]:
+        pytest.fail("The refresh didn't add the new provider")
+
+
+def test_refresh_follows_reviews_and_deletes(
+    test_client: TestClient,
+    create_service_provider_in_db: models.ServiceProvider,
+    db_connection: Session,
+    user_id: UUID,
+) -> None:
+    """Test that reviews & deletes queue the provider's search row to be refreshed.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        create_service_provider_in_db (ServiceProvider): The service provider
+            to review & delete.
+        db_connection (Session): The database connection.
+        user_id (UUID): The user id to use to make the request.
+    """
+
+    service_provider_id = create_service_provider_in_db.id
+    ServiceProviderSearchRepository.refresh(db_connection)
+
+    test_client.post(
+        f"/v1_0/service-provider/{service_provider_id}/review",
+        json={"rating": 4},
+        headers={"user-id": str(user_id)},
+    )
+    ServiceProviderSearchRepository.refresh(db_connection)
+    search_row = db_connection.get(models.ServiceProviderSearch, service_provider_id)
+    if search_row.review_count != 1 or search_row.review_rating != 4:
+        pytest.fail("The review wasn't refreshed into the search row")
+
+    test_client.delete(
+        f"/v1_0/service-provider/{service_provider_id}",
+        headers={"user-id": str(user_id)},
+    )
+    ServiceProviderSearchRepository.refresh(db_connection)
+    db_connection.expire_all()
+    if db_connection.get(models.ServiceProviderSearch, service_provider_id):
+        pytest.fail("The deleted provider's search row wasn't removed")
+
+
+def test_fresh_answers_are_remembered_within_the_bound(
+    db_connection: Session,
+) -> None:
+    """Test that a fresh search table isn't checked again until it could be stale.
+
+    Args:
+        db_connection (Session): The database connection.
+    """
+
+    statements = []
+
+    def count_statement(*args) -> None:
+        statements.append(args)
+
+    if not ServiceProviderSearchRepository.is_fresh(60.0, db_connection):
+        pytest.fail("The empty queue wasn't fresh")
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        fresh = ServiceProviderSearchRepository.is_fresh(60.0, db_connection)
+        exact = ServiceProviderSearchRepository.is_fresh(0.0, db_connection)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+    if not fresh or not exact:
+        pytest.fail("The empty queue wasn't fresh")
+    if len(statements) != 1:
+        pytest.fail("The fresh answer wasn't remembered for its own bound only")
+
+
+def test_new_providers_are_searchable_once_refreshed(
+    test_client: TestClient,
+    service_provider: schemas.NewServiceProviderInSchema,
+    db_connection: Session,
+    user_id: UUID,
+) -> None:
+    """Test that, at the default bound, a search only finds what's been refreshed.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        service_provider (schemas.NewServiceProviderInSchema): The service
+            provider to create.
+        db_connection (Session): The database connection.
+        user_id (UUID): The user id to use to make the request.
+    """
+
+    response = test_client.post(
+        "/v1_0/service-provider",
+        json=jsonable_encoder(service_provider),
+        headers={"user-id": str(user_id)},
+    )
+    if response.status_code != HTTPStatus.CREATED:
+        pytest.fail("The service provider wasn't created")
+
+    if _search(test_client, {}) != []:
+        pytest.fail("The search didn't read the search table within the bound")
+
+    ServiceProviderSearchRepository.refresh(db_connection)
+    if _search(test_client, {}) != ["John Smith"]:
+        pytest.fail("The refresh didn't make the new provider searchable")
+
+
+def test_facets_count_the_search_table(
+    test_client: TestClient,
+    create_service_provider_in_db: models.ServiceProvider,
+    db_connection: Session,
+) -> None:
+    """Test that, at the default bound, the facets count the search table's values.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        create_service_provider_in_db (ServiceProvider): The service provider,
+            costing 1000 pence in the search table.
+        db_connection (Session): The database connection.
+    """
+
+    ServiceProviderSearchRepository.refresh(db_connection)
+    # changed behind the queue's back, so the search table keeps the old cost
+    create_service_provider_in_db.cost_in_pence = 20_000
+    db_connection.commit()
+
+    response = test_client.post(
+        "/v1_0/service-providers",
+        params={"facets": True},
+        json={"cost_lt": 5000},
+    )
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail("API returned a status code other than 200")
+
+    json_response = response.json()
+    if len(json_response["service_providers"]) != 1:
+        pytest.fail("The search didn't read the search table within the bound")
+    if json_response["facets"]["cost_in_pence"] != [{"gte": 0, "lt": 5000, "count": 1}]:
+        pytest.fail("The facets didn't count the search table's costs")
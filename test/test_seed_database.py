@@ -0,0 +1,70 @@
+"""Module to hold the unit tests for the synthetic data seeder."""
+
+import pytest
+from sqlalchemy.orm import Session
+
+from benchmarks.catalogue import generate_catalogue
+from benchmarks.seed import seed_database
+
+
+def _review_checksum(db: Session) -> str:
+    return db.execute(
+        "SELECT md5(string_agg(id::text || rating::text, ',' ORDER BY id)) "
+        "FROM reviews"
+    ).scalar()
+
+
+def test_seed_database_loads_catalogue(db_connection: Session) -> None:
+    """Test that the seeder loads every provider and its children."""
+
+    providers = list(generate_catalogue(50, seed=1))
+
+    loaded = seed_database(50, seed=1, workers=2, truncate=True)
+
+    counts = db_connection.execute(
+        "SELECT (SELECT count(*) FROM service_providers),"
+        " (SELECT count(*) FROM skills),"
+        " (SELECT count(*) FROM reviews),"
+        " (SELECT count(*) FROM service_provider_search)"
+    ).one()
+    expected = (
+        50,
+        sum(len(p.skills) for p in providers),
+        sum(len(p.ratings) for p in providers),
+        50,
+    )
+    if loaded != 50 or tuple(counts) != expected:
+        pytest.fail(f"Expected {expected} rows, got {tuple(counts)}")
+
+
+def test_seed_database_is_deterministic(db_connection: Session) -> None:
+    """Test that the same seed loads the same rows, whatever the number of
+    workers."""
+
+    seed_database(50, seed=1, workers=1, truncate=True)
+    first = _review_checksum(db_connection)
+    db_connection.commit()
+
+    seed_database(50, seed=1, workers=2, truncate=True)
+    second = _review_checksum(db_connection)
+
+    if first != second:
+        pytest.fail("Seeding twice with the same seed loaded different rows")
+
+
+def test_seed_database_restores_indexes(db_connection: Session) -> None:
+    """Test that the indexes & foreign keys dropped for the load are rebuilt."""
+
+    def schema() -> list:
+        return db_connection.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'reviews' "
+            "UNION ALL SELECT conname FROM pg_constraint "
+            "WHERE conrelid = 'reviews'::regclass ORDER BY 1"
+        ).fetchall()
+
+    before = schema()
+    db_connection.commit()
+    seed_database(10, workers=1, truncate=True)
+
+    if schema() != before:
+        pytest.fail("The indexes of the reviews table were not rebuilt")
@@ -0,0 +1,169 @@
+"""Module to hold the tests for the skill autocomplete endpoint."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from uuid import UUID
+
+import pytest
+from fastapi.testclient import TestClient
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+
+from service_provider_api.api import schemas
+from service_provider_api.core.skill_index import SkillIndex
+from service_provider_api.database import models
+from service_provider_api.database.database import engine
+
+
+def _suggest(test_client: TestClient, prefix: str) -> list[tuple[str, int]]:
+    response = test_client.get("/v1_0/skills/suggest", params={"prefix": prefix})
+    if response.status_code != HTTPStatus.OK:
+        pytest.fail("API returned a status code other than 200")
+    return [
+        (suggestion["skill"], suggestion["provider_count"])
+        for suggestion in response.json()["suggestions"]
+    ]
+
+
+def test_suggestions_are_ranked_by_provider_count(
+    test_client: TestClient,
+    create_multiple_service_providers_in_db: list[models.ServiceProvider],
+    service_provider: schemas.NewServiceProviderInSchema,
+    user_id: UUID,
+) -> None:
+    """Test that the skills starting with a prefix are suggested, most common first.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        create_multiple_service_providers_in_db (list[ServiceProvider]): The
+            service providers whose skills are suggested.
+        service_provider (schemas.NewServiceProviderInSchema): Another service
+            provider, created after the index is loaded.
+        user_id (UUID): The user id to use to make the request.
+    """
+
+    if _suggest(test_client, "i") != [("IT Services", 1)]:
+        pytest.fail("Skills starting with the prefix weren't suggested")
+
+    # the index is updated when a provider is created, without reloading it
+    service_provider.skills = ["IT Support", "IT Services"]
+    test_client.post(
+        "/v1_0/service-provider",
+        json=jsonable_encoder(service_provider),
+        headers={"user-id": str(user_id)},
+    )
+
+    if _suggest(test_client, "it s") != [("IT Services", 2), ("IT Support", 1)]:
+        pytest.fail("Suggestions weren't ranked by the number of providers")
+
+
+def test_deleted_skills_are_no_longer_suggested(
+    test_client: TestClient,
+    create_service_provider_in_db: models.ServiceProvider,
+    user_id: UUID,
+) -> None:
+    """Test that deleting the last provider with a skill removes the skill.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        create_service_provider_in_db (ServiceProvider): The service provider
+            to delete.
+        user_id (UUID): The user id to use to make the request.
+    """
+
+    skill = create_service_provider_in_db.skills[0].skill
+    if not _suggest(test_client, skill[:3]):
+        pytest.fail("The provider's skill wasn't suggested")
+
+    test_client.delete(
+        f"/v1_0/service-provider/{create_service_provider_in_db.id}",
+        headers={"user-id": str(user_id)},
+    )
+
+    if _suggest(test_client, skill[:3]):
+        pytest.fail("A skill no provider has was suggested")
+
+
+def test_suggestions_dont_query_the_database(
+    test_client: TestClient,
+    create_multiple_service_providers_in_db: list[models.ServiceProvider],
+) -> None:
+    """Test that the database isn't queried once the index is loaded.
+
+    Args:
+        test_client (TestClient): The test client to use to make the request.
+        create_multiple_service_providers_in_db (list[ServiceProvider]): The
+            service providers whose skills are suggested.
+    """
+
+    _suggest(test_client, "p")
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        for prefix in ("p", "pl", "plu", "plum"):
+            _suggest(test_client, prefix)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    if statements:
+        pytest.fail(f"Suggestions made {len(statements)} queries")
+
+
+def test_concurrent_first_loads_share_one_load() -> None:
+    """Test that requests racing to load the index wait for a single load."""
+
+    gate, loads = threading.Event(), []
+
+    def loader() -> dict[str, int]:
+        loads.append(1)
+        gate.wait(5)
+        return {"plumbing": 1}
+
+    index = SkillIndex(loader)
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(index.ensure_loaded) for _ in range(8)]
+        time.sleep(0.1)
+        gate.set()
+        for future in futures:
+            future.result(timeout=5)
+
+    if len(loads) != 1:
+        pytest.fail(f"The index was loaded {len(loads)} times")
+
+
+def test_reloads_serve_the_old_index_and_keep_changes() -> None:
+    """Test that a reload serves the old index meanwhile, & loses no changes."""
+
+    started, gate = threading.Event(), threading.Event()
+    counts = {"plumbing": 1}
+
+    def loader() -> dict[str, int]:
+        if index.loaded:
+            started.set()
+            gate.wait(5)
+        return dict(counts)
+
+    index = SkillIndex(loader)
+    index.ensure_loaded()
+    index.invalidate()
+    if not started.wait(5):
+        pytest.fail("The invalidated index wasn't reloaded in the background")
+
+    # made while the reload runs, & missing from what it loaded
+    index.add(["roofing"])
+    if index.suggest("", 10) != [("plumbing", 1), ("roofing", 1)]:
+        pytest.fail("The old index wasn't served during the reload")
+
+    gate.set()
+    # the background reload holds the load lock until it's swapped in
+    with index._load_lock:
+        pass
+    if index.suggest("", 10) != [("plumbing", 1), ("roofing", 1)]:
+        pytest.fail("A change made during the reload was lost")
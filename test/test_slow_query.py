@@ -0,0 +1,72 @@
+"""Module to hold the unit tests for the slow query recorder."""
+
+from pathlib import Path
+
+import orjson
+import pytest
+from sqlalchemy.orm import Session
+
+from service_provider_api.api import schemas
+from service_provider_api.core.repositories.service_provider import (
+    ServiceProviderRepository,
+)
+from service_provider_api.core.slow_query import (
+    SlowQueryRecorder,
+    normalize_sql,
+    parameter_shape,
+)
+from service_provider_api.database import models
+from service_provider_api.database.database import engine
+
+
+def test_normalize_sql_collapses_expanded_in_lists() -> None:
+    """Test that the same query with a different number of IDs normalizes
+    to the same statement."""
+
+    one = normalize_sql("SELECT *\n  FROM t WHERE id IN (%(id_1_1)s)")
+    many = normalize_sql("SELECT * FROM t WHERE id IN (%(id_1_1)s, %(id_1_2)s)")
+
+    if one != many or one != "SELECT * FROM t WHERE id IN (%(id_1_*)s)":
+        pytest.fail("Statements were not normalized to the same string")
+
+
+def test_parameter_shape_hides_values() -> None:
+    """Test that the parameter shape describes the types, not the values."""
+
+    shape = parameter_shape({"name_1": "John Smith", "id_1_1": 1, "id_1_2": 2})
+
+    if shape != {"name_1": "str", "id_1_*": "int[2]"}:
+        pytest.fail("Parameter shape is not correct")
+
+
+def test_slow_queries_have_their_plan_captured(
+    tmp_path: Path,
+    create_multiple_service_providers_in_db: list[models.ServiceProvider],
+    db_connection: Session,
+) -> None:
+    """Test that sampled slow queries have their plan written to the JSONL file.
+
+    Args:
+        tmp_path (Path): A temporary directory to write the plans to.
+        create_multiple_service_providers_in_db (list[ServiceProvider]): The service
+            providers in the database.
+        db_connection (Session): The database connection.
+    """
+
+    plans_path = tmp_path / "plans.jsonl"
+    recorder = SlowQueryRecorder(
+        threshold_ms=0, explain_sample_rate=1, explain_path=str(plans_path)
+    )
+    recorder.attach(engine)
+    try:
+        ServiceProviderRepository.list(
+            db_connection, schemas.ServiceProviderListFilterParams(), 1, 10
+        )
+    finally:
+        recorder.detach()
+
+    records = [orjson.loads(line) for line in plans_path.read_bytes().splitlines()]
+    if not records:
+        pytest.fail("No slow query plans were captured")
+    if "Plan" not in records[0]["plan"][0]:
+        pytest.fail("The captured plan is not an EXPLAIN plan")
@@ -0,0 +1,104 @@
+"""Module to hold the unit tests for the production launcher."""
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+
+@pytest.fixture
+def server_url() -> str:
+    """Start the production launcher on a free port.
+
+    Workers are recycled after a couple of requests so that tests can check
+    that they're replaced.
+
+    Yields:
+        str: The URL of the server.
+    """
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "scripts.start_webserver"],
+        env={
+            **os.environ,
+            "SERVER_HOST": "127.0.0.1",
+            "SERVER_PORT": str(port),
+            "SERVER_WORKERS": "2",
+            "SERVER_MAX_REQUESTS": "2",
+            "SERVER_MAX_REQUESTS_JITTER": "0",
+        },
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{url}/v1_0/health")
+            break
+        except httpx.TransportError:
+            time.sleep(0.1)
+
+    yield url
+
+    process.send_signal(signal.SIGTERM)
+    if process.wait(timeout=20) != 0:
+        pytest.fail("The launcher did not shut down cleanly")
+
+
+def test_recycled_workers_are_replaced(server_url: str) -> None:
+    """Test that the server keeps serving after every worker was recycled.
+
+    Args:
+        server_url (str): The URL of the server.
+    """
+
+    # a worker that's being recycled closes connections it accepted but
+    # hadn't read yet, which clients behind a load balancer would retry
+    for _ in range(10):
+        try:
+            response = httpx.get(f"{server_url}/v1_0/health", timeout=10)
+        except httpx.RemoteProtocolError:
+            response = httpx.get(f"{server_url}/v1_0/health", timeout=10)
+        if response.status_code != 200:
+            pytest.fail(f"Request failed with {response.status_code}")
+
+
+def test_metrics_count_every_worker(server_url: str) -> None:
+    """Test that a scrape counts the requests of every worker, even recycled ones.
+
+    Args:
+        server_url (str): The URL of the server.
+    """
+
+    for _ in range(10):
+        try:
+            httpx.get(f"{server_url}/v1_0/health", timeout=10)
+        except httpx.RemoteProtocolError:
+            httpx.get(f"{server_url}/v1_0/health", timeout=10)
+
+    # plus the health check the fixture waited for the server with
+    series = (
+        'http_requests_total{method="GET",route="/health",version="v1_0",'
+        'status="200"} 11.0'
+    )
+    # the workers export their metrics every second
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            response = httpx.get(f"{server_url}/metrics", timeout=10)
+        except httpx.RemoteProtocolError:
+            continue
+        if series in response.text:
+            return
+        time.sleep(0.2)
+    pytest.fail("The requests of every worker weren't counted")
@@ -0,0 +1,35 @@
+"""Module to hold the unit tests for the application startup."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from service_provider_api.api.app import app
+from service_provider_api.core.config import settings
+from service_provider_api.database.database import get_engine
+
+
+def test_import_does_not_connect_to_the_database() -> None:
+    """Test that the application can be imported without a database."""
+
+    result = subprocess.run(
+        [sys.executable, "-c", "import service_provider_api.api.app"],
+        env={**os.environ, "DATABASE_HOST": "database.invalid"},
+        capture_output=True,
+        text=True,
+    )
+
+    if result.returncode != 0:
+        pytest.fail(f"Importing the app failed without a database: {result.stderr}")
+
+
+def test_startup_opens_pool_connections() -> None:
+    """Test that the warmup leaves connections open in the pool."""
+
+    get_engine().dispose()
+    with TestClient(app):
+        if get_engine().pool.checkedin() < settings.WARMUP_POOL_CONNECTIONS:
+            pytest.fail("The warmup did not open the pool's connections")
@@ -0,0 +1,109 @@
+"""Module to hold the unit tests for traffic capture & replay."""
+
+import asyncio
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.replay import load_captures, replay
+from service_provider_api.api.app import app
+from service_provider_api.api.middleware import TrafficCaptureMiddleware
+from service_provider_api.core.capture import TrafficRecorder
+from service_provider_api.database import models
+
+
+@pytest.fixture
+def capture_path(tmp_path: Path) -> Path:
+    """The file that captured traffic is written to."""
+    return tmp_path / "traffic.jsonl"
+
+
+@pytest.fixture
+def captured_client(capture_path: Path) -> TestClient:
+    """A test client for the API that captures every request.
+
+    Args:
+        capture_path (Path): The file to write the captures to.
+
+    Yields:
+        TestClient: The test client.
+    """
+
+    recorder = TrafficRecorder(str(capture_path), max_bytes=1024**2, backup_count=1)
+    yield TestClient(TrafficCaptureMiddleware(app, recorder, sample_rate=1))
+    recorder.close()
+
+
+def test_captures_are_sanitized(
+    capture_path: Path,
+    captured_client: TestClient,
+    create_multiple_service_providers_in_db: list[models.ServiceProvider],
+) -> None:
+    """Test that search bodies are captured, but headers & write bodies aren't.
+
+    Args:
+        capture_path (Path): The file the captures are written to.
+        captured_client (TestClient): The test client with capture enabled.
+        create_multiple_service_providers_in_db (list[ServiceProvider]): The service
+            providers in the database.
+    """
+
+    provider = create_multiple_service_providers_in_db[0]
+    captured_client.post(
+        "/v1_0/service-providers/?page_size=5", json={"skills": ["plumbing"]}
+    )
+    captured_client.post(
+        f"/v1_0/service-provider/{provider.id}/review",
+        json={"rating": 5},
+        headers={"user-id": str(provider.user_id)},
+    )
+
+    search, review = load_captures([str(capture_path)])
+
+    if search["body"] != {"skills": ["plumbing"]} or search["query"] != {
+        "page_size": ["5"]
+    }:
+        pytest.fail("Search request was not captured")
+    if search["route"] != "/service-providers/" or search["status_code"] != 200:
+        pytest.fail("Search request was not captured with its route & status")
+    if "body" in review or str(provider.user_id) in capture_path.read_text():
+        pytest.fail("User data was captured")
+
+
+def test_replay_skips_writes(
+    capture_path: Path,
+    captured_client: TestClient,
+    create_multiple_service_providers_in_db: list[models.ServiceProvider],
+) -> None:
+    """Test that captured reads are replayed, and writes are skipped.
+
+    Args:
+        capture_path (Path): The file the captures are written to.
+        captured_client (TestClient): The test client with capture enabled.
+        create_multiple_service_providers_in_db (list[ServiceProvider]): The service
+            providers in the database.
+    """
+
+    provider = create_multiple_service_providers_in_db[0]
+    captured_client.get(f"/v1_0/service-provider/{provider.id}")
+    captured_client.post("/v1_0/service-providers/", json={"cost_lt": 5000})
+    captured_client.delete(
+        f"/v1_0/service-provider/{provider.id}",
+        headers={"user-id": str(provider.user_id)},
+    )
+
+    async def run():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            return await replay(client, load_captures([str(capture_path)]), speed=10)
+
+    result, skipped = asyncio.run(run())
+
+    statuses = {route: dict(counts) for route, counts in result.statuses.items()}
+    if skipped != 1 or statuses != {
+        # the provider was deleted after it was first fetched
+        "GET /service-provider/{service_provider_id}": {404: 1},
+        "POST /service-providers/": {200: 1},
+    }:
+        pytest.fail(f"Unexpected replay outcome: {statuses}, {skipped} skipped")